@@ -1,16 +1,18 @@
 # pip install gdeltdoc vaderSentiment beautifulsoup4 sqlalchemy pymysql
 import pandas as pd
-import re, html
-import hashlib
-from bs4 import BeautifulSoup
 from datetime import datetime
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 from gdeltdoc import GdeltDoc, Filters, repeat
 
 # ==== DB SETUP ===============================================================
 USE_MARIADB = True
 
 from sqlalchemy import create_engine, text
+from storage import create_pooled_engine
+from migrations import run_migrations, VADER_MIGRATIONS
+from urlcanon import canonicalize_url, url_key
+from neardup import near_duplicate_groups
+from lexicon_sentiment import score_texts
+from textclean import clean_series
 
 USER = "root"
 PWD  = "2003"
@@ -33,13 +35,15 @@ if USE_MARIADB:
             CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci;
         """)
 
-engine = create_engine(ENGINE_URL, future=True, pool_pre_ping=True)
+# pool dimensionné + pre-ping partagé avec storage.py
+engine = create_pooled_engine(ENGINE_URL, pool_size=5)
 
 DDL_ARTICLES_SQLITE = """
 CREATE TABLE IF NOT EXISTS articles (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   source TEXT,
   url TEXT NOT NULL,
+  url_hash INTEGER,           -- urlcanon.url_hash64 (index unique posé par VADER_MIGRATIONS)
   title TEXT,
   description TEXT,
   content TEXT,
@@ -51,8 +55,7 @@ CREATE TABLE IF NOT EXISTS articles (
   sentiment_pos REAL,
   sentiment_neu REAL,
   sentiment_neg REAL,
-  sentiment_label TEXT,
-  UNIQUE(url) ON CONFLICT IGNORE
+  sentiment_label TEXT
 );
 """
 
@@ -61,7 +64,7 @@ CREATE TABLE IF NOT EXISTS `articles` (
   `id` BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
   `source` VARCHAR(255),
   `url` TEXT NOT NULL,
-  `url_hash` CHAR(32) NOT NULL,
+  `url_hash` BINARY(16) NULL,           -- urlcanon.url_hash128 de l'URL canonique
   `title` TEXT,
   `description` MEDIUMTEXT,
   `content` MEDIUMTEXT,
@@ -132,34 +135,39 @@ def create_table_safely():
             print(f"❌ Impossible de créer la table: {e2}")
             raise
 
+def migrate_schema():
+    """Migrations versionnées (migrations.py) : clé url_hash binaire sur les bases existantes."""
+    raw = engine.raw_connection()
+    try:
+        run_migrations(raw, VADER_MIGRATIONS, "mysql" if USE_MARIADB else "sqlite")
+    finally:
+        raw.close()
+
 # Création de la table
 create_table_safely()
+migrate_schema()
 
 # ==== VADER + CLEAN ==========================================================
-analyzer = SentimentIntensityAnalyzer()
-
-def clean_text_soft(text: str) -> str:
-    if not isinstance(text, str):
-        return ""
-    text = html.unescape(text)
-    text = BeautifulSoup(text, "html.parser").get_text(" ", strip=True)
-    text = re.sub(r'(https?://\S+|www\.\S+)', ' ', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+# lexique anglais (VADER) ou français selon la colonne language, cf. lexicon_sentiment
 
 def label_from_compound(x: float) -> str:
     return "Positive" if x >= 0.05 else ("Negative" if x <= -0.05 else "Neutral")
 
-def generate_url_hash(url: str) -> str:
-    """Génère un hash MD5 de l'URL pour la déduplication"""
+def generate_url_hash(url: str):
+    """Clé de déduplication (hash de l'URL canonique) : BINARY(16) en MariaDB, INTEGER en SQLite"""
     if not url:
-        return ""
-    return hashlib.md5(url.encode('utf-8')).hexdigest()
+        return None
+    return url_key(url, "mysql" if USE_MARIADB else "sqlite")
 
 # ==== GDELT -> DF avec Multiple Batches ====================================
+# colonnes lues par sentiment_on_df (url_mobile, socialimage... ne sont pas gardées)
+KEEP_COLS = ["url", "title", "content", "description", "snippet", "language", "domain",
+             "publishdate", "date", "seendate"]
+
 def get_multiple_batches(num_batches=6):
     gd = GdeltDoc()
     all_articles = []
+    seen = set()
     from datetime import datetime, timedelta
     import time
     
@@ -186,8 +194,16 @@ def get_multiple_batches(num_batches=6):
         try:
             df_batch = gd.article_search(f)
             if not df_batch.empty:
+                n = len(df_batch)
+                # colonnes utiles seulement, dédup au fil de l'eau sur l'URL canonique (tracking,
+                # AMP, http/https...) : la liste ne garde jamais de doublons ni de colonnes inutiles ;
+                # l'URL d'origine est conservée (c'est elle qui est téléchargée)
+                df_batch = df_batch[[c for c in KEEP_COLS if c in df_batch.columns]]
+                key = df_batch["url"].map(canonicalize_url)
+                df_batch = df_batch[~key.duplicated() & ~key.isin(seen)]
+                seen.update(key[df_batch.index])
                 all_articles.append(df_batch)
-                print(f"Batch {i+1} ({current_date.strftime('%Y-%m-%d')} à {period_end.strftime('%Y-%m-%d')}): {len(df_batch)} articles")
+                print(f"Batch {i+1} ({current_date.strftime('%Y-%m-%d')} à {period_end.strftime('%Y-%m-%d')}): {n} articles")
         except Exception as e:
             print(f"Erreur batch {i+1}: {e}")
             
@@ -196,7 +212,7 @@ def get_multiple_batches(num_batches=6):
     
     if all_articles:
         final_df = pd.concat(all_articles, ignore_index=True)
-        final_df = final_df.drop_duplicates(subset=['url'], keep='first')
+        all_articles.clear()  # libère les lots avant le scoring
         print(f"Total final après suppression doublons: {len(final_df)} articles")
         return final_df
     return pd.DataFrame()
@@ -212,6 +228,7 @@ def sentiment_on_df(df: pd.DataFrame) -> pd.DataFrame:
     snip    = df["snippet"]      if "snippet" in df.columns else pd.Series([""]*len(df))
     lang    = df["language"]     if "language" in df.columns else pd.Series([""]*len(df))
     url     = df["url"]          if "url" in df.columns else df.get("DocumentIdentifier", pd.Series([""]*len(df)))
+    url     = url.astype(str)
     source  = df["domain"]       if "domain" in df.columns else df.get("sourceCommonName", pd.Series([""]*len(df)))
     
     # Gestion séparée des deux types de dates
@@ -232,13 +249,19 @@ def sentiment_on_df(df: pd.DataFrame) -> pd.DataFrame:
     else:
         gdelt_date = pd.Series([None]*len(df))
     
-    full_text = (title.fillna("") + " " + content.fillna("") + " " + desc.fillna("") + " " + snip.fillna("")).map(clean_text_soft)
-    scores = full_text.map(lambda t: analyzer.polarity_scores(t) if t else {"compound":0,"pos":0,"neu":1,"neg":0})
+    full_text = clean_series(title.fillna("") + " " + content.fillna("") + " " + desc.fillna("") + " " + snip.fillna(""))
+    # quasi-doublons (même dépêche sur plusieurs domaines) : VADER une seule fois par groupe
+    canon = near_duplicate_groups(full_text.tolist())
+    uniq_ids = sorted(set(canon))
+    scored = score_texts([full_text.iat[i] for i in uniq_ids], [lang.iat[i] for i in uniq_ids])
+    uniq = {i: (s if full_text.iat[i] else {"compound":0,"pos":0,"neu":1,"neg":0})
+            for i, s in zip(uniq_ids, scored)}
+    print(f"Quasi-doublons : {len(canon) - len(uniq)}/{len(canon)} textes non rescorés")
     
     out = pd.DataFrame({
         "source":  source.astype(str).str[:255],
-        "url":     url.astype(str).str[:1024],
-        "url_hash": url.astype(str).map(generate_url_hash),
+        "url":     url.str[:1024],
+        "url_hash": url.map(generate_url_hash),
         "title":   title.astype(str),
         "description": desc.astype(str),
         "content": content.astype(str),
@@ -248,10 +271,9 @@ def sentiment_on_df(df: pd.DataFrame) -> pd.DataFrame:
         "gdelt_date": gdelt_date          # Date de découverte GDELT
     })
     
-    out["sentiment_compound"] = scores.map(lambda s: s["compound"])
-    out["sentiment_pos"]      = scores.map(lambda s: s["pos"])
-    out["sentiment_neu"]      = scores.map(lambda s: s["neu"])
-    out["sentiment_neg"]      = scores.map(lambda s: s["neg"])
+    # colonnes numériques directement (pas de Series intermédiaire de dicts)
+    for k in ("compound", "pos", "neu", "neg"):
+        out[f"sentiment_{k}"] = [uniq[c][k] for c in canon]
     out["sentiment_label"]    = out["sentiment_compound"].map(label_from_compound)
     
     print("🔍 COLONNES DATES ORIGINALES:")
@@ -310,7 +332,7 @@ def upsert_articles(df_scored: pd.DataFrame):
                 "published_date","gdelt_date","language",
                 "sentiment_compound","sentiment_pos","sentiment_neu","sentiment_neg","sentiment_label"]
     else:
-        cols = ["source","url","title","description","content","full_text",
+        cols = ["source","url","url_hash","title","description","content","full_text",
                 "published_date","gdelt_date","language",
                 "sentiment_compound","sentiment_pos","sentiment_neu","sentiment_neg","sentiment_label"]
 
@@ -358,14 +380,14 @@ def upsert_articles(df_scored: pd.DataFrame):
             else:
                 sql = text("""
                 INSERT INTO articles
-                  (source, url, title, description, content, full_text,
+                  (source, url, url_hash, title, description, content, full_text,
                    gdelt_date, language,
                    sentiment_compound, sentiment_pos, sentiment_neu, sentiment_neg, sentiment_label)
                 VALUES
-                  (:source, :url, :title, :description, :content, :full_text,
+                  (:source, :url, :url_hash, :title, :description, :content, :full_text,
                    :gdelt_date, :language,
                    :sentiment_compound, :sentiment_pos, :sentiment_neu, :sentiment_neg, :sentiment_label)
-                ON CONFLICT(url) DO UPDATE SET
+                ON CONFLICT(url_hash) DO UPDATE SET
                   title=excluded.title,
                   description=excluded.description,
                   content=excluded.content,
@@ -400,6 +422,7 @@ df = get_multiple_batches(6)
 if not df.empty:
     print("Analyse de sentiment...")
     scored = sentiment_on_df(df)
+    del df  # scored porte tout ce qui est écrit : une seule copie du jeu en mémoire
     
     if not scored.empty:
         print("\nAperçu des résultats:")
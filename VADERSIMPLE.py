@@ -1,10 +1,7 @@
 # pip install gdeltdoc vaderSentiment beautifulsoup4 sqlalchemy pymysql
 
 import pandas as pd
-import re, html
-from bs4 import BeautifulSoup
 from datetime import datetime
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 from gdeltdoc import GdeltDoc, Filters, repeat
 import mariadb  
 
@@ -14,6 +11,12 @@ import mariadb
 USE_MARIADB = True 
 
 from sqlalchemy import create_engine, text
+from storage import create_pooled_engine
+from migrations import run_migrations, VADER_MIGRATIONS
+from urlcanon import canonicalize_url, url_key
+from neardup import near_duplicate_groups
+from lexicon_sentiment import score_texts
+from textclean import clean_series
 
 USER = "root"
 PWD  = "2003"
@@ -35,13 +38,15 @@ if USE_MARIADB:
             CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci;
         """)
 
-engine = create_engine(ENGINE_URL, future=True, pool_pre_ping=True)
+# pool dimensionné + pre-ping partagé avec storage.py
+engine = create_pooled_engine(ENGINE_URL, pool_size=5)
 
 DDL_ARTICLES_SQLITE = """
 CREATE TABLE IF NOT EXISTS articles (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   source TEXT,
   url TEXT NOT NULL,
+  url_hash INTEGER,
   title TEXT,
   description TEXT,
   content TEXT,
@@ -53,8 +58,7 @@ CREATE TABLE IF NOT EXISTS articles (
   sentiment_pos REAL,
   sentiment_neu REAL,
   sentiment_neg REAL,
-  sentiment_label TEXT,
-  UNIQUE(url) ON CONFLICT IGNORE
+  sentiment_label TEXT
 );
 """
 
@@ -63,6 +67,7 @@ CREATE TABLE IF NOT EXISTS articles (
   id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
   source VARCHAR(255),
   url VARCHAR(1024) NOT NULL,
+  url_hash BINARY(16) NULL,
   title VARCHAR(1024),
   description TEXT,
   content MEDIUMTEXT,
@@ -75,7 +80,7 @@ CREATE TABLE IF NOT EXISTS articles (
   sentiment_neu DOUBLE,
   sentiment_neg DOUBLE,
   sentiment_label VARCHAR(16),
-  UNIQUE KEY uk_url (url),
+  UNIQUE KEY uk_url_hash (url_hash),
   KEY idx_seendate (seendate),
   KEY idx_published (published_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -85,20 +90,17 @@ CREATE TABLE IF NOT EXISTS articles (
 with engine.begin() as conn:
     conn.exec_driver_sql(DDL_ARTICLES_MYSQL if USE_MARIADB else DDL_ARTICLES_SQLITE)
 
+# migrations versionnées (clé url_hash binaire sur les bases existantes)
+_raw = engine.raw_connection()
+try:
+    run_migrations(_raw, VADER_MIGRATIONS, "mysql" if USE_MARIADB else "sqlite")
+finally:
+    _raw.close()
+
 print("Connexion et schéma OK :", ENGINE_URL)
 
 # ==== VADER + CLEAN ==========================================================
-analyzer = SentimentIntensityAnalyzer()
-
-def clean_text_soft(text: str) -> str:
-    """Nettoyage doux: enlève HTML/URLs, garde chiffres, % et devises."""
-    if not isinstance(text, str):
-        return ""
-    text = html.unescape(text)
-    text = BeautifulSoup(text, "html.parser").get_text(" ", strip=True)
-    text = re.sub(r'(https?://\S+|www\.\S+)', ' ', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+# lexique anglais (VADER) ou français selon la colonne language, cf. lexicon_sentiment
 
 def label_from_compound(x: float) -> str:
     return "Positive" if x >= 0.05 else ("Negative" if x <= -0.05 else "Neutral")
@@ -148,7 +150,8 @@ def get_multiple_batches(num_batches=6):  # 6 × 250 = 1500 articles
     
     if all_articles:
         final_df = pd.concat(all_articles, ignore_index=True)
-        final_df = final_df.drop_duplicates(subset=['url'], keep='first')
+        # dédup sur l'URL canonique (tracking, AMP, http/https...), URL d'origine conservée
+        final_df = final_df[~final_df["url"].map(canonicalize_url).duplicated(keep='first')]
         print(f"Total final après suppression doublons: {len(final_df)} articles")
         return final_df
     return pd.DataFrame()
@@ -168,18 +171,27 @@ def sentiment_on_df(df: pd.DataFrame) -> pd.DataFrame:
     snip    = df["snippet"]      if "snippet" in df.columns else pd.Series([""]*len(df))
     lang    = df["language"]     if "language" in df.columns else pd.Series([""]*len(df))
     url     = df["url"]          if "url" in df.columns else df.get("DocumentIdentifier", pd.Series([""]*len(df)))
+    url     = url.astype(str)
     source  = df["domain"]       if "domain" in df.columns else df.get("sourceCommonName", pd.Series([""]*len(df)))
     seendt  = df["seendate"]     if "seendate" in df.columns else pd.Series([None]*len(df))
     pubdt   = df["publishdate"]  if "publishdate" in df.columns else df.get("date", pd.Series([None]*len(df)))
 
-    full_text = (title.fillna("") + " " + content.fillna("") + " " +
-                 desc.fillna("") + " " + snip.fillna("")).map(clean_text_soft)
+    full_text = clean_series(title.fillna("") + " " + content.fillna("") + " " +
+                              desc.fillna("") + " " + snip.fillna(""))
 
-    scores = full_text.map(lambda t: analyzer.polarity_scores(t) if t else {"compound":0,"pos":0,"neu":1,"neg":0})
+    # quasi-doublons (même dépêche sur plusieurs domaines) : VADER une seule fois par groupe
+    canon = near_duplicate_groups(full_text.tolist())
+    uniq_ids = sorted(set(canon))
+    scored = score_texts([full_text.iat[i] for i in uniq_ids], [lang.iat[i] for i in uniq_ids])
+    uniq = {i: (s if full_text.iat[i] else {"compound":0,"pos":0,"neu":1,"neg":0})
+            for i, s in zip(uniq_ids, scored)}
+    scores = pd.Series([uniq[c] for c in canon], index=full_text.index)
+    print(f"Quasi-doublons : {len(canon) - len(uniq)}/{len(canon)} textes non rescorés")
 
     out = pd.DataFrame({
         "source":  source.astype(str).str[:255],
-        "url":     url.astype(str).str[:1024],
+        "url":     url.str[:1024],
+        "url_hash": url.map(lambda u: url_key(u, "mysql" if USE_MARIADB else "sqlite") if u else None),
         "title":   title.astype(str),
         "description": desc.astype(str),
         "content": content.astype(str),
@@ -232,7 +244,7 @@ def upsert_articles(df_scored: pd.DataFrame):
         return 0, 0
 
     # sécurise les colonnes qui partent dans la DB
-    cols = ["source","url","title","description","content","full_text",
+    cols = ["source","url","url_hash","title","description","content","full_text",
             "seendate","published_at","language",
             "sentiment_compound","sentiment_pos","sentiment_neu","sentiment_neg","sentiment_label"]
 
@@ -253,11 +265,11 @@ def upsert_articles(df_scored: pd.DataFrame):
         if USE_MARIADB:
             sql = text("""
             INSERT INTO articles
-              (source, url, title, description, content, full_text,
+              (source, url, url_hash, title, description, content, full_text,
                seendate, published_at, language,
                sentiment_compound, sentiment_pos, sentiment_neu, sentiment_neg, sentiment_label)
             VALUES
-              (:source, :url, :title, :description, :content, :full_text,
+              (:source, :url, :url_hash, :title, :description, :content, :full_text,
                :seendate, :published_at, :language,
                :sentiment_compound, :sentiment_pos, :sentiment_neu, :sentiment_neg, :sentiment_label)
             ON DUPLICATE KEY UPDATE
@@ -277,14 +289,14 @@ def upsert_articles(df_scored: pd.DataFrame):
         else:
             sql = text("""
             INSERT INTO articles
-              (source, url, title, description, content, full_text,
+              (source, url, url_hash, title, description, content, full_text,
                seendate, published_at, language,
                sentiment_compound, sentiment_pos, sentiment_neu, sentiment_neg, sentiment_label)
             VALUES
-              (:source, :url, :title, :description, :content, :full_text,
+              (:source, :url, :url_hash, :title, :description, :content, :full_text,
                :seendate, :published_at, :language,
                :sentiment_compound, :sentiment_pos, :sentiment_neu, :sentiment_neg, :sentiment_label)
-            ON CONFLICT(url) DO UPDATE SET
+            ON CONFLICT(url_hash) DO UPDATE SET
               title=excluded.title,
               description=excluded.description,
               content=excluded.content,
@@ -0,0 +1,230 @@
+# backfill.py
+# Complète hors ligne les articles déjà en base jamais (ou mal) enrichis :
+# content NULL (plein texte), colonnes JSON jamais écrites (enriched_at NULL, migration 13),
+# ou lang absente — sans repasser par les flux.
+#   - lignes lues par tranches ordonnées par id (CHUNK), un seul producteur
+#   - pipeline ingest.py : fetch (pages manquantes, politesse par domaine) -> extract
+#     (pool de processus) -> ner (pool de processus, modèles spaCy chargés dans chaque
+#     fils, ou worker NLP) -> enrich (topics) -> sentiment -> store (écritures en lots)
+#   - reprise : point de contrôle (table backfill_state, migration 12) = plus grand id
+#     dont tous les prédécesseurs sont écrits ; un lot perdu sur une erreur est repris
+#     au lancement suivant, une ligne déjà traitée ne l'est pas deux fois
+#
+#   python backfill.py [news.db] [--workers 3] [--no-fulltext] [--limit 10000]
+#   python backfill.py --mariadb '{...}' --columns --sentiment --reset
+import time, argparse, threading
+from functools import partial
+
+from ingest import Ingest, STAGE_DEFAULTS, ARTICLE_COLS, ner_batch
+from jobqueue import add_store_args, store_from_args
+from metrics import METRICS, start_from_env
+from neardup import LANG_MISSING, COLUMNS_MISSING
+from pipeline import Stage, Pipeline, cpu_workers, print_report
+from sources import extract_batch
+from urlcanon import canonicalize_url
+import memwatch
+
+CHUNK = 500             # lignes lues par requête
+DELAY_S = 1.0           # politesse : délai entre deux pages d'un même domaine
+
+# --- extract / ner : fonctions de module (pool de processus) ---
+def extract(items, fulltext: bool = True):
+    """
+    extract_batch, sans perdre la trace des lignes qu'il abandonne (page sans titre) :
+    elles repartent réduites à {"id", "_dropped"} pour être soldées par le parent.
+    """
+    ids = [item["id"] for item in items]
+    out = extract_batch(items, fulltext=fulltext)
+    kept = {item["id"] for item in out}
+    return out + [{"id": i, "_dropped": True} for i in ids if i not in kept]
+
+def ner(items):
+    ner_batch([item for item in items if "_dropped" not in item])
+    return items
+
+class Checkpoint:
+    """Dernier id traité sans trou : tous les ids émis <= last_id sont écrits (ou écartés)."""
+
+    def __init__(self, store, name: str, reset: bool = False):
+        self.store = store
+        self.name = name
+        self.last_id = 0
+        self.done = 0
+        self._issued = 0                # plus grand id émis par le producteur
+        self._pending = set()           # émis, pas encore écrits
+        self._lock = threading.Lock()
+        if not reset:
+            with store.backend.connection() as con:
+                cur = con.cursor()
+                cur.execute(f"SELECT last_id, done FROM backfill_state WHERE name={store.ph}", (name,))
+                row = cur.fetchone()
+            if row:
+                self.last_id, self.done = row
+        self._issued = self.last_id
+
+    def issued(self, ids):
+        with self._lock:
+            self._pending.update(ids)
+            self._issued = max([self._issued, *ids])
+
+    def finished(self, ids):
+        with self._lock:
+            self._pending.difference_update(ids)
+            self.done += len(ids)
+            self.last_id = min(self._pending) - 1 if self._pending else self._issued
+        self.save()
+
+    def save(self):
+        p = self.store.ph
+        with self.store.backend.connection() as con:
+            con.cursor().execute(f"REPLACE INTO backfill_state (name, last_id, done, updated_at) VALUES ({p},{p},{p},{p})",
+                                 (self.name, self.last_id, self.done, time.time()))
+
+class Backfill:
+    """
+    Étapes du backfill autour d'une instance Ingest (mêmes options que les scripts :
+    fulltext, columns, entities, topics, sentiment).
+    """
+
+    def __init__(self, store, chunk: int = CHUNK, limit: int|None = None, delay: float = DELAY_S,
+                 reset: bool = False, name: str|None = None, **options):
+        self.store = store
+        self.chunk = chunk
+        self.limit = limit
+        self.delay = delay
+        self.ingest = Ingest(store, neardup=False, skip_known=False, **options)
+        name = name or "+".join(k for k, v in sorted(options.items()) if v) or "lang"
+        self.checkpoint = Checkpoint(store, name, reset=reset)
+
+    def where(self) -> str:
+        """Lignes à compléter, selon les options (cf. neardup.UNENRICHED_SQL)."""
+        # colonnes : enriched_at suffit (la même écriture pose lang, éventuellement NULL)
+        conds = list(COLUMNS_MISSING if self.ingest.columns else LANG_MISSING)
+        if self.ingest.fulltext:
+            conds.append("content IS NULL")
+        return "(" + " OR ".join(conds) + ")"
+
+    def remaining(self) -> int:
+        with self.store.backend.connection() as con:
+            cur = con.cursor()
+            cur.execute(f"SELECT COUNT(*) FROM articles WHERE id > {self.store.ph} AND {self.where()}",
+                        (self.checkpoint.last_id,))
+            return cur.fetchone()[0]
+
+    # --- producteur : tranches ordonnées par id ---
+    def rows(self):
+        last, sent, p = self.checkpoint.last_id, 0, self.store.ph
+        sql = f"SELECT {', '.join(ARTICLE_COLS)} FROM articles WHERE id > {p} AND {self.where()} ORDER BY id"
+        while self.limit is None or sent < self.limit:
+            n = self.chunk if self.limit is None else min(self.chunk, self.limit - sent)
+            with self.store.backend.connection() as con:
+                cur = con.cursor()
+                cur.execute(f"{sql} LIMIT {int(n)}", (last,))
+                items = [dict(zip(ARTICLE_COLS, row)) for row in cur.fetchall()]
+            if not items:
+                return
+            for item in items:
+                item["title"], item["summary"] = item["title"] or "", item["summary"] or ""
+                item["_key"] = canonicalize_url(item["link"])
+            self.checkpoint.issued([item["id"] for item in items])
+            yield from items
+            last, sent = items[-1]["id"], sent + len(items)
+
+    # --- fetch : seulement les pages manquantes ---
+    def fetch(self, items):
+        out, skipped = [], []
+        for item in items:
+            if not item["title"] or (self.ingest.fulltext and not item.get("content")):
+                item["_untitled"] = not item["title"]
+                self.ingest._throttle(item["link"], self.delay)
+                self.ingest._download(item)
+            if item["title"] or "_html" in item:
+                out.append(item)
+            else:
+                skipped.append(item["id"])  # ni titre ni page : rien à enrichir
+        if skipped:
+            self.checkpoint.finished(skipped)
+        return out
+
+    # --- enrich : première étape côté parent, solde les lignes écartées par extract ---
+    def enrich(self, items):
+        dropped = [item["id"] for item in items if "_dropped" in item]
+        if dropped:
+            self.checkpoint.finished(dropped)
+        return self.ingest.enrich([item for item in items if "_dropped" not in item])
+
+    # --- store : écritures en lots + point de contrôle ---
+    def write(self, items):
+        self.ingest.write(items)
+        # lignes sitemap sans titre : métadonnées tirées de la page par extract
+        self.store.update_many([{"id": item["id"], "title": item["title"], "summary": item["summary"],
+                                 "date": item["date"]} for item in items if item.pop("_untitled", False)])
+        ids = [item["id"] for item in items]
+        self.checkpoint.finished(ids)
+        METRICS.inc("backfill_rows_total", len(ids))
+        return ids
+
+    def stages(self, workers: int|None = None, overrides: dict|None = None) -> list[Stage]:
+        conf = {name: dict(c, **(overrides or {}).get(name, {})) for name, c in STAGE_DEFAULTS.items()}
+        conf["ner"] = dict({"workers": workers or cpu_workers(), "batch": 32, "max_wait": 1.0},
+                           **(overrides or {}).get("ner", {}))
+        if workers:
+            conf["extract"]["workers"] = workers
+        ingest = self.ingest
+        out = [
+            Stage("fetch", self.fetch, **conf["fetch"]),
+            Stage("extract", partial(extract, fulltext=ingest.fulltext),
+                  mode="process" if ingest.fulltext else "thread", **conf["extract"]),
+            Stage("ner", ner, mode="process", **conf["ner"]),
+            Stage("enrich", self.enrich, **conf["enrich"]),
+        ]
+        if ingest.sentiment:
+            out.append(Stage("sentiment", ingest.score_sentiment, **conf["sentiment"]))
+        out.append(Stage("store", self.write, **conf["store"]))
+        return out
+
+def run(store, workers: int|None = None, overrides: dict|None = None, profiler=None, memory=None, **kwargs) -> dict:
+    """kwargs : cf. Backfill (chunk, limit, delay, reset, name) et Ingest (fulltext, columns...)."""
+    store.ensure_schema()
+    start_from_env()
+    backfill = Backfill(store, **kwargs)
+    print(f"Backfill « {backfill.checkpoint.name} » : {backfill.remaining()} lignes à compléter "
+          f"après l'id {backfill.checkpoint.last_id}")
+    pipeline = Pipeline(backfill.stages(workers, overrides), discover_workers=1, profiler=profiler, memory=memory)
+    for hook in (profiler, memory):
+        if hook:
+            hook.start()
+    try:
+        report = pipeline.run([backfill.rows()])
+    finally:
+        for hook in (profiler, memory):
+            if hook:
+                hook.stop()
+    report["added"] = 0
+    report["backfilled"] = backfill.checkpoint.done
+    print_report(report)
+    print(f"Point de contrôle : id {backfill.checkpoint.last_id} ({backfill.checkpoint.done} lignes traitées)")
+    return report
+
+def main():
+    ap = argparse.ArgumentParser(description="Enrichissement a posteriori des articles incomplets")
+    add_store_args(ap)
+    for opt, default in (("fulltext", True), ("columns", True), ("entities", False), ("topics", False),
+                         ("sentiment", True)):
+        ap.add_argument(f"--{opt}", action=argparse.BooleanOptionalAction, default=default)
+    ap.add_argument("--workers", type=int, default=None, help="processus extract / ner (défaut : cœurs - 1)")
+    ap.add_argument("--chunk", type=int, default=CHUNK, help="lignes lues par requête")
+    ap.add_argument("--limit", type=int, default=None, help="nb max de lignes pour ce lancement")
+    ap.add_argument("--delay", type=float, default=DELAY_S, help="délai (s) entre deux pages d'un même domaine")
+    ap.add_argument("--reset", action="store_true", help="ignore le point de contrôle (repart du début)")
+    args = ap.parse_args()
+    store = store_from_args(args)
+    try:
+        run(store, workers=args.workers, memory=memwatch.from_argv([]), chunk=args.chunk, limit=args.limit,
+            delay=args.delay, reset=args.reset,
+            **{opt: getattr(args, opt) for opt in ("fulltext", "columns", "entities", "topics", "sentiment")})
+    finally:
+        store.backend.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+# bench.py
+# Banc d'essai hors ligne du pipeline d'ingestion : un serveur HTTP local remplace
+# BBC / Le Monde / GDELT et sert, de façon déterministe (--seed) :
+#   /rss/<n>.xml                      flux RSS 2.0
+#   /sitemap/<n>/index.xml            sitemap index -> /sitemap/<n>/news-<k>.xml.gz (gzip)
+#   /<section>/<id>.html              pages articles (titre, Open Graph, date, paragraphes)
+#   /api/v2/doc/doc?...&format=json   réponse "artlist" de l'API GDELT DOC
+# avec latence (--latency-ms, --jitter-ms) et taux d'erreurs (--error-rate) réglables.
+# Le banc passe par les vrais chemins (sources.py -> ingest.run -> storage) sur une base
+# SQLite et un cache d'enrichissement temporaires, puis rapporte articles/s et p50/p99
+# par étape (metrics.py). Résultats en JSON pour comparer deux versions :
+#
+#   python bench.py --out avant.json
+#   python bench.py --out apres.json --compare avant.json
+#   python bench.py --set fetch.workers=32 --set store.batch=500 --no-sentiment
+#   python bench.py --profile profiles/   (profil par étape, cf. profiling.py)
+#   python bench.py --record run.zip ; python bench.py --replay run.zip   (cf. cassette.py)
+# --replay rejoue aussi la cassette d'un vrai run (python TestV4.py --record=run.zip) :
+# mêmes producteurs et pages réelles, sans réseau ni serveur local.
+import os, sys, json, gzip, time, zlib, random, tempfile, argparse, threading, subprocess
+from datetime import datetime, UTC, timedelta
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape
+
+import profiling, memwatch, cassette
+from metrics import METRICS
+
+# ---------- Contenu synthétique ----------
+PEOPLE = ["Emmanuel Macron", "Olaf Scholz", "Joe Biden", "Ursula von der Leyen", "Christine Lagarde",
+          "Volodymyr Zelensky", "Giorgia Meloni", "Keir Starmer", "Pedro Sánchez", "Xi Jinping"]
+PLACES = ["Paris", "Berlin", "Londres", "Kyiv", "Bruxelles", "Rome", "Madrid", "Washington", "Pékin",
+          "Lyon", "Marseille", "Ukraine", "Allemagne", "Chine", "Espagne", "Italie"]
+WORDS = ("gouvernement réforme économie croissance inflation marché énergie climat élection parlement "
+         "sommet accord sanctions guerre paix négociations budget dette entreprises emploi chômage "
+         "banque taux industrie agriculture santé hôpital école université recherche technologie "
+         "intelligence données sécurité défense frontière migration tribunal enquête procès grève "
+         "syndicat manifestation ministre président opposition majorité vote loi décret sondage "
+         "exportations importations pétrole gaz électricité nucléaire renouvelable transport rail").split()
+SECTIONS = ["international", "economie", "politique", "business", "technology", "news"]
+
+def _rng(seed: int, *parts) -> random.Random:
+    # aléa stable par ressource : deux runs au même --seed servent les mêmes octets
+    return random.Random(zlib.crc32(repr((seed,) + parts).encode()))
+
+def _sentence(r: random.Random) -> str:
+    words = r.sample(WORDS, r.randint(6, 14))
+    words.insert(r.randrange(len(words)), r.choice(PEOPLE))
+    words.insert(r.randrange(len(words)), r.choice(PLACES))
+    s = " ".join(words)
+    return s[0].upper() + s[1:] + "."
+
+def article(seed: int, path: str, paragraphs: int) -> dict:
+    r = _rng(seed, path)
+    published = datetime(2026, 1, 1, tzinfo=UTC) + timedelta(minutes=r.randrange(400_000))
+    return {
+        "title": f"{r.choice(PEOPLE)} à {r.choice(PLACES)} : {' '.join(r.sample(WORDS, 5))}",
+        "description": _sentence(r),
+        "published": published,
+        "paragraphs": [" ".join(_sentence(r) for _ in range(r.randint(3, 6))) for _ in range(paragraphs)],
+    }
+
+def article_html(a: dict) -> str:
+    body = "\n".join(f"<p>{escape(p)}</p>" for p in a["paragraphs"])
+    return f"""<!doctype html><html lang="fr"><head><meta charset="utf-8">
+<title>{escape(a['title'])} - Le Monde</title>
+<meta property="og:description" content="{escape(a['description'], {'"': '&quot;'})}">
+<meta property="article:published_time" content="{a['published'].isoformat()}">
+<script>var tracking = {{"page": "article"}};</script></head>
+<body><header><nav><a href="/">Accueil</a></nav></header>
+<article><h1>{escape(a['title'])}</h1>{body}</article>
+<aside>À lire aussi</aside><footer>© Banc d'essai</footer></body></html>"""
+
+# ---------- Serveur ----------
+DEFAULTS = {
+    "seed": 1, "feeds": 4, "items": 50, "sitemaps": 2, "sub_sitemaps": 3, "sitemap_items": 30,
+    "gdelt_windows": 2, "gdelt_items": 50, "paragraphs": 8,
+    "latency_ms": 20.0, "jitter_ms": 10.0, "error_rate": 0.02,
+}
+
+class StandIn(ThreadingHTTPServer):
+    """Serveur local des flux / sitemaps / pages / API GDELT synthétiques."""
+    daemon_threads = True
+
+    def __init__(self, config: dict, port: int = 0):
+        self.config = dict(DEFAULTS, **config)
+        self.stats = {"requests": 0, "errors": 0, "bytes": 0}
+        self._lock = threading.Lock()
+        super().__init__(("127.0.0.1", port), _Handler)
+
+    @property
+    def base(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="bench-http", daemon=True).start()
+        return self
+
+    def count(self, **inc):
+        with self._lock:
+            for k, v in inc.items():
+                self.stats[k] += v
+
+    # --- ressources ---
+    def link(self, kind: str, n: int, i: int) -> str:
+        section = SECTIONS[(n + i) % len(SECTIONS)]
+        return f"{self.base}/{section}/{kind}{n}-{i}.html"
+
+    def rss(self, n: int) -> str:
+        c = self.config
+        items = []
+        for i in range(c["items"]):
+            link = self.link("rss", n, i)
+            a = article(c["seed"], urlparse(link).path, 0)
+            items.append(f"<item><title>{escape(a['title'])}</title><link>{link}</link>"
+                         f"<description>{escape(a['description'])}</description>"
+                         f"<pubDate>{format_datetime(a['published'])}</pubDate></item>")
+        return (f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+                f"<title>Flux de test {n}</title><link>{self.base}/</link>{''.join(items)}</channel></rss>")
+
+    def sitemap_index(self, n: int) -> str:
+        subs = "".join(f"<sitemap><loc>{self.base}/sitemap/{n}/news-{k}.xml.gz</loc></sitemap>"
+                       for k in range(self.config["sub_sitemaps"]))
+        return (f'<?xml version="1.0" encoding="UTF-8"?>'
+                f'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{subs}</sitemapindex>')
+
+    def sitemap(self, n: int, k: int) -> str:
+        c = self.config
+        urls = []
+        for i in range(c["sitemap_items"]):
+            link = self.link(f"sm{n}k", k, i)
+            pub = article(c["seed"], urlparse(link).path, 0)["published"].isoformat()
+            urls.append(f"<url><loc>{link}</loc><news:news><news:publication_date>{pub}"
+                        f"</news:publication_date></news:news></url>")
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" '
+                f'xmlns:news="http://www.google.com/schemas/sitemap-news/0.9">{"".join(urls)}</urlset>')
+
+    def gdelt(self, query: dict) -> str:
+        c = self.config
+        window = zlib.crc32(query.get("startdatetime", [""])[0].encode()) % 10_000
+        n = min(c["gdelt_items"], int(query.get("maxrecords", [250])[0]))
+        articles = []
+        for i in range(n):
+            link = self.link("gdelt", window, i)
+            a = article(c["seed"], urlparse(link).path, 0)
+            articles.append({"url": link, "url_mobile": "", "title": a["title"],
+                             "seendate": a["published"].strftime("%Y%m%dT%H%M%SZ"), "socialimage": "",
+                             "domain": "127.0.0.1", "language": "French", "sourcecountry": "France"})
+        return json.dumps({"articles": articles}, ensure_ascii=False)
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        srv, c = self.server, self.server.config
+        url = urlparse(self.path)
+        r = random.Random()  # latence / erreurs : aléa non reproductible, comme en vrai
+        time.sleep(max(0.0, r.gauss(c["latency_ms"], c["jitter_ms"])) / 1000)
+        parts = url.path.strip("/").split("/")
+        ctype, gz = "text/html; charset=utf-8", False
+        try:
+            if parts[0] == "rss":
+                body, ctype = srv.rss(int(parts[1].split(".")[0])), "application/rss+xml"
+            elif parts[0] == "sitemap" and parts[2] == "index.xml":
+                body, ctype = srv.sitemap_index(int(parts[1])), "application/xml"
+            elif parts[0] == "sitemap":
+                body, ctype = srv.sitemap(int(parts[1]), int(parts[2][5:].split(".")[0])), "application/gzip"
+                gz = True
+            elif url.path == "/api/v2/doc/doc":
+                body, ctype = srv.gdelt(parse_qs(url.query)), "application/json"
+            elif parts[0] in SECTIONS and url.path.endswith(".html"):
+                if r.random() < c["error_rate"]:
+                    return self._send(503, b"indisponible", "text/plain", error=True)
+                body = article_html(article(c["seed"], url.path, c["paragraphs"]))
+            else:
+                return self._send(404, b"introuvable", "text/plain", error=True)
+        except (IndexError, ValueError):
+            return self._send(404, b"introuvable", "text/plain", error=True)
+        data = body.encode("utf-8")
+        if gz:
+            data = gzip.compress(data, mtime=0)
+        self._send(200, data, ctype)
+
+    def _send(self, status: int, data: bytes, ctype: str, error: bool = False):
+        self.server.count(requests=1, errors=int(error), bytes=len(data))
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+# ---------- Banc ----------
+def producers(server: StandIn):
+    """Producteurs réels (sources.py) pointés sur le serveur local."""
+    from sources import feedparser, rss_producer, sitemap_producer, gdelt_producer
+    c, base = server.config, server.base
+    out = []
+    if feedparser is None:
+        print("feedparser absent : flux RSS ignorés")
+    else:
+        out += [rss_producer(f"{base}/rss/{n}.xml") for n in range(c["feeds"])]
+    out += [sitemap_producer({"url": f"{base}/sitemap/{n}/index.xml", "domain": "127.0.0.1",
+                              "limit": c["sub_sitemaps"] * c["sitemap_items"]})
+            for n in range(c["sitemaps"])]
+    if c["gdelt_windows"]:
+        day = datetime(2026, 1, 1)
+        windows = [{"keyword": "économie", "start_date": (day + timedelta(days=w)).strftime("%Y-%m-%d"),
+                    "end_date": (day + timedelta(days=w + 1)).strftime("%Y-%m-%d")}
+                   for w in range(c["gdelt_windows"])]
+        out.append(gdelt_producer(windows, endpoint=f"{base}/api/v2/doc/doc", pause=0))
+    return out
+
+def _quantiles(h) -> dict:
+    return {"count": h.count, "p50_ms": _r(h.quantile(0.5)), "p99_ms": _r(h.quantile(0.99)),
+            "mean_ms": _r(h.sum / h.count if h.count else None)}
+
+def _r(x):
+    return None if x is None else round(x, 3)
+
+def git_version() -> str|None:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def run_bench(config: dict, options: dict, overrides: dict|None = None, db: str|None = None,
+              discover_workers: int = 4, profiler=None, memory=None, tape=None) -> dict:
+    """
+    Un passage complet contre le serveur local ; retourne les résultats (cf. --out).
+    tape : cassette.Cassette installée ; en rejeu, ni serveur ni réseau (producteurs de la cassette).
+    """
+    tmp = tempfile.mkdtemp(prefix="bench-")
+    # base et cache d'enrichissement neufs : sinon le 2e run ne mesure que le cache
+    os.environ.setdefault("ENRICH_CACHE_PATH", os.path.join(tmp, "enrich_cache.db"))
+    import ingest
+    from storage import open_store
+
+    replay = tape is not None and tape.offline
+    server = None if replay else StandIn(config).start()
+    store = open_store(db or os.path.join(tmp, "bench.db"))
+    METRICS.reset()
+    try:
+        report = ingest.run(store, cassette.producers(tape) if replay else producers(server),
+                            discover_workers=discover_workers, overrides=overrides, profiler=profiler,
+                            memory=memory, **options)
+    finally:
+        if server:
+            server.shutdown()
+        store.backend.close()
+    elapsed = report["elapsed_s"]
+    stages = {}
+    for name, s in report["stages"].items():
+        q = _quantiles(METRICS.merged("stage_batch_ms", stage=name))
+        stages[name] = dict(s, batch_p50_ms=q["p50_ms"], batch_p99_ms=q["p99_ms"],
+                            item_ms=_r(s["busy_s"] * 1000 / s["in"]) if s["in"] else None)
+    latency = {name: _quantiles(METRICS.merged(name))
+               for name in ("feed_parse_ms", "fetch_ms", "extract_ms", "ner_ms", "sentiment_ms", "db_ms")}
+    latency.update({f"db_ms.{op}": _quantiles(METRICS.merged("db_ms", op=op))
+                    for op in sorted({dict(l).get("op") for n, l in METRICS.histograms if n == "db_ms"})})
+    return {
+        "version": git_version(), "time": datetime.now(UTC).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0], "cpus": os.cpu_count(),
+        "config": server.config if server else {"replay": os.path.abspath(tape.path)}, "options": options, "overrides": overrides or {},
+        "elapsed_s": elapsed, "discovered": report["discovered"], "added": report["added"],
+        "articles_per_s": round(report["added"] / elapsed, 2) if elapsed else None,
+        "stages": stages, "latency": latency, "server": dict(server.stats if server else tape.stats),
+        "peak_rss_mb": report["peak_rss_mb"], "children_peak_rss_mb": report["children_peak_rss_mb"],
+    }
+
+# ---------- Comparaison ----------
+def _delta(new, old) -> str:
+    if new is None or old in (None, 0):
+        return ""
+    return f"{(new - old) / old * 100:+.0f}%"
+
+def compare(new: dict, old: dict):
+    print(f"\nComparaison avec {old.get('version')} ({old.get('time')})")
+    print(f"  {'articles/s':<22} {old['articles_per_s']!s:>9} -> {new['articles_per_s']!s:>9}  "
+          f"{_delta(new['articles_per_s'], old['articles_per_s'])}")
+    for name, s in new["stages"].items():
+        o = old["stages"].get(name, {})
+        for key in ("item_ms", "batch_p50_ms", "batch_p99_ms"):
+            print(f"  {name + '.' + key:<22} {o.get(key)!s:>9} -> {s[key]!s:>9}  {_delta(s[key], o.get(key))}")
+    for name, q in new["latency"].items():
+        o = old["latency"].get(name, {})
+        if q["count"]:
+            print(f"  {name + ' p50/p99':<22} {o.get('p50_ms')!s:>9} -> {q['p50_ms']!s:>9}  "
+                  f"{_delta(q['p50_ms'], o.get('p50_ms'))} / {_delta(q['p99_ms'], o.get('p99_ms'))}")
+
+def print_results(res: dict):
+    print(f"\n{res['added']} articles en {res['elapsed_s']:.1f}s : {res['articles_per_s']} articles/s "
+          f"({res['server']['requests']} requêtes{' rejouées' if 'replay' in res['config'] else ''}, "
+          f"{res['server']['errors']} erreurs servies), "
+          f"pic RSS {res['peak_rss_mb']:.0f} Mo")
+    for name, s in res["stages"].items():
+        print(f"  {name:<10} {s['item_ms'] or 0:>8.2f} ms/élément   lot p50 {s['batch_p50_ms'] or 0:>8.1f} ms"
+              f"   p99 {s['batch_p99_ms'] or 0:>8.1f} ms")
+    for name, q in res["latency"].items():
+        if q["count"]:
+            print(f"  {name:<22} n={q['count']:<6} p50 {q['p50_ms']:>8.2f} ms   p99 {q['p99_ms']:>8.2f} ms")
+
+def _overrides(pairs) -> dict:
+    """["fetch.workers=32", ...] -> {"fetch": {"workers": 32}}."""
+    out = {}
+    for pair in pairs or []:
+        key, value = pair.split("=", 1)
+        stage, param = key.split(".", 1)
+        out.setdefault(stage, {})[param] = float(value) if param == "max_wait" else int(value)
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Banc d'essai hors ligne de l'ingestion (serveur local)")
+    for key, value in DEFAULTS.items():
+        ap.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    for opt, default in (("fulltext", True), ("columns", True), ("entities", True), ("topics", True),
+                         ("sentiment", True), ("neardup", True)):
+        ap.add_argument(f"--{opt}", action=argparse.BooleanOptionalAction, default=default)
+    ap.add_argument("--set", action="append", metavar="ETAPE.PARAM=VALEUR",
+                    help="surcharge d'étape (ingest.STAGE_DEFAULTS), ex. fetch.workers=32")
+    ap.add_argument("--discover-workers", type=int, default=4)
+    ap.add_argument("--db", default=None, help="base SQLite conservée (défaut : temporaire)")
+    ap.add_argument("--out", default=None, help="résultats JSON (défaut : bench-<date>.json)")
+    ap.add_argument("--compare", default=None, help="résultats JSON d'une version précédente")
+    ap.add_argument("--profile", nargs="?", const=profiling.DEFAULT_DIR, default=None, metavar="DIR",
+                    help="profil cProfile par étape (profiling.py)")
+    ap.add_argument("--profile-sample", nargs="?", const=profiling.DEFAULT_HZ, type=float, default=None, metavar="HZ",
+                    help="profil par échantillonnage des piles")
+    ap.add_argument("--memory", nargs="?", const=memwatch.DEFAULT_DIR, default=None, metavar="DIR",
+                    help="tracemalloc par étape (memwatch.py)")
+    ap.add_argument("--memory-budget", default=None, metavar="ETAPE=MO,...",
+                    help="budgets mémoire par lot, ex. enrich=400,extract=200")
+    tapes = ap.add_mutually_exclusive_group()
+    tapes.add_argument("--record", default=None, metavar="ZIP", help="enregistre les échanges HTTP (cassette.py)")
+    tapes.add_argument("--replay", default=None, metavar="ZIP", help="rejoue une cassette, sans serveur ni réseau")
+    args = ap.parse_args()
+
+    config = {key: getattr(args, key) for key in DEFAULTS}
+    options = {opt: getattr(args, opt) for opt in ("fulltext", "columns", "entities", "topics", "sentiment", "neardup")}
+    profiler = None
+    if args.profile or args.profile_sample:
+        profiler = profiling.Profiler(args.profile or profiling.DEFAULT_DIR,
+                                      mode="sample" if args.profile_sample else "cprofile",
+                                      hz=args.profile_sample or profiling.DEFAULT_HZ)
+    memory = None
+    if args.memory or args.memory_budget:
+        memory = memwatch.MemoryMonitor(memwatch.parse_budgets(args.memory_budget), trace=bool(args.memory),
+                                        outdir=args.memory)
+    tape = None
+    if args.record or args.replay:
+        tape = cassette.Cassette(args.record or args.replay, mode="record" if args.record else "replay").install()
+    try:
+        res = run_bench(config, options, _overrides(args.set), db=args.db, discover_workers=args.discover_workers,
+                        profiler=profiler, memory=memory, tape=tape)
+    finally:
+        if tape:
+            tape.close()
+    print_results(res)
+    out = args.out or f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(res, f, ensure_ascii=False, indent=1)
+    print(f"Résultats : {out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(res, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# cassette.py
+# Enregistrement / rejeu des échanges HTTP d'un run (sources.TRANSPORT) :
+#   - --record[=PATH] : chaque réponse (statut, en-têtes utiles, corps) et chaque erreur
+#     réseau est ajoutée, dans l'ordre, à une archive zip compressée ; les producteurs du
+#     run (flux RSS, sitemaps, fenêtres GDELT) y sont notés aussi
+#   - --replay[=PATH] : aucun accès réseau, les réponses sortent de l'archive ; une URL
+#     demandée plusieurs fois rejoue ses réponses dans l'ordre (200 puis 304 en mode démon),
+#     URL absente -> CassetteMiss ; délais de politesse ignorés (sources.offline) : le run
+#     ne mesure plus que le parsing / l'enrichissement, à la vitesse du CPU
+#   - producers(cassette) : producteurs enregistrés, pour rejouer un run réel sur une base
+#     neuve (bench.py --replay run.zip)
+# Format : par échange 000001.json (url, statut, en-têtes, erreur) + 000001.body ; roots.json.
+#
+#   python TestV4.py --record=run.zip
+#   python bench.py --replay run.zip --profile profiles/
+#   python cassette.py info run.zip
+import os, sys, json, atexit, zipfile, argparse, threading
+from collections import Counter
+from urllib.parse import urlparse
+
+import sources
+
+DEFAULT_PATH = "cassette.zip"
+ROOTS = "roots.json"
+# corps déjà décompressé par le client : pas de content-encoding
+KEEP_HEADERS = ("content-type", "content-location", "etag", "last-modified", "location")
+
+class CassetteMiss(ConnectionError):
+    """URL absente de la cassette (rejeu)."""
+
+class Cassette:
+    """
+    cassette = Cassette("run.zip", mode="record").install()  # ou mode="replay"
+    ... run ... ; cassette.close() (aussi à la sortie du processus).
+    """
+
+    def __init__(self, path: str, mode: str = "replay"):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"mode inconnu : {mode}")
+        self.path = path
+        self.mode = mode
+        self.offline = mode == "replay"      # lu par sources.offline()
+        self.roots = []
+        self.stats = {"requests": 0, "bytes": 0, "errors": 0, "misses": 0}
+        self._lock = threading.Lock()
+        self._live = None
+        self._pid = os.getpid()
+        if mode == "record":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._zip = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=6)
+            self._seq = 0
+        else:
+            self._zip = zipfile.ZipFile(path)
+            self._by_url = {}           # url -> échanges dans l'ordre d'enregistrement
+            self._next = Counter()      # url -> rang de la prochaine réponse rejouée
+            names = set(self._zip.namelist())
+            for name in sorted(n for n in names if n.endswith(".json") and n != ROOTS):
+                meta = json.loads(self._zip.read(name))
+                meta["name"] = name[:-len(".json")]
+                self._by_url.setdefault(meta["url"], []).append(meta)
+            if ROOTS in names:
+                self.roots = json.loads(self._zip.read(ROOTS))
+
+    def install(self):
+        self._live = sources.TRANSPORT
+        sources.TRANSPORT = self
+        atexit.register(self.close)
+        print(f"Cassette HTTP ({'enregistrement' if self.mode == 'record' else 'rejeu'}) : "
+              f"{os.path.abspath(self.path)}")
+        return self
+
+    # --- transport (cf. sources.live_transport) ---
+    def __call__(self, url: str, timeout: float, headers: dict) -> tuple[int, dict, bytes]:
+        if self.offline:
+            return self._replay(url)
+        try:
+            status, head, body = self._live(url, timeout, headers)
+        except Exception as e:
+            self._save(url, error=f"{type(e).__name__}: {e}")
+            raise
+        self._save(url, status=status, headers={k: v for k, v in head.items() if k in KEEP_HEADERS}, body=body)
+        return status, head, body
+
+    def _save(self, url: str, status: int|None = None, headers: dict|None = None, body: bytes|None = None,
+              error: str|None = None):
+        meta = json.dumps({"url": url, "status": status, "headers": headers or {}, "error": error},
+                          ensure_ascii=False)
+        with self._lock:
+            if self._zip is None:
+                return
+            self._seq += 1
+            name = f"{self._seq:06d}"
+            self._zip.writestr(f"{name}.json", meta)
+            if body is not None:
+                # sitemap .gz déjà compressé : stocké tel quel
+                self._zip.writestr(f"{name}.body", body, compress_type=zipfile.ZIP_STORED
+                                   if body[:2] == b"\x1f\x8b" else zipfile.ZIP_DEFLATED)
+            self._count(body, error or status >= 400)
+
+    def _count(self, body, error):
+        self.stats["requests"] += 1
+        self.stats["bytes"] += len(body or b"")
+        self.stats["errors"] += bool(error)
+
+    def _replay(self, url: str) -> tuple[int, dict, bytes]:
+        with self._lock:
+            entries = self._by_url.get(url)
+            if not entries:
+                self.stats["misses"] += 1
+                raise CassetteMiss(f"absent de la cassette : {url}")
+            i = self._next[url]
+            self._next[url] += 1
+            meta = entries[min(i, len(entries) - 1)]  # au-delà : dernière réponse resservie
+        if meta["error"]:
+            with self._lock:
+                self._count(None, meta["error"])
+            raise ConnectionError(meta["error"])
+        body = self._zip.read(f"{meta['name']}.body")
+        with self._lock:
+            self._count(body, meta["status"] >= 400)
+        return meta["status"], dict(meta["headers"]), body
+
+    def note_root(self, kind: str, **args):
+        """Producteur du run (sources._note_root) ; rejoué par producers()."""
+        if self.offline:
+            return
+        root = {"kind": kind, "args": args}
+        with self._lock:
+            if root not in self.roots:  # le démon relance les mêmes producteurs à chaque passage
+                self.roots.append(root)
+
+    def close(self):
+        if os.getpid() != self._pid:
+            return  # fils forké (pool) : l'archive appartient au parent
+        with self._lock:
+            if self._zip is None:
+                return
+            if self.mode == "record":
+                self._zip.writestr(ROOTS, json.dumps(self.roots, ensure_ascii=False, indent=1))
+            self._zip.close()
+            self._zip = None
+        if sources.TRANSPORT is self:
+            sources.TRANSPORT = self._live
+        s = self.stats
+        print(f"Cassette HTTP : {s['requests']} échanges {'enregistrés' if self.mode == 'record' else 'rejoués'} "
+              f"({s['bytes'] / 2**20:.1f} Mo, {s['errors']} erreurs"
+              + (f", {s['misses']} absents)" if self.offline else ")"))
+
+def producers(cassette: Cassette) -> list:
+    """Producteurs notés à l'enregistrement, dans l'ordre."""
+    make = {"rss": sources.rss_producer, "sitemap": sources.sitemap_producer, "gdelt": sources.gdelt_producer}
+    return [make[root["kind"]](**root["args"]) for root in cassette.roots]
+
+def from_argv(argv=None) -> Cassette|None:
+    """--record[=PATH] : enregistre les échanges HTTP du run ; --replay[=PATH] : les rejoue hors ligne."""
+    argv = sys.argv[1:] if argv is None else argv
+    for arg in argv:
+        name, _, value = arg.partition("=")
+        if name in ("--record", "--replay"):
+            return Cassette(value or DEFAULT_PATH, mode=name[2:]).install()
+    return None
+
+def info(path: str):
+    cassette = Cassette(path)
+    entries = [m for ms in cassette._by_url.values() for m in ms]
+    statuses = Counter(m["error"] and "erreur" or str(m["status"]) for m in entries)
+    domains = Counter(urlparse(m["url"]).netloc for m in entries)
+    size = sum(i.file_size for i in cassette._zip.infolist() if i.filename.endswith(".body"))
+    print(f"{path} : {len(entries)} échanges, {len(cassette._by_url)} URLs, "
+          f"{size / 2**20:.1f} Mo de corps ({os.path.getsize(path) / 2**20:.1f} Mo sur disque)")
+    print("  statuts : " + "  ".join(f"{s}={n}" for s, n in sorted(statuses.items())))
+    for domain, n in domains.most_common(15):
+        print(f"  {domain:<40} {n:>6}")
+    for root in cassette.roots:
+        args = root["args"]
+        print(f"  producteur {root['kind']:<8} {args.get('url') or (args.get('config') or {}).get('url') or ''}"
+              + (f"{len(args['filters'])} fenêtres" if root["kind"] == "gdelt" else ""))
+
+def main():
+    ap = argparse.ArgumentParser(description="Cassette HTTP (enregistrement / rejeu d'un run)")
+    ap.add_argument("cmd", choices=["info"])
+    ap.add_argument("path", nargs="?", default=DEFAULT_PATH)
+    args = ap.parse_args()
+    info(args.path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# daemon.py
+# Mode démon des scripts d'ingestion (option --daemon) : un seul processus qui garde
+# modèles, caches et connexions chauds et repasse chaque flux à son propre rythme.
+#   - rythme initial appris de l'historique (table articles : articles de la source
+#     publiés dans les 24 h précédant sa dernière récupération), puis corrigé à chaque
+#     passage (moyenne mobile exponentielle du nb de nouveaux articles / heure)
+#   - intervalle = TARGET_PER_POLL / débit, borné entre MIN_INTERVAL_S et MAX_INTERVAL_S :
+#     BBC World repassé toutes les quelques minutes, un flux calme quelques fois par jour
+#   - GET conditionnel (ETag / Last-Modified) : un flux inchangé coûte une réponse 304
+#   - état persistant (table feed_state, migration 10) : un redémarrage reprend le planning
+#   - --shard : plusieurs démons sur la même base se partagent les flux par site (shard.py)
+import time, random, signal
+from datetime import datetime, UTC
+from email.utils import parsedate_to_datetime
+
+from ingest import Ingest
+from metrics import start_from_env
+from pipeline import Pipeline, print_report
+from shard import site_of
+from sources import rss_producer, sitemap_producer
+
+MIN_INTERVAL_S = 120
+MAX_INTERVAL_S = 6 * 3600
+DEFAULT_INTERVAL_S = 900      # flux sans historique, en attendant les premières observations
+TARGET_PER_POLL = 2.0         # nb moyen de nouveaux articles visé par passage
+HISTORY = 200                 # derniers articles de la source pris en compte...
+HISTORY_DAYS = 14             # ... publiés depuis au plus ce nombre de jours
+RECENT_S = 24 * 3600          # fenêtre de densité avant la dernière récupération
+EWMA = 0.3                    # poids d'une nouvelle observation dans le débit
+JITTER = 0.1                  # ±10 % : les flux ne restent pas alignés sur la même seconde
+
+FEED_COLS = ["feed", "kind", "source", "rate", "interval_s", "last_poll", "next_poll",
+             "last_new", "polls", "etag", "modified"]
+
+def parse_date(text) -> float|None:
+    """Timestamp d'une date RSS (RFC 822), ISO 8601 ou YYYY-MM-DD ; None si illisible."""
+    if not text:
+        return None
+    text = str(text).strip()
+    try:
+        d = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            d = parsedate_to_datetime(text)
+        except (TypeError, ValueError):
+            return None
+    if d.tzinfo is None:
+        d = d.replace(tzinfo=UTC)
+    return d.timestamp()
+
+def interval_for(rate: float|None) -> float:
+    """Intervalle (s) pour un débit en articles / heure."""
+    if not rate:
+        return MAX_INTERVAL_S if rate == 0 else DEFAULT_INTERVAL_S
+    return min(MAX_INTERVAL_S, max(MIN_INTERVAL_S, TARGET_PER_POLL / rate * 3600))
+
+def history_rate(store, source: str, now: float|None = None) -> float|None:
+    """
+    Articles / heure publiés par `source` : articles datés des 24 h précédant sa dernière
+    récupération (fetched_at) ; à défaut, moyenne sur les HISTORY derniers articles.
+    None si moins de 3 articles datés.
+    """
+    now = now or time.time()
+    with store.backend.connection() as con:
+        cur = con.cursor()
+        cur.execute(f"SELECT date, fetched_at FROM articles WHERE source={store.ph} ORDER BY id DESC LIMIT {HISTORY}",
+                    (source,))
+        rows = cur.fetchall()
+    ref = max([t for t in (parse_date(f) for _, f in rows) if t] or [now])
+    cutoff = ref - HISTORY_DAYS * 86400
+    ts = [t for t in (parse_date(d) or parse_date(f) for d, f in rows) if t and cutoff <= t <= ref + 3600]
+    if len(ts) < 3:
+        return None
+    # un flux RSS garde aussi des articles anciens : on mesure la densité récente
+    recent = [t for t in ts if t >= ref - RECENT_S]
+    if len(recent) >= 3:
+        return len(recent) / (RECENT_S / 3600)
+    return len(ts) / (max(ref - min(ts), 3600) / 3600)
+
+class Feed:
+    """Un flux RSS ou un sitemap, avec son planning."""
+
+    def __init__(self, key: str, kind: str, config=None, source: str|None = None):
+        self.key = key
+        self.kind = kind
+        self.config = config
+        self.source = source
+        self.site = site_of(key)    # clé de partage entre nœuds (--shard)
+        self.rate = None            # articles / heure
+        self.interval_s = DEFAULT_INTERVAL_S
+        self.last_poll = None
+        self.next_poll = 0.0
+        self.last_new = None
+        self.polls = 0
+        self.http = {}              # etag / modified / source (rss_producer)
+
+    def producer(self):
+        if self.kind == "sitemap":
+            return sitemap_producer(self.config)
+        return rss_producer(self.key, state=self.http)
+
+    def row(self):
+        return (self.key, self.kind, self.source, self.rate, self.interval_s, self.last_poll, self.next_poll,
+                self.last_new, self.polls, self.http.get("etag"), self.http.get("modified"))
+
+    def load(self, row: dict):
+        for c in ("source", "rate", "interval_s", "last_poll", "next_poll", "last_new", "polls"):
+            if row[c] is not None:
+                setattr(self, c, row[c])
+        self.http = {k: row[k] for k in ("etag", "modified") if row[k]}
+
+class FeedScheduler:
+    """Planning par flux, persistant dans feed_state."""
+
+    def __init__(self, store, feeds):
+        self.store = store
+        self.feeds = list(feeds)
+        self.active = self.feeds    # flux traités par ce nœud (tous, sauf --shard)
+        saved = self._saved()
+        for feed in self.feeds:
+            if feed.key in saved:
+                feed.load(saved[feed.key])
+            elif feed.source:
+                feed.rate = history_rate(store, feed.source)
+                feed.interval_s = interval_for(feed.rate)
+
+    def _saved(self) -> dict:
+        with self.store.backend.connection() as con:
+            cur = con.cursor()
+            cur.execute(f"SELECT {', '.join(FEED_COLS)} FROM feed_state")
+            return {row[0]: dict(zip(FEED_COLS, row)) for row in cur.fetchall()}
+
+    def assign(self, cluster):
+        """--shard : flux des sites de ce nœud ; un flux gagné reprend l'état laissé par l'ancien propriétaire."""
+        owned = [f for f in self.feeds if cluster.owns(f.site)]
+        gained = [f for f in owned if f not in self.active]
+        if gained:
+            saved = self._saved()
+            for feed in gained:
+                if feed.key in saved:
+                    feed.load(saved[feed.key])
+        lost = [f for f in self.active if f not in owned]
+        if gained or lost:
+            print(f"Shard : {len(owned)}/{len(self.feeds)} flux sur ce nœud (+{len(gained)}, -{len(lost)})")
+        self.active = owned
+        cluster.feeds = len(owned)
+
+    def due(self, now: float) -> list[Feed]:
+        return [f for f in self.active if f.next_poll <= now]
+
+    def next_time(self) -> float:
+        return min((f.next_poll for f in self.active), default=time.time() + MIN_INTERVAL_S)
+
+    def observe(self, feed: Feed, new: int, now: float):
+        """Passage terminé avec `new` nouveaux articles : débit, intervalle et prochain passage."""
+        feed.source = feed.http.get("source") or feed.source
+        if feed.rate is None and feed.source:
+            feed.rate = history_rate(self.store, feed.source, now)  # 1er passage : historique
+        elif feed.last_poll is not None:
+            observed = new / (max(now - feed.last_poll, 60) / 3600)
+            feed.rate = observed if feed.rate is None else EWMA * observed + (1 - EWMA) * feed.rate
+        feed.interval_s = interval_for(feed.rate)
+        feed.last_poll, feed.last_new, feed.polls = now, new, feed.polls + 1
+        feed.next_poll = now + feed.interval_s * random.uniform(1 - JITTER, 1 + JITTER)
+        self.save([feed])
+
+    def save(self, feeds):
+        p = self.store.ph
+        with self.store.backend.connection() as con:
+            con.cursor().executemany(f"REPLACE INTO feed_state ({', '.join(FEED_COLS)}) "
+                                     f"VALUES ({', '.join([p] * len(FEED_COLS))})", [f.row() for f in feeds])
+
+def _tagged(feed: Feed, producer):
+    # clé du flux sur chaque élément : Ingest compte les nouveaux articles par flux
+    for item in producer:
+        item["_feed"] = feed.key
+        yield item
+
+def feeds_from(rss_urls=(), sitemaps=()) -> list[Feed]:
+    return ([Feed(url, "rss") for url in rss_urls]
+            + [Feed(c["url"], "sitemap", config=c, source=f"sitemap-{c['domain']}") for c in sitemaps])
+
+def serve(store, rss_urls=(), sitemaps=(), discover_workers: int = 4, overrides: dict|None = None,
+          profiler=None, memory=None, cluster=None, **options):
+    """
+    Boucle du démon : à chaque échéance, un passage du pipeline sur les flux dus.
+    options : cf. ingest.Ingest (fulltext, columns, entities, topics, sentiment, jobs...).
+    profiler : profiling.Profiler, cumulé sur tous les passages (échantillonnage conseillé).
+    memory : memwatch.MemoryMonitor ; une taille de lot réduite le reste aux passages suivants.
+    cluster : shard.Cluster (--shard) ; seuls les flux des sites de ce nœud sont repassés.
+    Arrêt : SIGTERM ou Ctrl-C (le passage en cours se termine proprement).
+    """
+    store.ensure_schema()
+    start_from_env()
+    ingest = Ingest(store, **options)  # NER, résolveur d'entités, modèle de topics : chargés une fois
+    sched = FeedScheduler(store, feeds_from(rss_urls, sitemaps))
+    stopping = []
+    current = []
+    shrunk = {}
+
+    def on_term(signum, frame):
+        stopping.append(signum)
+        for p in current:
+            p.stop()
+
+    previous = signal.signal(signal.SIGTERM, on_term)
+    print(f"Démon : {len(sched.feeds)} flux")
+    if cluster:
+        cluster.join()
+    for hook in (profiler, memory):
+        if hook:
+            hook.start()
+    try:
+        while not stopping:
+            now = time.time()
+            if cluster:
+                sched.assign(cluster)  # anneau relu par le battement : rééquilibrage entre passages
+            due = sched.due(now)
+            if not due:
+                time.sleep(min(max(sched.next_time() - now, 0.5), 30))
+                continue
+            ingest.new_round()
+            stages = ingest.stages(dict(overrides or {}, **shrunk))
+            pipeline = Pipeline(stages, discover_workers=discover_workers, profiler=profiler, memory=memory)
+            current[:] = [pipeline]
+            report = pipeline.run([_tagged(f, f.producer()) for f in due])
+            current.clear()
+            if memory:
+                # lots réduits par un dépassement de budget : conservés pour les passages suivants
+                shrunk.update({s.name: dict((overrides or {}).get(s.name, {}), batch=s.batch)
+                               for s in stages if s.name in memory.stats and memory.stats[s.name]["shrinks"]})
+            if profiler and profiler.mode == "cprofile":
+                profiler.dump()  # profils à jour après chaque passage
+            if report["discovered"] or ingest.added:
+                print_report(report)
+            done = time.time()
+            for f in due:
+                sched.observe(f, ingest.new_by_feed.get(f.key, 0), done)
+                print(f"  {f.source or f.key} : +{f.last_new}, "
+                      f"{f.rate or 0:.1f} art./h, prochain passage dans {f.interval_s / 60:.0f} min")
+            if report["stopped"]:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+        if cluster:
+            cluster.leave()
+        for hook in (profiler, memory):
+            if hook:
+                hook.stop()
+    print("Démon arrêté")
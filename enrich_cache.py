@@ -0,0 +1,176 @@
+# enrich_cache.py
+# Cache d'enrichissement partagé par le NER (spaCy), les topics et VADER.
+#
+# Clé = hash(texte normalisé) + étape + version du modèle/lexique : un texte déjà
+# vu (entrée RSS re-pollée, ligne GDELT répétée, retraitement) ne repasse plus
+# par le modèle. Deux niveaux :
+#   - LRU en mémoire (process courant)
+#   - fichier SQLite sur disque, éviction LRU quand la taille dépasse max_bytes
+import os, re, json, time, hashlib, sqlite3, threading, unicodedata
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+TOUCH_FLUSH = 1000  # lectures disque dont accessed_at est écrit en un seul executemany
+DEFAULT_PATH = os.environ.get("ENRICH_CACHE_PATH", os.path.join(os.path.dirname(__file__), "enrich_cache.db"))
+MISS = object()
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text or "")).strip()
+
+def cache_key(stage: str, version: str, text: str) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{stage}\x00{version}\x00".encode("utf-8"))
+    h.update(normalize_text(text).encode("utf-8"))
+    return h.digest()
+
+# ---------- Versions (invalident le cache quand le modèle change) ----------
+def rules_version(rules) -> str:
+    """Empreinte d'un jeu de règles (TOPIC_RULES...)."""
+    return hashlib.blake2b(json.dumps(rules, sort_keys=True, ensure_ascii=False).encode("utf-8"),
+                           digest_size=8).hexdigest()
+
+def package_version(name: str) -> str:
+    """Version d'une dépendance installée (lexique VADER...), "?" si introuvable."""
+    try:
+        from importlib.metadata import version
+        return f"{name}-{version(name)}"
+    except Exception:
+        return f"{name}-?"
+
+def ner_route(link: str|None) -> str:
+    """Aiguillage du NER (nlp_worker) : le modèle dépend du domaine."""
+    dom = (urlparse(link or "").netloc or "").lower()
+    if "bbc" in dom:
+        return "en"
+    if any(k in dom for k in ("lemonde.fr", "lesechos.fr")):
+        return "fr"
+    return "auto"
+
+def doc_entities(doc) -> list:
+    """Entités d'un Doc spaCy sous forme sérialisable : [(texte, label, début, fin), ...]."""
+    if doc is None:
+        return []
+    return [(e.text, e.label_, e.start_char, e.end_char) for e in doc.ents]
+
+# ---------- Cache ----------
+class EnrichmentCache:
+    def __init__(self, path: str = DEFAULT_PATH, mem_items: int = 20000,
+                 max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.mem_items = mem_items
+        self.max_bytes = max_bytes
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self._con = None
+        self._size = 0
+        self._touched = {}   # key -> dernière lecture disque, pas encore écrite (accessed_at)
+
+    def _db(self):
+        if self._con is None:
+            con = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")  # cache reconstructible : pas de fsync par écriture
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS enrich_cache (
+                    key BLOB PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            con.execute("CREATE INDEX IF NOT EXISTS idx_enrich_cache_accessed ON enrich_cache(accessed_at)")
+            self._size = con.execute("SELECT COALESCE(SUM(size), 0) FROM enrich_cache").fetchone()[0]
+            self._con = con
+        return self._con
+
+    def _remember(self, key, value):
+        self._mem[key] = value
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.mem_items:
+            self._mem.popitem(last=False)
+
+    def get(self, stage: str, version: str, text: str):
+        """Valeur en cache ou MISS."""
+        key = cache_key(stage, version, text)
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return self._mem[key]
+            con = self._db()
+            row = con.execute("SELECT value FROM enrich_cache WHERE key=?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return MISS
+            # accessed_at écrit par paquets (put, éviction, close) : une lecture reste une lecture
+            self._touched[key] = time.time()
+            if len(self._touched) >= TOUCH_FLUSH:
+                self._flush_touched(con)
+                con.commit()
+            value = json.loads(row[0])
+            self._remember(key, value)
+            self.hits += 1
+            return value
+
+    def put(self, stage: str, version: str, text: str, value):
+        key = cache_key(stage, version, text)
+        blob = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            # round-trip JSON : même forme de valeur qu'après une relecture disque
+            self._remember(key, json.loads(blob))
+            con = self._db()
+            self._flush_touched(con)
+            old = con.execute("SELECT size FROM enrich_cache WHERE key=?", (key,)).fetchone()
+            con.execute("INSERT OR REPLACE INTO enrich_cache (key, value, size, accessed_at) VALUES (?,?,?,?)",
+                        (key, blob, len(blob) + len(key), time.time()))
+            self._size += len(blob) + len(key) - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict(con)
+            con.commit()
+
+    def _flush_touched(self, con):
+        if self._touched:
+            con.executemany("UPDATE enrich_cache SET accessed_at=? WHERE key=?",
+                            [(t, k) for k, t in self._touched.items()])
+            self._touched.clear()
+
+    def _evict(self, con):
+        # on redescend à 90 % de la taille max en supprimant les moins récemment lus
+        target = int(self.max_bytes * 0.9)
+        freed, doomed = 0, []
+        for key, size in con.execute("SELECT key, size FROM enrich_cache ORDER BY accessed_at"):
+            if self._size - freed <= target:
+                break
+            doomed.append((key,))
+            freed += size
+        con.executemany("DELETE FROM enrich_cache WHERE key=?", doomed)
+        self._size -= freed
+
+    def cached(self, stage: str, version: str, text: str, compute):
+        """Renvoie la valeur en cache, sinon compute(text) (mis en cache)."""
+        value = self.get(stage, version, text)
+        if value is MISS:
+            value = compute(text)
+            self.put(stage, version, text, value)
+            value = self._mem.get(cache_key(stage, version, text), value)
+        return value
+
+    def close(self):
+        with self._lock:
+            if self._con is not None:
+                self._flush_touched(self._con)
+                self._con.commit()
+                self._con.close()
+                self._con = None
+
+    def _after_fork(self):
+        # fils d'un pool (fork) : ni la connexion SQLite ni le verrou du parent ne sont réutilisables
+        self._lock = threading.Lock()
+        self._con = None
+        self._touched = {}
+
+# cache partagé par défaut (fichier enrich_cache.db à côté des scripts)
+CACHE = EnrichmentCache()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=CACHE._after_fork)
@@ -0,0 +1,212 @@
+# entity_canon.py
+# Canonicalisation des entités : "Macron", "Emmanuel Macron", "M. Macron" -> un seul
+# identifiant (entity_canon.id), via une table d'alias persistante (migration 7)
+# et un mémo en mémoire.
+#
+# Règles (dans l'ordre) :
+#   1. clé normalisée : minuscules, sans accents, sans civilité/titre ni article en
+#      tête (M., Mme, Dr, président..., la, l', the), sans possessif final ('s) ;
+#      mention réduite à une civilité ("M.", "Mme") : clé vide, mention ignorée
+#   2. alias exact déjà connu -> son canonique
+#   3. PERSON, nom seul ("Macron") -> la personne connue avec ce nom de famille,
+#      si elle est unique
+#   4. PERSON, nom complet dont le nom de famille n'était connu que seul -> nouveau
+#      canonique, dans lequel le canonique du nom seul est fusionné : ses alias
+#      ("macron", "~macron") et ses mentions déjà stockées passent au nom complet
+#   5. sinon nouveau canonique
+# Plusieurs processus (workers jobqueue, pool du backfill) peuvent créer le même
+# alias : la valeur stockée fait foi, relue après l'INSERT IGNORE.
+import re
+from collections import OrderedDict
+
+from topics import fold
+
+IN_CHUNK = 500
+AMBIGUOUS = 0  # alias de nom de famille partagé par plusieurs personnes
+MEMO_MAX = 200_000  # alias / noms gardés en mémoire (LRU, mode démon)
+
+HONORIFICS = {
+    "m", "mme", "mlle", "mr", "mrs", "ms", "dr", "pr",
+    "president", "presidente", "ministre", "minister", "general",
+}
+DETERMINERS = {"le", "la", "les", "l", "the"}
+LABEL_MAP = {"PER": "PERSON"}  # modèles FR -> libellé EN
+# tables dont la colonne canon_id suit une fusion de canoniques (règle 4)
+CANON_TABLES = ("entity_alias", "entities", "article_entity_sentiment")
+
+_PUNCT_RE = re.compile(r"[^\w\s'-]+")
+_SPACE_RE = re.compile(r"\s+")
+
+def canon_label(label: str) -> str:
+    return LABEL_MAP.get(label, label)
+
+def alias_key(text: str) -> str:
+    """Forme normalisée d'une mention (clé de la table entity_alias)."""
+    t = fold(text or "").replace("’", "'")
+    t = re.sub(r"'s$", "", t.strip())
+    t = re.sub(r"^l'", "", t)   # l'Élysée -> elysee
+    toks = _SPACE_RE.sub(" ", _PUNCT_RE.sub(" ", t)).strip().split(" ")
+    while toks and (toks[0] in HONORIFICS or toks[0] in DETERMINERS):
+        toks.pop(0)
+    return " ".join(toks).strip(" '-")
+
+def _surname_key(key: str) -> str:
+    return "~" + key.rsplit(" ", 1)[-1]
+
+class EntityResolver:
+    """Résolution mention -> (canon_id, nom canonique), dans la base de l'ArticleStore."""
+
+    def __init__(self, store, memo_max: int = MEMO_MAX):
+        self.store = store
+        self.ph = store.ph
+        self.memo_max = memo_max
+        self._memo = OrderedDict()    # (label, alias_key) -> canon_id
+        self._names = OrderedDict()   # canon_id -> nom affiché
+
+    def _remember(self, lru, key, value):
+        lru[key] = value
+        lru.move_to_end(key)
+        while len(lru) > self.memo_max:
+            lru.popitem(last=False)
+
+    def _known(self, label, key):
+        cid = self._memo.get((label, key))
+        if cid is not None:
+            self._memo.move_to_end((label, key))
+        return cid
+
+    def _name(self, cid):
+        name = self._names.get(cid)
+        if name is not None:
+            self._names.move_to_end(cid)
+        return name
+
+    def _load(self, cur, label, keys):
+        def cached(k):
+            cid = self._memo.get((label, k))
+            return cid is not None and (not cid or cid in self._names)   # nom évincé : relu aussi
+        keys = [k for k in dict.fromkeys(keys) if not cached(k)]
+        p = self.ph
+        for i in range(0, len(keys), IN_CHUNK):
+            chunk = keys[i:i + IN_CHUNK]
+            marks = ",".join([p] * len(chunk))
+            cur.execute(f"""
+                SELECT a.alias_key, a.canon_id, c.name FROM entity_alias a
+                LEFT JOIN entity_canon c ON c.id = a.canon_id
+                WHERE a.label={p} AND a.alias_key IN ({marks})
+            """, [label, *chunk])
+            for key, cid, name in cur.fetchall():
+                self._remember(self._memo, (label, key), cid)
+                if cid and name:
+                    self._remember(self._names, cid, name)
+
+    def _alias(self, cur, label, key, cid) -> int:
+        """Crée l'alias s'il n'existe pas ; retourne le canon_id stocké (peut-être celui d'un autre processus)."""
+        p = self.ph
+        ins = self.store.backend.insert_ignore
+        cur.execute(f"{ins} INTO entity_alias (label, alias_key, canon_id) VALUES ({p},{p},{p})",
+                    (label, key, cid))
+        # lecture verrouillante en MariaDB : la ligne validée par un autre processus, pas l'instantané
+        lock = " FOR UPDATE" if self.store.backend.dialect == "mysql" else ""
+        cur.execute(f"""
+            SELECT a.canon_id, c.name FROM entity_alias a
+            LEFT JOIN entity_canon c ON c.id = a.canon_id
+            WHERE a.label={p} AND a.alias_key={p}{lock}
+        """, (label, key))
+        stored, name = cur.fetchone()
+        self._remember(self._memo, (label, key), stored)
+        if stored and name:
+            self._remember(self._names, stored, name)
+        return stored
+
+    def _new_canon(self, cur, label, name):
+        p = self.ph
+        cur.execute(f"INSERT INTO entity_canon (label, name) VALUES ({p},{p})", (label, name))
+        cid = cur.lastrowid
+        self._remember(self._names, cid, name)
+        return cid
+
+    def _single_name(self, cid) -> bool:
+        return " " not in alias_key(self._name(cid) or "")
+
+    def _register_surname(self, cur, label, key, cid):
+        sk = _surname_key(key)
+        known = self._known(label, sk)
+        if known is None:
+            known = self._alias(cur, label, sk, cid)
+        if known in (cid, AMBIGUOUS):
+            return
+        if self._single_name(known) and " " in key:
+            # nom seul connu ("Macron") : fusionné dans le premier nom complet (règle 4)
+            self._merge(cur, known, cid)
+            return
+        # deux personnes distinctes : alias ambigu
+        p = self.ph
+        cur.execute(f"UPDATE entity_alias SET canon_id={p} WHERE label={p} AND alias_key={p}",
+                    (AMBIGUOUS, label, sk))
+        self._remember(self._memo, (label, sk), AMBIGUOUS)
+
+    def _merge(self, cur, old, new):
+        """Canonique `old` fondu dans `new` : alias, mentions et sentiment par entité repointés."""
+        p = self.ph
+        for table in CANON_TABLES:
+            cur.execute(f"UPDATE {table} SET canon_id={p} WHERE canon_id={p}", (new, old))
+        cur.execute(f"DELETE FROM entity_canon WHERE id={p}", (old,))
+        for k, cid in self._memo.items():
+            if cid == old:
+                self._memo[k] = new
+        self._names.pop(old, None)
+
+    def _resolve_one(self, cur, label, text, key):
+        cid = self._known(label, key)
+        if cid:
+            return cid
+        person = label == "PERSON"
+        if person and " " not in key:
+            cid = self._known(label, _surname_key(key))      # règle 3
+        created = not cid
+        if created:
+            cid = self._new_canon(cur, label, text)           # règles 4 et 5
+        stored = self._alias(cur, label, key, cid)
+        if stored != cid:
+            # alias créé entre-temps par un autre processus : son canonique fait foi
+            if created:
+                cur.execute(f"DELETE FROM entity_canon WHERE id={self.ph}", (cid,))
+                self._names.pop(cid, None)
+            return stored
+        if person:
+            self._register_surname(cur, label, key, cid)
+        return cid
+
+    def resolve_many(self, mentions) -> list[tuple[int|None, str]]:
+        """
+        mentions : [(texte, label), ...] -> [(canon_id, nom canonique), ...] (même ordre).
+        Une requête groupée par lot pour les alias connus ; les noms complets sont
+        traités avant les noms seuls pour que "Macron" rejoigne "Emmanuel Macron".
+        """
+        items = [(canon_label(label), text, alias_key(text)) for text, label in mentions]
+        by_label = {}
+        for label, _, key in items:
+            if key:
+                by_label.setdefault(label, set()).update((key, _surname_key(key)))
+        order = sorted((i for i, it in enumerate(items) if it[2]),
+                       key=lambda i: -items[i][2].count(" "))
+        ids = [None] * len(items)
+        with self.store.backend.connection() as con:
+            cur = con.cursor()
+            for label, keys in by_label.items():
+                self._load(cur, label, keys)
+            for i in order:
+                label, text, key = items[i]
+                ids[i] = self._resolve_one(cur, label, text, key)
+        return [(cid, (self._name(cid) or text) if cid else text)
+                for cid, (_, text, _) in zip(ids, items)]
+
+    def annotate(self, rows) -> list[tuple]:
+        """
+        rows (article_id, texte, label, ...) -> mêmes lignes + canon_id en dernière colonne
+        (store.insert_entities, store.insert_entity_sentiment).
+        """
+        rows = list(rows)
+        ids = self.resolve_many([(r[1], r[2]) for r in rows])
+        return [(*r, cid) for r, (cid, _) in zip(rows, ids)]
@@ -0,0 +1,62 @@
+# entity_sentiment.py
+# Sentiment par entité, au coût du NER : on réutilise les phrases déjà segmentées
+# par spaCy (sents renvoyées avec les entités), on score chaque phrase une fois
+# avec le lexique de la langue de l'article (lexicon_sentiment : VADER en anglais,
+# lexique français sinon ; lot + cache d'enrichissement) et on attribue le score
+# aux entités mentionnées dans la phrase. Résultat : table article_entity_sentiment
+# (migration 8).
+import re
+from bisect import bisect_right
+
+import lexicon_sentiment
+
+_SENT_RE = re.compile(r"[^.!?\n]+[.!?]*")  # repli si le pipeline spaCy ne segmente pas
+
+def available(lang: str = lexicon_sentiment.DEFAULT_LANG) -> bool:
+    return lexicon_sentiment.available(lang)
+
+def fallback_sentences(text: str) -> list[tuple[int, int]]:
+    return [m.span() for m in _SENT_RE.finditer(text or "") if m.group().strip()]
+
+def score_sentences(texts, langs) -> list[dict]:
+    """Lexique de la langue de chaque phrase ; une seule évaluation par phrase distincte (cache partagé)."""
+    return lexicon_sentiment.score_texts(texts, langs)
+
+def _sentence_of(starts, pos):
+    return bisect_right(starts, pos) - 1
+
+def entity_sentiment_rows(items) -> list[tuple]:
+    """
+    items : [(article_id, texte, ents, sents, lang)] (cf. ner_entities_many).
+    Retourne des lignes (article_id, entité, label, phrases, compound, pos, neu, neg, scorer)
+    pour store.insert_entity_sentiment ; moyenne sur les phrases distinctes où l'entité apparaît.
+    scorer : version du lexique utilisé ("lex1-en-vaderSentiment-3.3.2", "lex1-fr-...").
+    """
+    # 1) phrases de chaque entité (bisect sur les débuts de phrase)
+    per_article, to_score, langs = [], [], []
+    for article_id, text, ents, sents, lang in items:
+        lang = lexicon_sentiment.lang_code(lang)
+        if not article_id or not ents or not available(lang):
+            continue
+        sents = sorted(sents or fallback_sentences(text))
+        starts = [a for a, _ in sents]
+        mentions = {}
+        for ent_text, label, start, _ in ents:
+            i = _sentence_of(starts, start)
+            if i < 0 or start >= sents[i][1]:
+                continue
+            mentions.setdefault((ent_text, label), set()).add(len(to_score) + i)
+        per_article.append((article_id, mentions, lexicon_sentiment.version(lang)))
+        to_score += [text[a:b].strip() for a, b in sents]
+        langs += [lang] * len(sents)
+    # 2) un lot sur toutes les phrases (regroupées par lexique)
+    scores = score_sentences(to_score, langs)
+    # 3) agrégation par entité
+    rows = []
+    for article_id, mentions, scorer in per_article:
+        for (ent_text, label), idx in mentions.items():
+            n = len(idx)
+            agg = {k: sum(scores[i][k] for i in idx) / n for k in ("compound", "pos", "neu", "neg")}
+            rows.append((article_id, ent_text, label, n, round(agg["compound"], 4), round(agg["pos"], 4),
+                         round(agg["neu"], 4), round(agg["neg"], 4), scorer))
+    return rows
@@ -0,0 +1,83 @@
+# gazetteer.py
+# Gazetteer compilé (pays / villes) : tous les noms dans un seul automate
+# Aho-Corasick (topics.KeywordAutomaton), un passage sur le texte quel que soit
+# le nombre de lieux. Noms et texte sont repliés (minuscules, sans accents) :
+# "Taïwan" / "taiwan", "États-Unis" / "etats-unis" ne font qu'une entrée.
+#
+# Optionnel : GEONAMES_CITIES=/chemin/cities15000.txt (dump GeoNames) ajoute
+# les villes du monde (nom, nom ASCII, noms alternatifs).
+import os
+
+from topics import KeywordAutomaton, fold
+
+COUNTRY_NAMES = {
+    # EN
+    "france","germany","spain","italy","belgium","denmark","united kingdom","uk","russia",
+    "china","taiwan","united states","usa","u.s.","u.s.a.","canada","mexico",
+    # FR
+    "france","allemagne","espagne","italie","belgique","danemark","royaume-uni","russie",
+    "chine","taïwan","etats-unis","états-unis","canada","mexique",
+}
+
+class Gazetteer:
+    def __init__(self, countries=(), cities=()):
+        self._kind = {}   # nom replié -> (kind, nom affiché)
+        for name in sorted(countries):  # ordre stable : variantes repliées identiques
+            self._kind.setdefault(fold(name), ("country", name.title()))
+        for name in cities:
+            self._kind.setdefault(fold(name), ("city", name))
+        self._automaton = None
+
+    def add_cities(self, names):
+        for name in names:
+            self._kind.setdefault(fold(name), ("city", name))
+        self._automaton = None
+
+    def load_geonames(self, path: str, min_population: int = 0):
+        """Ajoute les villes d'un dump GeoNames (cities500/1000/15000.txt, TSV)."""
+        names = []
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                cols = line.rstrip("\n").split("\t")
+                if len(cols) < 15:
+                    continue
+                try:
+                    if int(cols[14] or 0) < min_population:
+                        continue
+                except ValueError:
+                    pass
+                names.append(cols[1])
+                names.append(cols[2])
+                names += [a for a in cols[3].split(",") if len(a) > 2]
+        self.add_cities(n for n in names if n)
+
+    def _compiled(self):
+        if self._automaton is None:
+            self._automaton = KeywordAutomaton((k, k) for k in self._kind)
+        return self._automaton
+
+    def find(self, text: str) -> list[tuple[int, int, str, str]]:
+        """(début, fin, kind, nom) des lieux trouvés, plus long match à gauche, sans chevauchement."""
+        hits = sorted(self._compiled().finditer(text or ""), key=lambda h: (h[0], -h[1]))
+        out, last_end = [], 0
+        for start, end, key in hits:
+            if start < last_end:
+                continue
+            kind, name = self._kind[key]
+            out.append((start, end, kind, name))
+            last_end = end
+        return out
+
+    def kind_of(self, name: str) -> str|None:
+        """"country", "city" ou None."""
+        hit = self._kind.get(fold(name or "").strip())
+        return hit[0] if hit else None
+
+    def is_country(self, name: str) -> bool:
+        return self.kind_of(name) == "country"
+
+# gazetteer par défaut, compilé à la première recherche
+GAZETTEER = Gazetteer(countries=COUNTRY_NAMES)
+if os.environ.get("GEONAMES_CITIES"):
+    GAZETTEER.load_geonames(os.environ["GEONAMES_CITIES"],
+                            int(os.environ.get("GEONAMES_MIN_POPULATION", "0")))
@@ -0,0 +1,544 @@
+# ingest.py
+# Étapes "articles" du pipeline (pipeline.py), communes à tous les scripts d'ingestion :
+#   discover  : producteurs RSS / sitemap / GDELT (sources.py)            threads
+#   fetch     : liens déjà connus / quasi-doublons écartés, page HTML     threads (E/S)
+#   extract   : plein texte + métadonnées des pages sitemap               processus (CPU)
+#   enrich    : NER en lot (worker NLP), topics règles + modèle           thread
+#   sentiment : sentiment par entité sur les phrases du NER               thread
+#   store     : insert_many + mises à jour / entités / topics en lots     1 thread (écrivain unique)
+# Les options (fulltext, columns, entities, topics, sentiment) reprennent ce que
+# faisait chaque script : v3 (entités + topics), BarthelemySitemaps (idem + sitemaps),
+# TestV4 / V5mariaDB (plein texte + colonnes JSON + sentiment par entité).
+#
+# Mode file de travail (jobqueue.py) : run(..., jobs=JobQueue(store)) ne fait que
+# découvrir et insérer les articles, fetch / enrich deviennent des jobs repris par
+# des workers (python ingest.py work fetch|enrich), sur une ou plusieurs machines.
+#
+# Métriques par étape / flux / domaine (metrics.py) : METRICS_PORT=9108 (Prometheus)
+# ou METRICS_JSON=metrics.json (instantanés périodiques).
+import json, re, threading, time, traceback, unicodedata, argparse
+from functools import partial
+from urllib.parse import urlparse
+
+from pipeline import Stage, Pipeline, cpu_workers, print_report
+from metrics import METRICS, start_from_env
+from jobqueue import JobQueue, add_store_args, store_from_args
+from sources import decode_html, domain_of, extract_batch, http_get, offline, record_extract
+from storage import publisher_update, fulltext_update
+from urlcanon import canonicalize_url
+from neardup import NearDupIndex, simhash
+from enrich_cache import CACHE, MISS, ner_route, normalize_text
+from nlp_worker import NLPService
+from gazetteer import GAZETTEER
+from roles import extract_roles
+from entity_canon import EntityResolver, canon_label
+from entity_sentiment import entity_sentiment_rows
+from topics import TOPICS
+from topic_model import load_model, article_text
+
+# parallélisme et taille de lot par étape (surchargés par Ingest.stages(overrides))
+STAGE_DEFAULTS = {
+    "fetch":     {"workers": 16, "batch": 8, "max_wait": 0.2},
+    "extract":   {"workers": cpu_workers(), "batch": 8, "max_wait": 0.2},
+    "enrich":    {"workers": 1, "batch": 64, "max_wait": 1.0},  # NLPService : une connexion
+    "sentiment": {"workers": 1, "batch": 64, "max_wait": 1.0},
+    "store":     {"workers": 1, "batch": 200, "max_wait": 1.0},
+}
+
+NLP = NLPService()  # worker NLP (nlp_worker.py) si lancé, sinon spaCy local au premier besoin
+
+# ---------- NER ----------
+def ner_entities_many(items) -> dict:
+    """
+    NER en lot : items [(clé, texte, link)] -> {clé: (ents, lang, sents)}, ents = [(texte, label, début, fin), ...],
+    sents = phrases [(début, fin), ...], offsets sur normalize_text(texte).
+    Cache d'abord ; le reste part au worker NLP.
+    """
+    out, todo = {}, []
+    for key, text, link in items:
+        text = normalize_text(text)
+        route = ner_route(link)
+        version = f"{NLP.version}|{route}"
+        hit = CACHE.get("spans", version, text)
+        if hit is not MISS:
+            lang, ents, sents = hit
+            out[key] = (ents, lang, sents)
+        else:
+            todo.append((key, text, route, version))
+    METRICS.inc("ner_texts_total", len(out), cache="hit")
+    METRICS.inc("ner_texts_total", len(todo), cache="miss")
+    with METRICS.timer("ner_ms"):
+        found = NLP.entities_many([(key, text, route) for key, text, route, _ in todo])
+    for key, text, _, version in todo:
+        ents, lang, sents = found[key]
+        CACHE.put("spans", version, text, [lang, ents, sents])
+        out[key] = (ents, lang, sents)
+    return out
+
+def ner_batch(items):
+    """"_text" + "_ner" sur chaque élément ; fonction de module : étape "ner" en pool de processus (backfill.py)."""
+    for item in items:
+        item["_text"] = Ingest.ner_text(item)
+    ner = ner_entities_many([(item["_key"], item["_text"], item["link"]) for item in items])
+    for item in items:
+        item["_ner"] = ner[item["_key"]]
+    return items
+
+def topic_rows(article_id, text):
+    """Lignes (article_id, topic, score, source) pour store.insert_topics."""
+    topics = CACHE.cached("topics", TOPICS.version, text, TOPICS.detect)
+    return [(article_id, tp, sc, "rules") for tp, sc in topics]
+
+# ---------- Synthèse inline (colonnes JSON) ----------
+def _norm(s: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", (s or "").strip()))
+
+def _dedup(lst):
+    seen, out = set(), []
+    for x in lst or []:
+        if not x:
+            continue
+        k = x.lower()
+        if k not in seen:
+            seen.add(k); out.append(x)
+    return out
+
+def summarize_inline(resolver, article_id: int, full_text: str, link: str, ner) -> dict|None:
+    """
+    Sépare persons/pays/villes/événements du NER, détecte les rôles ('présidents'...),
+    et renvoie la mise à jour des colonnes JSON + lang/publisher_* (pour store.update_many).
+    """
+    if not article_id:
+        return None
+    full_text = normalize_text(full_text)  # offsets des entités
+    ents, lang = ner[:2]
+
+    # formes canoniques ("M. Macron" -> "Emmanuel Macron"), résolues en un lot
+    names = resolver.resolve_many([(t, label) for t, label, _, _ in ents])
+    canon_of = {t: name for (t, _, _, _), (_, name) in zip(ents, names)}
+
+    people, gpes, locs, events = [], [], [], []
+    for (_, label, _, _), (_, name) in zip(ents, names):
+        txt = _norm(name)
+        if not txt:
+            continue
+        label = canon_label(label)            # PER (modèle français) -> PERSON
+        if label == "LOC" and lang == "fr":   # pas de GPE en français : LOC couvre pays et villes
+            label = "GPE"
+        if label == "PERSON": people.append(txt)
+        elif label == "GPE":  gpes.append(txt)
+        elif label == "LOC":  locs.append(txt)
+        elif label == "EVENT": events.append(txt)
+
+    # Fallback minimal si aucun modèle spaCy n'est chargé
+    if not (people or gpes or locs or events) and full_text:
+        gpes += [name for _, _, _, name in GAZETTEER.find(full_text)]
+
+    countries, cities = [], []
+    for g in gpes:
+        if GAZETTEER.is_country(g): countries.append(g)
+        else: cities.append(g)
+
+    roles = {r: _dedup([canon_of.get(p, p) for p in ps]) for r, ps in extract_roles(full_text, ents).items()}
+
+    u = publisher_update(article_id, link, lang)
+    u.update({
+        "people":     json.dumps(_dedup(people), ensure_ascii=False),
+        "countries":  json.dumps(_dedup(countries), ensure_ascii=False),
+        "cities":     json.dumps(_dedup(cities), ensure_ascii=False),
+        "events":     json.dumps(_dedup(events), ensure_ascii=False),
+        "presidents": json.dumps(_dedup(roles.get("president", [])), ensure_ascii=False),
+        "roles":      json.dumps(roles, ensure_ascii=False),
+        "enriched_at": time.time(),
+    })
+    return u
+
+# ---------- Étapes ----------
+class Ingest:
+    """
+    Étapes d'ingestion sur un ArticleStore. Un élément est une ligne "articles" (dict)
+    enrichie au fil des étapes par des clés privées (_html, _ner, _topics...) ;
+    la clé d'un élément (_key) est son lien canonique jusqu'à l'insertion (store).
+    """
+
+    def __init__(self, store, fulltext: bool = False, columns: bool = False, entities: bool = False,
+                 topics: bool = False, sentiment: bool = False, neardup: bool = True,
+                 skip_known: bool = True, topic_model=None, jobs: JobQueue|None = None):
+        self.store = store
+        self.options = {"fulltext": fulltext, "columns": columns, "entities": entities,
+                        "topics": topics, "sentiment": sentiment, "neardup": neardup}
+        self.fulltext = fulltext        # plein texte de la page (colonne content)
+        self.columns = columns          # colonnes JSON people/countries/... (summarize_inline)
+        self.entities = entities        # table entities
+        self.topics = topics            # table article_topics (règles + modèle appris)
+        self.sentiment = sentiment      # table article_entity_sentiment
+        self.skip_known = skip_known    # liens déjà en base : ni téléchargés ni ré-enrichis
+        self.jobs = jobs                # file de travail : fetch / enrich différés (workers)
+        self.neardup = NearDupIndex(store) if neardup else None
+        self.resolver = EntityResolver(store)
+        self.topic_model = (topic_model or load_model()) if topics else None
+        self.added = 0
+        self.new_by_feed = {}           # nouveaux articles par flux (clé "_feed" posée par le démon)
+        self._seen = set()
+        self._next_fetch = {}           # domaine -> prochain téléchargement autorisé
+        self._lock = threading.Lock()
+
+    def stages(self, overrides: dict|None = None) -> list[Stage]:
+        conf = {name: dict(c, **(overrides or {}).get(name, {})) for name, c in STAGE_DEFAULTS.items()}
+        if self.jobs:
+            return [Stage("fetch", self.fetch, **conf["fetch"]), Stage("store", self.defer, **conf["store"])]
+        # sans plein texte, extract ne fait que des regex sur les pages sitemap : pas de processus
+        extract_mode = "process" if self.fulltext else "thread"
+        out = [
+            Stage("fetch", self.fetch, **conf["fetch"]),
+            Stage("extract", partial(extract_batch, fulltext=self.fulltext), mode=extract_mode, **conf["extract"]),
+            Stage("enrich", self.enrich, **conf["enrich"]),
+        ]
+        if self.sentiment:
+            out.append(Stage("sentiment", self.score_sentiment, **conf["sentiment"]))
+        out.append(Stage("store", self.write, **conf["store"]))
+        return out
+
+    def needs_page(self, item) -> bool:
+        return self.fulltext or not item["title"]
+
+    def new_round(self):
+        """Nouveau passage (mode démon) : compteurs et liens vus remis à zéro, le reste reste chaud."""
+        with self._lock:
+            self.added = 0
+            self.new_by_feed = {}
+            self._seen = set()
+
+    def _count_new(self, items):
+        with self._lock:
+            self.added += len(items)
+            for item in items:
+                feed = item.get("_feed")
+                if feed:
+                    self.new_by_feed[feed] = self.new_by_feed.get(feed, 0) + 1
+        for item in items:
+            METRICS.inc("feed_new_total", feed=item.get("_feed") or item.get("source") or "?")
+
+    @staticmethod
+    def text_of(item) -> str:
+        return f"{item['title']} {item['summary']}".strip()
+
+    @classmethod
+    def ner_text(cls, item) -> str:
+        # NER sur titre + résumé + plein texte complet (découpé par le worker)
+        return f"{cls.text_of(item)} {item.get('content') or ''}".strip()
+
+    # --- fetch (E/S) ---
+    def _claim(self, links) -> set:
+        """Liens vus pour la première fois dans ce run (un même article sur deux flux)."""
+        with self._lock:
+            fresh = {l for l in links if l not in self._seen}
+            self._seen |= fresh
+        return fresh
+
+    def _throttle(self, link: str, delay: float):
+        """Politesse par domaine : `delay` secondes entre deux téléchargements du même site."""
+        if not delay or offline():
+            return
+        domain = urlparse(link).netloc
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next_fetch.get(domain, 0.0))
+            self._next_fetch[domain] = at + delay
+        time.sleep(at - now)
+
+    def fetch(self, items):
+        for item in items:
+            item["_key"] = canonicalize_url(item["link"])  # le téléchargement garde le lien d'origine
+        keys = [item["_key"] for item in items]
+        fresh = self._claim(keys) if self.skip_known else set(keys)
+        known = self.store.existing_links(list(fresh)) if self.skip_known else set()
+        out = []
+        for item in items:
+            if item["_key"] not in fresh or item["_key"] in known:
+                METRICS.inc("dedup_total", result="seen" if item["_key"] not in fresh else "known")
+                continue
+            delay = item.pop("_delay", 0)
+            # quasi-doublon d'un article déjà enrichi : ni téléchargement ni NER, copie à l'écriture
+            if self.neardup and item["title"]:
+                canon = self.neardup.find(simhash(self.text_of(item)))
+                if canon and (not self.columns or self.neardup.enrichment_of(canon) is not None):
+                    METRICS.inc("dedup_total", result="neardup")
+                    item["_dup"] = canon
+                    out.append(item)
+                    continue
+            METRICS.inc("dedup_total", result="new")
+            if self.needs_page(item) and not self.jobs:
+                self._throttle(item["link"], delay)
+                self._download(item)
+            out.append(item)
+        return out
+
+    @staticmethod
+    def _download(item):
+        domain = domain_of(item["link"])
+        t0 = time.perf_counter()
+        try:
+            body = http_get(item["link"], timeout=20)
+        except Exception as e:
+            METRICS.inc("fetch_errors_total", domain=domain)
+            print(f"Erreur téléchargement {item['link']}: {e}")
+            return
+        finally:
+            METRICS.observe("fetch_ms", (time.perf_counter() - t0) * 1000, domain=domain)
+        METRICS.inc("fetch_bytes_total", len(body), domain=domain)
+        item["_html"] = decode_html(body)
+
+    # --- enrich (NER en lot + topics) ---
+    def enrich(self, items):
+        record_extract(items)
+        todo = [item for item in items if "_dup" not in item]
+        ner_batch([item for item in todo if "_ner" not in item])  # "_ner" déjà posé : étape ner (backfill.py)
+        if self.topics:
+            for item in todo:
+                item["_topics"] = topic_rows(item["_key"], self.text_of(item))
+            # topics appris : un seul produit matriciel pour tout le lot, sur le même texte
+            # qu'à l'entraînement (titre + résumé + début du plein texte)
+            if self.topic_model:
+                by_key = {item["_key"]: item for item in todo}
+                texts = [(item["_key"], article_text(item["title"], item["summary"], item.get("content")))
+                         for item in todo]
+                for row in self.topic_model.rows(texts):
+                    by_key[row[0]]["_topics"].append(row)
+        return items
+
+    # --- sentiment par entité (phrases déjà segmentées par spaCy) ---
+    def score_sentiment(self, items):
+        todo = [item for item in items if "_ner" in item]
+        rows = entity_sentiment_rows([(item["_key"], normalize_text(item["_text"]), item["_ner"][0],
+                                       item["_ner"][2], item["_ner"][1]) for item in todo])
+        by_key = {}
+        for row in rows:
+            by_key.setdefault(row[0], []).append(row)
+        for item in todo:
+            item["_sentiment"] = by_key.get(item["_key"], [])
+        return items
+
+    # --- store (écrivain unique) ---
+    def write(self, items):
+        inserted = self.store.insert_many(items)
+        ents, topics, sentiment, updates, dups, new, new_items = [], [], [], [], [], [], []
+        for item, (article_id, is_new) in zip(items, inserted):
+            if not article_id:
+                continue
+            if is_new:
+                new.append(article_id)
+                new_items.append(item)
+            canon, enrichment = (self.neardup.resolve(article_id, self.text_of(item))
+                                 if self.neardup else (None, None))
+            if "_dup" in item:
+                u = publisher_update(article_id, item["link"], None)
+                u.update(enrichment or {}, duplicate_of=canon or item["_dup"])
+                updates.append(u)
+                dups.append((article_id, canon or item["_dup"]))
+                continue
+            found, lang, _ = item["_ner"]
+            if item.get("content") and item.get("content_fetched_at"):
+                updates.append(fulltext_update(article_id, item["content"], item["content_fetched_at"]))
+            if self.columns:
+                u = summarize_inline(self.resolver, article_id, item["_text"], item["link"], item["_ner"])
+            else:
+                u = publisher_update(article_id, item["link"], lang)
+            if canon:
+                u["duplicate_of"] = canon
+            if self.neardup and self.columns:
+                self.neardup.remember(article_id, u)
+            updates.append(u)
+            if self.entities:
+                ents += [(article_id, *ent) for ent in found]
+            topics += [(article_id, *row[1:]) for row in item.get("_topics", [])]
+            sentiment += [(article_id, *row[1:]) for row in item.get("_sentiment", [])]
+
+        self.store.insert_entities(self.resolver.annotate(ents))
+        self.store.insert_entity_sentiment(self.resolver.annotate(sentiment))
+        self.store.insert_topics(topics)
+        self.store.copy_enrichment(dups)
+        self.store.update_many(updates)
+        self._count_new(new_items)
+        return new
+
+    # --- store différé (mode file de travail) ---
+    def defer(self, items):
+        """Insère les articles et crée leurs jobs ; les quasi-doublons sont recopiés tout de suite."""
+        new = self.write([item for item in items if "_dup" in item])
+        rest = [item for item in items if "_dup" not in item]
+        todo = {"fetch": [], "enrich": []}
+        fresh, fresh_items = [], []
+        for item, (article_id, is_new) in zip(rest, self.store.insert_many(rest)):
+            if not article_id:
+                continue
+            if is_new:
+                fresh.append(article_id)
+                fresh_items.append(item)
+            todo["fetch" if self.needs_page(item) else "enrich"].append(article_id)
+        for kind, ids in todo.items():
+            self.jobs.enqueue(kind, ids, self.options)
+        self._count_new(fresh_items)
+        return new + fresh
+
+def run(store, producers, discover_workers: int = 4, overrides: dict|None = None, profiler=None,
+        memory=None, **options) -> dict:
+    """
+    Ingestion complète : producteurs (sources.py) -> étapes Ingest -> store.
+    options : cf. Ingest (fulltext, columns, entities, topics, sentiment, neardup, skip_known, jobs).
+    profiler : profiling.Profiler (cf. profiling.from_argv), fichiers écrits en fin de run.
+    memory : memwatch.MemoryMonitor (cf. memwatch.from_argv), budgets mémoire par étape.
+    """
+    store.ensure_schema()
+    start_from_env()
+    ingest = Ingest(store, **options)
+    pipeline = Pipeline(ingest.stages(overrides), discover_workers=discover_workers, profiler=profiler,
+                        memory=memory)
+    for hook in (profiler, memory):
+        if hook:
+            hook.start()
+    try:
+        report = pipeline.run(producers)
+    finally:
+        for hook in (profiler, memory):
+            if hook:
+                hook.stop()
+    report["added"] = ingest.added
+    print_report(report)
+    return report
+
+# ---------- Workers de la file de travail ----------
+ARTICLE_COLS = ["id", "source", "title", "date", "link", "summary", "fetched_at", "content"]
+
+def load_items(store, article_ids) -> list[dict]:
+    """Lignes articles (colonnes ARTICLE_COLS) sous forme d'éléments du pipeline."""
+    out = []
+    ids = list(article_ids)
+    with store.backend.connection() as con:
+        cur = con.cursor()
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            cur.execute(f"SELECT {', '.join(ARTICLE_COLS)} FROM articles WHERE id IN ({','.join([store.ph] * len(chunk))})",
+                        chunk)
+            out += [dict(zip(ARTICLE_COLS, row)) for row in cur.fetchall()]
+    for item in out:
+        item["title"], item["summary"] = item["title"] or "", item["summary"] or ""
+        item["_key"] = canonicalize_url(item["link"])
+    return out
+
+class Worker:
+    """Vide la file `kind` par lots : une instance Ingest par jeu d'options (payload des jobs)."""
+
+    def __init__(self, store, kind: str, batch: int = 50, jobs: JobQueue|None = None):
+        self.store = store
+        self.kind = kind
+        self.batch = batch
+        self.jobs = jobs or JobQueue(store)
+        self._ingests = {}
+        self.done = self.failed = 0
+
+    def ingest_for(self, options: dict) -> Ingest:
+        key = json.dumps(options, sort_keys=True)
+        if key not in self._ingests:
+            self._ingests[key] = Ingest(self.store, skip_known=False, **options)
+        return self._ingests[key]
+
+    def run_once(self) -> int:
+        """Un lot : nb de jobs pris (0 si la file est vide)."""
+        claimed = self.jobs.claim(self.kind, self.batch)
+        groups = {}
+        for job in claimed:
+            groups.setdefault(json.dumps(job.payload, sort_keys=True), []).append(job)
+        try:
+            for jobs in groups.values():
+                try:
+                    self.process(self.ingest_for(jobs[0].payload), jobs)
+                except Exception as e:
+                    traceback.print_exc()
+                    self.jobs.fail(jobs, repr(e))
+                    self.failed += len(jobs)
+        except BaseException:
+            self.jobs.release(claimed)  # Ctrl-C : jobs rendus sans attendre l'expiration du bail
+            raise
+        return len(claimed)
+
+    def process(self, ingest: Ingest, jobs):
+        items = load_items(self.store, [j.article_id for j in jobs])
+        by_id = {item["id"]: item for item in items}
+        missing = [j for j in jobs if j.article_id not in by_id]
+        if missing:
+            self.jobs.fail(missing, "article introuvable")
+        jobs = [j for j in jobs if j.article_id in by_id]
+        if self.kind == "fetch":
+            self.fetch(ingest, jobs, by_id)
+        else:
+            items = ingest.enrich(list(by_id.values()))
+            if ingest.sentiment:
+                items = ingest.score_sentiment(items)
+            ingest.write(items)
+            self.jobs.complete(jobs)
+            self.done += len(jobs)
+
+    def fetch(self, ingest: Ingest, jobs, by_id):
+        items = ingest.fetch(list(by_id.values()))
+        ingest.write([item for item in items if "_dup" in item])
+        pages = [item for item in items if "_html" in item]
+        failed = [j for j in jobs if "_html" not in by_id[j.article_id] and "_dup" not in by_id[j.article_id]
+                  and ingest.needs_page(by_id[j.article_id])]
+        updates = []
+        pages = extract_batch(pages, fulltext=ingest.fulltext)
+        record_extract(pages)
+        for item in pages:
+            u = {"id": item["id"], "title": item["title"], "summary": item["summary"], "date": item["date"]}
+            if item.get("content"):
+                u.update(fulltext_update(item["id"], item["content"], item["content_fetched_at"]))
+            updates.append(u)
+        self.store.update_many(updates)
+        ok = [j for j in jobs if j not in failed]
+        self.jobs.complete(ok)
+        # l'enrichissement suit (sauf quasi-doublons, déjà recopiés)
+        for payload, ids in _group_ids([j for j in ok if "_dup" not in by_id[j.article_id]]).items():
+            self.jobs.enqueue("enrich", ids, json.loads(payload))
+        if failed:
+            self.jobs.fail(failed, "téléchargement en échec")
+        self.done += len(ok)
+        self.failed += len(failed)
+
+    def run(self, idle: float = 5.0, once: bool = False):
+        """Boucle jusqu'à file vide (once) ou indéfiniment, avec `idle` secondes d'attente si vide."""
+        while True:
+            n = self.run_once()
+            if n:
+                print(f"[{self.kind}] {n} jobs ({self.done} faits, {self.failed} en échec)")
+            elif once:
+                return
+            else:
+                time.sleep(idle)
+
+def _group_ids(jobs) -> dict:
+    out = {}
+    for j in jobs:
+        out.setdefault(json.dumps(j.payload, sort_keys=True), []).append(j.article_id)
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Worker de la file de travail (table jobs)")
+    ap.add_argument("cmd", choices=["work"])
+    ap.add_argument("kind", choices=["fetch", "enrich"])
+    add_store_args(ap)
+    ap.add_argument("--batch", type=int, default=50)
+    ap.add_argument("--idle", type=float, default=5.0, help="attente (s) quand la file est vide")
+    ap.add_argument("--once", action="store_true", help="s'arrête quand la file est vide")
+    args = ap.parse_args()
+    store = store_from_args(args)
+    store.ensure_schema()
+    start_from_env()
+    try:
+        Worker(store, args.kind, batch=args.batch).run(idle=args.idle, once=args.once)
+    except KeyboardInterrupt:
+        print("Worker arrêté")
+    finally:
+        store.backend.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# jobqueue.py
+# File de travail durable dans la base des articles (table jobs, migration 9) :
+# plusieurs processus, ou plusieurs machines pointées sur la même MariaDB,
+# vident ensemble le backlog fetch / enrich.
+#   pending -> leased (bail de lease_s secondes) -> done
+#                     \-> échec : pending (attente exponentielle) ... -> failed après MAX_ATTEMPTS
+# Un worker qui meurt ne rend pas ses jobs : son bail expire et un autre worker les reprend.
+# Prise en lot atomique : un seul UPDATE marque le lot avec un jeton, relu ensuite ; le
+# jeton (et non lease_owner, commun à tous les threads d'un processus) identifie le bail
+# dans extend / complete / fail / release : un bail expiré puis repris ne peut plus être soldé.
+#
+# Workers : python ingest.py work fetch|enrich [db] ; état : python jobqueue.py status [db]
+import os, json, time, uuid, socket, argparse
+
+from storage import open_store
+
+KINDS = ("fetch", "enrich")
+MAX_ATTEMPTS = 5
+LEASE_S = 300          # durée d'un bail : au-delà, le lot est considéré comme abandonné
+RETRY_BASE_S = 30      # attente avant nouvel essai : 30 s, 60 s, 120 s...
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class Job:
+    __slots__ = ("id", "kind", "article_id", "payload", "attempts", "token")
+
+    def __init__(self, id, kind, article_id, payload, attempts, token=None):
+        self.id = id
+        self.kind = kind
+        self.article_id = article_id
+        self.payload = json.loads(payload) if payload else {}
+        self.attempts = attempts
+        self.token = token      # lease_token du bail en cours
+
+    def __repr__(self):
+        return f"Job({self.id}, {self.kind!r}, article={self.article_id}, essais={self.attempts})"
+
+class JobQueue:
+    """Table jobs d'un ArticleStore (SQLite ou MariaDB)."""
+
+    def __init__(self, store, owner: str|None = None, lease_s: float = LEASE_S,
+                 max_attempts: int = MAX_ATTEMPTS):
+        self.store = store
+        self.ph = store.ph
+        self.owner = owner or worker_id()
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+
+    def enqueue(self, kind: str, article_ids, payload: dict|None = None) -> int:
+        """Ajoute un job par article (ignoré s'il existe déjà pour ce kind). Retourne le nb de lignes."""
+        if kind not in KINDS:
+            raise ValueError(f"kind inconnu : {kind}")
+        p, now = self.ph, time.time()
+        blob = json.dumps(payload or {}, sort_keys=True)
+        rows = [(kind, aid, blob, now) for aid in dict.fromkeys(article_ids) if aid]
+        if not rows:
+            return 0
+        with self.store.backend.connection() as con:
+            con.cursor().executemany(f"""
+                {self.store.backend.insert_ignore} INTO jobs (kind, article_id, payload, updated_at)
+                VALUES ({p},{p},{p},{p})
+            """, rows)
+        return len(rows)
+
+    def requeue(self, kind: str, article_ids, payload: dict|None = None):
+        """Remet en attente (compteur d'essais à zéro) des jobs existants, crée les autres."""
+        p = self.ph
+        blob = json.dumps(payload or {}, sort_keys=True)
+        ids = list(dict.fromkeys(a for a in article_ids if a))
+        with self.store.backend.connection() as con:
+            con.cursor().executemany(f"""
+                UPDATE jobs SET status='pending', attempts=0, available_at=0, lease_token=NULL,
+                                lease_owner=NULL, lease_until=NULL, last_error=NULL, payload={p}
+                WHERE kind={p} AND article_id={p}
+            """, [(blob, kind, aid) for aid in ids])
+        self.enqueue(kind, ids, payload)
+
+    def _claimable(self):
+        # en attente et disponible, ou bail expiré (worker disparu)
+        p = self.ph
+        return (f"kind={p} AND attempts < {p} AND ((status='pending' AND available_at <= {p}) "
+                f"OR (status='leased' AND lease_until < {p}))")
+
+    def claim(self, kind: str, n: int = 50) -> list[Job]:
+        """Prend jusqu'à `n` jobs (les plus anciens d'abord) avec un bail de lease_s secondes."""
+        p, now = self.ph, time.time()
+        token = uuid.uuid4().hex
+        self.reap(kind)
+        sets = (f"status='leased', lease_owner={p}, lease_token={p}, lease_until={p}, "
+                f"attempts=attempts+1, updated_at={p}")
+        params = (self.owner, token, now + self.lease_s, now, kind, self.max_attempts, now, now)
+        with self.store.backend.connection() as con:
+            cur = con.cursor()
+            if self.store.backend.dialect == "sqlite":
+                # instruction unique : verrou d'écriture SQLite, pas de course entre processus
+                cur.execute(f"UPDATE jobs SET {sets} WHERE id IN "
+                            f"(SELECT id FROM jobs WHERE {self._claimable()} ORDER BY id LIMIT {int(n)})", params)
+            else:
+                # InnoDB : lignes verrouillées par l'UPDATE, les autres workers prennent les suivantes
+                cur.execute(f"UPDATE jobs SET {sets} WHERE {self._claimable()} ORDER BY id LIMIT {int(n)}", params)
+            cur.execute(f"SELECT id, kind, article_id, payload, attempts FROM jobs WHERE lease_token={p} ORDER BY id",
+                        (token,))
+            return [Job(*row, token=token) for row in cur.fetchall()]
+
+    def extend(self, jobs, lease_s: float|None = None):
+        """Prolonge le bail (lot long) ; seuls les jobs encore tenus par ce bail sont touchés."""
+        p = self.ph
+        until = time.time() + (lease_s or self.lease_s)
+        with self.store.backend.connection() as con:
+            con.cursor().executemany(f"UPDATE jobs SET lease_until={p} WHERE id={p} AND lease_token={p} AND status='leased'",
+                                     [(until, j.id, j.token) for j in jobs])
+
+    def complete(self, jobs):
+        p, now = self.ph, time.time()
+        with self.store.backend.connection() as con:
+            con.cursor().executemany(f"""
+                UPDATE jobs SET status='done', lease_token=NULL, lease_until=NULL, last_error=NULL, updated_at={p}
+                WHERE id={p} AND lease_token={p}
+            """, [(now, j.id, j.token) for j in jobs])
+
+    def fail(self, jobs, error: str):
+        """Échec : nouvel essai après RETRY_BASE_S * 2^(essais-1), ou 'failed' si les essais sont épuisés."""
+        p, now = self.ph, time.time()
+        rows = []
+        for j in jobs:
+            status = "failed" if j.attempts >= self.max_attempts else "pending"
+            rows.append((status, now + RETRY_BASE_S * 2 ** (j.attempts - 1), str(error)[:2000], now, j.id, j.token))
+        with self.store.backend.connection() as con:
+            con.cursor().executemany(f"""
+                UPDATE jobs SET status={p}, available_at={p}, last_error={p}, updated_at={p},
+                                lease_token=NULL, lease_until=NULL
+                WHERE id={p} AND lease_token={p}
+            """, rows)
+
+    def release(self, jobs):
+        """Rend des jobs non traités (arrêt propre) sans consommer d'essai."""
+        p, now = self.ph, time.time()
+        with self.store.backend.connection() as con:
+            con.cursor().executemany(f"""
+                UPDATE jobs SET status='pending', attempts=attempts-1, lease_token=NULL, lease_until=NULL,
+                                updated_at={p}
+                WHERE id={p} AND lease_token={p} AND status='leased'
+            """, [(now, j.id, j.token) for j in jobs])
+
+    def reap(self, kind: str|None = None):
+        """Baux expirés sans essai restant -> failed."""
+        p, now = self.ph, time.time()
+        where, params = "status='leased' AND lease_until < {p} AND attempts >= {p}".format(p=p), [now, self.max_attempts]
+        if kind:
+            where += f" AND kind={p}"
+            params.append(kind)
+        with self.store.backend.connection() as con:
+            con.cursor().execute(f"""
+                UPDATE jobs SET status='failed', last_error='bail expiré', lease_token=NULL, lease_until=NULL
+                WHERE {where}
+            """, params)
+
+    def stats(self) -> dict:
+        """{kind: {status: nb}} ; les baux expirés sont comptés à part ('expired')."""
+        p = self.ph
+        out = {}
+        with self.store.backend.connection() as con:
+            cur = con.cursor()
+            cur.execute(f"""
+                SELECT kind, CASE WHEN status='leased' AND lease_until < {p} THEN 'expired' ELSE status END, COUNT(*)
+                FROM jobs GROUP BY 1, 2
+            """, (time.time(),))
+            for kind, status, n in cur.fetchall():
+                out.setdefault(kind, {})[status] = n
+        return out
+
+# ---------- CLI ----------
+def store_from_args(args):
+    """Base SQLite (chemin) ou MariaDB (--mariadb '{"host": ..., "user": ...}', même dict que MDB)."""
+    mariadb = json.loads(args.mariadb) if args.mariadb else None
+    return open_store(args.db, mariadb=mariadb)
+
+def add_store_args(ap):
+    ap.add_argument("db", nargs="?", default=None, help="base SQLite (défaut : news.db)")
+    ap.add_argument("--mariadb", default=os.environ.get("NEWS_MARIADB"),
+                    help="paramètres MariaDB en JSON (ou variable NEWS_MARIADB)")
+
+def main():
+    ap = argparse.ArgumentParser(description="File de travail durable (table jobs)")
+    ap.add_argument("cmd", choices=["status", "retry-failed"])
+    add_store_args(ap)
+    args = ap.parse_args()
+    store = store_from_args(args)
+    store.ensure_schema()
+    jobs = JobQueue(store)
+    if args.cmd == "retry-failed":
+        with store.backend.connection() as con:
+            cur = con.cursor()
+            cur.execute("UPDATE jobs SET status='pending', attempts=0, available_at=0, last_error=NULL "
+                        "WHERE status='failed'")
+            print(f"{cur.rowcount} jobs remis en attente")
+    for kind, counts in sorted(jobs.stats().items()):
+        print(f"{kind:<8} " + "  ".join(f"{s}={n}" for s, n in sorted(counts.items())))
+
+if __name__ == "__main__":
+    main()
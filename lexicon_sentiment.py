@@ -0,0 +1,481 @@
+# lexicon_sentiment.py
+# Sentiment par lexique compilé en tableaux NumPy, anglais et français.
+#
+# Chaque lexique est compilé une fois : mot -> id, et par id des tableaux
+# (valence, intensifieur, négateur...). Un lot de textes est tokenisé (mémo
+# token brut -> ids), aplati en un seul tableau, et les règles de VADER
+# (majuscules, intensifieurs sur 3 mots, négation, "no", "least", idiomes,
+# conjonction "but", ponctuation, normalisation) sont appliquées en opérations
+# vectorisées sur tout le lot.
+#
+# - "en" : lexique VADER du paquet vaderSentiment ; reproduit
+#   SentimentIntensityAnalyzer.polarity_scores aux arrondis près
+#   (contrôle : python lexicon_sentiment.py [base.db ...])
+# - "fr" : lexique_fr.txt (ou $SENTIMENT_LEXICON_FR), mêmes règles sauf :
+#   élisions découpées (n'est -> n + est), ponctuation isolée ignorée, et une
+#   seule inversion si un négateur (ne, pas, jamais, sans...) est dans les
+#   3 mots précédents ou le suivant ("n'est pas bon", "aime pas")
+#
+# Le lexique est choisi d'après la colonne de langue (lang "fr"/"en",
+# language "English"/"French"...), cf. lang_code.
+import os, re, sys, time, string
+from functools import lru_cache
+from itertools import chain
+
+import numpy as np
+
+from enrich_cache import CACHE, MISS, rules_version, package_version
+from metrics import METRICS
+from topics import fold
+
+try:
+    import vaderSentiment.vaderSentiment as vader
+except Exception:
+    vader = None
+
+ENGINE_REV = 2  # à incrémenter si les règles changent (clé du cache)
+DEFAULT_LANG = "en"
+LANG_ALIASES = {"english": "en", "anglais": "en", "french": "fr", "francais": "fr", "français": "fr"}
+FR_LEXICON_PATH = os.environ.get("SENTIMENT_LEXICON_FR",
+                                 os.path.join(os.path.dirname(__file__), "lexique_fr.txt"))
+MEMO_MAX = 500_000  # tokens bruts mémorisés par lexique
+
+# constantes VADER
+B_INCR, B_DECR = 0.293, -0.293
+C_INCR = 0.733
+N_SCALAR = -0.74
+ALPHA = 15
+DECAY = (1.0, 0.95, 0.9)
+EMPTY = {"neg": 0.0, "neu": 0.0, "pos": 0.0, "compound": 0.0}
+
+# règles françaises
+FR_BOOSTERS = {
+    **dict.fromkeys(["très", "extrêmement", "vraiment", "tellement", "trop", "particulièrement",
+                     "fortement", "hautement", "profondément", "totalement", "complètement",
+                     "absolument", "énormément", "incroyablement", "terriblement", "vivement",
+                     "sérieusement", "nettement", "largement", "considérablement", "davantage"], B_INCR),
+    **dict.fromkeys(["peu", "légèrement", "assez", "plutôt", "relativement", "moyennement",
+                     "presque", "partiellement", "modérément", "guère"], B_DECR),
+}
+FR_NEGATORS = ["ne", "n", "pas", "jamais", "aucun", "aucune", "sans", "ni", "rien",
+               "nullement", "non", "nul", "nulle"]
+FR_CONTRAST = ["mais", "pourtant", "cependant", "toutefois", "néanmoins"]
+FR_PUNCT = string.punctuation + "«»“”‘’„…–—•·"
+
+_ELISION_RE = re.compile(r"['’]")
+OOV, OOV_NEG = 0, 1  # id hors vocabulaire ; hors vocabulaire contenant "n't"
+
+# ---------- Lexiques ----------
+def inflect_fr(word: str) -> list[str]:
+    """Flexions régulières d'une forme de base (les formes parasites sont sans effet)."""
+    w = word
+    if w.endswith("eux"):
+        return [w[:-1] + "se", w[:-1] + "ses"]
+    if w.endswith("if"):
+        return [w + "s", w[:-1] + "ve", w[:-1] + "ves"]
+    if w.endswith("al"):
+        return [w[:-1] + "ux"] + ([w + "e", w + "es"] if len(w) > 3 else [])
+    if w.endswith(("el", "en", "on")):
+        return [w + "s", w + w[-1] + "e", w + w[-1] + "es"]
+    if w.endswith("er"):
+        stem = w[:-2]
+        soft = stem[:-1] + "ç" if stem.endswith("c") else (stem + "e" if stem.endswith("g") else stem)
+        return ([stem + s for s in ("e", "es", "ent", "é", "ée", "és", "ées", "era", "eront", "ez")]
+                + [soft + s for s in ("ait", "aient", "ant", "ons")]
+                + [stem + "ère", stem + "ères", w + "s"])
+    if w.endswith(("s", "x", "z")):
+        return [w + "e", w + "es"]
+    if w.endswith("e"):
+        return [w + "s"]
+    return [w + "s", w + "e", w + "es"]
+
+def load_lexicon(path: str, inflect=None) -> dict:
+    """Fichier "mot<TAB>valence" (format vader_lexicon.txt) ; les lignes explicites priment."""
+    explicit, derived = {}, {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            word, value = line.rstrip("\n").split("\t")[:2]
+            explicit[word] = float(value)
+            for form in (inflect(word) if inflect else []):
+                derived.setdefault(form, float(value))
+    return {**derived, **explicit}
+
+class _Memo(dict):
+    """token brut -> tuple de codes (id * 2 + majuscules) ; calcul au premier accès."""
+
+    def __init__(self, compute):
+        super().__init__()
+        self.compute = compute
+
+    def __missing__(self, tok):
+        if len(self) >= MEMO_MAX:
+            self.clear()
+        codes = self[tok] = self.compute(tok)
+        return codes
+
+def _shift(a, k, fill):
+    # a décalé de k (k > 0 : élément i-k ; k < 0 : élément i+|k|)
+    out = np.full_like(a, fill)
+    if k > 0:
+        out[k:] = a[:-k]
+    elif k < 0:
+        out[:k] = a[-k:]
+    else:
+        out[:] = a
+    return out
+
+# ---------- Moteur ----------
+class LexiconSentiment:
+    """Un lexique compilé + ses règles ; score_many(textes) -> [{"neg","neu","pos","compound"}]."""
+
+    def __init__(self, lang, valences, boosters, negators, contrast, source,
+                 negation="vader", specials=None, ngram_boosters=None, emojis=None, french=False):
+        self.lang = lang
+        self.negation = negation
+        self.french = french
+        self.version = f"lex{ENGINE_REV}-{lang}-{source}"
+        norm = fold if french else str.lower
+        # clé exacte prioritaire sur ses variantes de casse ("o.o" et non "O.o") ; VADER ne
+        # cherche que item.lower() : en anglais, une clé pas déjà en minuscules est inatteignable
+        valences = {**({norm(k): v for k, v in valences.items()} if french else {}),
+                    **{k: v for k, v in valences.items() if norm(k) == k}}
+        boosters = {norm(k): v for k, v in boosters.items()}
+        negators = {norm(k) for k in negators}
+        specials = {tuple(k.split()): v for k, v in (specials or {}).items() if " " in k}
+        ngram_boosters = {tuple(k.split()): v for k, v in (ngram_boosters or {}).items()}
+        rule_words = ["no", "or", "nor", "never", "so", "this", "without", "doubt",
+                      "least", "at", "very", "kind", "of"] if negation == "vader" else []
+
+        words = ["", "n't"]   # OOV, OOV_NEG
+        words += sorted(set(valences) | set(boosters) | negators | {norm(w) for w in contrast}
+                        | set(rule_words) | {w for k in (*specials, *ngram_boosters) for w in k})
+        self.vocab = {w: i for i, w in enumerate(words)}
+        self.val = np.array([valences.get(w, 0.0) for w in words])
+        self.inlex = np.array([w in valences for w in words])
+        self.boost = np.array([boosters.get(w, 0.0) for w in words])
+        self.isboost = np.array([w in boosters for w in words])
+        self.neg = np.array([w in negators or (negation == "vader" and "n't" in w) for w in words])
+        self.neg[OOV] = False
+        self.contrast = np.array([self.vocab[norm(w)] for w in contrast])
+        self.specials = [(tuple(self.vocab[w] for w in k), v) for k, v in specials.items()]
+        self.ngram_boosters = [(tuple(self.vocab[w] for w in k), v) for k, v in ngram_boosters.items()]
+        self.ids = {w: self.vocab.get(w, -1) for w in rule_words}
+        self.emojis = {c: d for c, d in (emojis or {}).items() if len(c) == 1}
+        self._emoji_chars = frozenset(self.emojis)
+        self._norm = norm
+        self._memo = _Memo(self._codes)
+
+    # ----- tokenisation -----
+    def _code(self, w: str) -> int:
+        key = self._norm(w)
+        i = self.vocab.get(key)
+        if i is None:
+            i = OOV_NEG if (self.negation == "vader" and "n't" in key) else OOV
+        return i * 2 + w.isupper()
+
+    def _codes(self, tok: str) -> tuple:
+        if self.french:
+            parts = (p.strip(FR_PUNCT) for p in _ELISION_RE.split(tok))
+            return tuple(self._code(p) for p in parts if p)
+        # SentiText._strip_punc_if_word
+        stripped = tok.strip(string.punctuation)
+        return (self._code(stripped if len(stripped) > 2 else tok),)
+
+    def _replace_emojis(self, text: str) -> str:
+        # même substitution que polarity_scores (émoji -> description)
+        out, prev_space = [], True
+        for ch in text:
+            desc = self.emojis.get(ch)
+            if desc is not None:
+                if not prev_space:
+                    out.append(" ")
+                out.append(desc)
+                prev_space = False
+            else:
+                out.append(ch)
+                prev_space = ch == " "
+        return "".join(out).strip()
+
+    # ----- score -----
+    def polarity_scores(self, text: str) -> dict:
+        return self.score_many([text])[0]
+
+    def score_many(self, texts) -> list[dict]:
+        texts = [t if isinstance(t, str) else "" for t in texts]
+        if self._emoji_chars:
+            texts = [t if t.isascii() or self._emoji_chars.isdisjoint(t) else self._replace_emojis(t)
+                     for t in texts]
+        get = self._memo.__getitem__
+        docs = [list(chain.from_iterable(map(get, t.split()))) for t in texts]
+        lengths = np.fromiter(map(len, docs), dtype=np.int64, count=len(docs))
+        if not lengths.any():
+            return [dict(EMPTY) for _ in texts]
+        codes = np.fromiter(chain.from_iterable(docs), dtype=np.int64, count=int(lengths.sum()))
+        doc = np.repeat(np.arange(len(docs)), lengths)
+        pos = np.arange(len(codes)) - (np.cumsum(lengths) - lengths)[doc]
+        v = self._valences(codes >> 1, (codes & 1).astype(bool), doc, pos, lengths)
+        return self._aggregate(v, doc, lengths, texts)
+
+    def _valences(self, ids, upper, doc, pos, lengths):
+        size = lengths[doc]
+        at_cache = {}
+
+        def at(off):
+            # id du mot i+off dans le même texte, OOV au-delà
+            if off not in at_cache:
+                a = _shift(ids, -off, OOV)
+                a[(pos + off < 0) | (pos + off >= size)] = OOV
+                at_cache[off] = a
+            return at_cache[off]
+
+        p1, p2, p3, n1 = at(-1), at(-2), at(-3), at(1)
+        inlex, rid = self.inlex, self.ids
+        scoring = inlex[ids] & ~self.isboost[ids]
+        if rid.get("kind", -1) >= 0:
+            scoring &= ~((ids == rid["kind"]) & (n1 == rid["of"]))
+        base = np.where(scoring, self.val[ids], 0.0)
+        v = base.copy()
+
+        if rid.get("no", -1) >= 0:
+            no = rid["no"]
+            v[(ids == no) & (pos < size - 1) & inlex[n1]] = 0.0
+            after_no = (p1 == no) | (p2 == no) | ((p3 == no) & np.isin(p1, [rid["or"], rid["nor"]]))
+            v = np.where(after_no, base * N_SCALAR, v)
+
+        # mot du lexique en MAJUSCULES alors que le texte ne l'est pas entièrement
+        n_upper = np.bincount(doc, weights=upper, minlength=len(lengths))
+        capdiff = ((n_upper > 0) & (n_upper < lengths))[doc]
+        v = np.where(scoring & upper & capdiff, np.where(v > 0, v + C_INCR, v - C_INCR), v)
+
+        # intensifieurs / négation sur les 3 mots précédents (hors mots du lexique)
+        for k, pk in ((1, p1), (2, p2), (3, p3)):
+            gate = scoring & (pos >= k) & ~inlex[pk]
+            s = np.where(v < 0, -self.boost[pk], self.boost[pk])
+            caps = self.isboost[pk] & _shift(upper, k, False) & capdiff
+            s = np.where(caps, np.where(v > 0, s + C_INCR, s - C_INCR), s)
+            v = np.where(gate, v + s * DECAY[k - 1], v)
+            if self.negation == "vader":
+                v = np.where(gate, v * self._negation_mult(k, p1, p2, p3), v)
+                if k == 3:
+                    v = self._idioms(v, gate, at)
+
+        if self.negation == "window":
+            negated = self.neg[p1] | self.neg[p2] | self.neg[p3] | self.neg[n1]
+            v = np.where(scoring & negated, v * N_SCALAR, v)
+
+        if rid.get("least", -1) >= 0 and not inlex[rid["least"]]:
+            least = scoring & (p1 == rid["least"]) & ~((pos > 1) & np.isin(p2, [rid["at"], rid["very"]]))
+            v = np.where(least, v * N_SCALAR, v)
+
+        # conjonction de contraste : 0.5 avant la première occurrence, 1.5 après
+        if len(self.contrast):
+            is_c = np.isin(ids, self.contrast)
+            none = np.iinfo(np.int64).max
+            first = np.full(len(lengths), none)
+            np.minimum.at(first, doc[is_c], pos[is_c])
+            if self.negation == "vader":
+                starts = np.cumsum(lengths) - lengths
+                for d in np.flatnonzero(first != none):
+                    seg = v[starts[d]:starts[d] + lengths[d]]   # vue : modifiée sur place
+                    self._but_check_exact(seg, first[d])
+            else:
+                bi = first[doc]
+                v = v * np.where(bi == none, 1.0, np.where(pos < bi, 0.5, np.where(pos > bi, 1.5, 1.0)))
+        return v
+
+    @staticmethod
+    def _but_check_exact(seg, bi):
+        # _but_check de VADER à l'identique : la liste est modifiée pendant son parcours
+        # et chaque valeur retrouvée par .index(), donc une valeur égale à une valeur
+        # déjà pondérée peut être pondérée une seconde fois (les zéros sont inchangés)
+        nz = np.flatnonzero(seg)
+        vals = seg[nz].tolist()
+        for j in range(len(vals)):
+            x = vals[j]
+            si = vals.index(x)
+            if nz[si] < bi:
+                vals[si] = x * 0.5
+            elif nz[si] > bi:
+                vals[si] = x * 1.5
+        seg[nz] = vals
+
+    def _negation_mult(self, k, p1, p2, p3):
+        # SentimentIntensityAnalyzer._negation_check
+        rid, neg = self.ids, self.neg
+        so_this = [rid["so"], rid["this"]]
+        if k == 1:
+            return np.where(neg[p1], N_SCALAR, 1.0)
+        if k == 2:
+            never = (p2 == rid["never"]) & np.isin(p1, so_this)
+            without = (p2 == rid["without"]) & (p1 == rid["doubt"])
+            return np.where(never, 1.25, np.where(without, 1.0, np.where(neg[p2], N_SCALAR, 1.0)))
+        never = ((p3 == rid["never"]) & np.isin(p2, so_this)) | np.isin(p1, so_this)
+        without = (p3 == rid["without"]) & ((p2 == rid["doubt"]) | (p1 == rid["doubt"]))
+        return np.where(never, 1.25, np.where(without, 1.0, np.where(neg[p3], N_SCALAR, 1.0)))
+
+    def _idioms(self, v, gate, at):
+        # SentimentIntensityAnalyzer._special_idioms_check, n-grammes comparés id à id
+        def match(offsets, key):
+            m = gate.copy()
+            for off, wid in zip(offsets, key):
+                m &= at(off) == wid
+            return m
+
+        hit, sv = np.zeros(len(v), dtype=bool), np.zeros(len(v))
+        for offsets in ((-1, 0), (-2, -1, 0), (-2, -1), (-3, -2, -1), (-3, -2)):
+            for key, value in self.specials:
+                if len(key) == len(offsets):
+                    m = match(offsets, key) & ~hit
+                    sv[m] = value
+                    hit |= m
+        v = np.where(hit, sv, v)
+        for offsets in ((0, 1), (0, 1, 2)):
+            for key, value in self.specials:
+                if len(key) == len(offsets):
+                    v = np.where(match(offsets, key), value, v)
+        for offsets in ((-3, -2, -1), (-3, -2), (-2, -1)):
+            for key, value in self.ngram_boosters:
+                if len(key) == len(offsets):
+                    v = np.where(match(offsets, key), v + value, v)
+        return v
+
+    @staticmethod
+    def _punct_emphasis(text: str) -> float:
+        ep = min(text.count("!"), 4) * 0.292
+        qm = text.count("?")
+        return ep + (0.0 if qm <= 1 else (qm * 0.18 if qm <= 3 else 0.96))
+
+    def _aggregate(self, v, doc, lengths, texts) -> list[dict]:
+        n = len(lengths)
+        amp = np.array([self._punct_emphasis(t) for t in texts])
+        total = np.bincount(doc, weights=v, minlength=n)
+        total = np.where(total > 0, total + amp, np.where(total < 0, total - amp, total))
+        compound = np.clip(total / np.sqrt(total * total + ALPHA), -1.0, 1.0)
+        pos_sum = np.bincount(doc, weights=np.where(v > 0, v + 1, 0.0), minlength=n)
+        neg_sum = np.bincount(doc, weights=np.where(v < 0, v - 1, 0.0), minlength=n)
+        neu = np.bincount(doc, weights=v == 0, minlength=n)
+        more_pos, more_neg = pos_sum > -neg_sum, pos_sum < -neg_sum
+        pos_sum = np.where(more_pos, pos_sum + amp, pos_sum)
+        neg_sum = np.where(more_neg, neg_sum - amp, neg_sum)
+        denom = np.where(lengths > 0, pos_sum - neg_sum + neu, 1.0)
+        out = []
+        for i in range(n):
+            if not lengths[i]:
+                out.append(dict(EMPTY))
+                continue
+            d = float(denom[i])
+            out.append({"neg": round(abs(float(neg_sum[i]) / d), 3), "neu": round(abs(float(neu[i]) / d), 3),
+                        "pos": round(abs(float(pos_sum[i]) / d), 3), "compound": round(float(compound[i]), 4)})
+        return out
+
+# ---------- Construction / sélection par langue ----------
+def lang_code(value) -> str:
+    """"fr", "French", "fr-FR", "English"... -> "fr" / "en" ; inconnu -> DEFAULT_LANG."""
+    v = str(value or "").strip().lower()
+    v = LANG_ALIASES.get(v, v[:2])
+    return v if v in ("en", "fr") else DEFAULT_LANG
+
+def available(lang: str = DEFAULT_LANG) -> bool:
+    if lang_code(lang) == "fr":
+        return os.path.exists(FR_LEXICON_PATH)
+    return vader is not None
+
+@lru_cache(maxsize=None)
+def engine(lang: str) -> LexiconSentiment:
+    lang = lang_code(lang)
+    if lang == "fr":
+        valences = load_lexicon(FR_LEXICON_PATH, inflect_fr)
+        source = rules_version([valences, FR_BOOSTERS, FR_NEGATORS, FR_CONTRAST])
+        return LexiconSentiment("fr", valences, FR_BOOSTERS, FR_NEGATORS, FR_CONTRAST, source,
+                                negation="window", french=True)
+    if vader is None:
+        raise ImportError("vaderSentiment requis pour le lexique anglais")
+    analyzer = vader.SentimentIntensityAnalyzer()
+    boosters = {k: b for k, b in vader.BOOSTER_DICT.items() if " " not in k}
+    ngrams = {k: b for k, b in vader.BOOSTER_DICT.items() if " " in k}
+    return LexiconSentiment("en", analyzer.lexicon, boosters, vader.NEGATE, ["but"],
+                            package_version("vaderSentiment"), specials=vader.SPECIAL_CASES,
+                            ngram_boosters=ngrams, emojis=analyzer.emojis)
+
+def version(lang: str) -> str:
+    return engine(lang).version
+
+def score_texts(texts, langs, cache=CACHE) -> list[dict]:
+    """
+    Scores par texte, lexique choisi d'après la langue (langs alignée sur texts).
+    Un seul calcul par (langue, texte) distinct ; le reste vient du cache d'enrichissement.
+    """
+    out, todo, hits = [None] * len(texts), {}, 0
+    for i, (text, lang) in enumerate(zip(texts, langs)):
+        eng = engine(lang_code(lang))
+        hit = cache.get("sentiment", eng.version, text) if cache is not None else MISS
+        if hit is MISS:
+            todo.setdefault(eng.lang, {}).setdefault(text, []).append(i)
+        else:
+            out[i] = hit
+            hits += 1
+    METRICS.inc("sentiment_texts_total", hits, cache="hit")
+    for lang, by_text in todo.items():
+        eng = engine(lang)
+        METRICS.inc("sentiment_texts_total", len(by_text), cache="miss")
+        with METRICS.timer("sentiment_ms", lang=lang):
+            found = eng.score_many(list(by_text))
+        for text, scores in zip(by_text, found):
+            if cache is not None:
+                cache.put("sentiment", eng.version, text, scores)
+            for i in by_text[text]:
+                out[i] = scores
+    return out
+
+# ---------- Contrôle / benchmark ----------
+def _corpus(paths):
+    import sqlite3
+    out = []
+    for path in paths:
+        con = sqlite3.connect(path)
+        for q in ("SELECT full_text, language FROM articles",
+                  "SELECT title || ' ' || COALESCE(summary, ''), lang FROM articles",
+                  "SELECT title || ' ' || COALESCE(summary, '') || ' ' || COALESCE(content, ''), lang FROM articles"):
+            try:
+                out += [(t, l) for t, l in con.execute(q) if isinstance(t, str)]
+            except Exception:
+                continue
+        con.close()
+    return out
+
+def benchmark(paths, tolerance: float = 0.01):
+    corpus = _corpus(paths)
+    english = [t for t, l in corpus if lang_code(l) == "en"]
+    french = [t for t, l in corpus if lang_code(l) == "fr"]
+    # phrases : plus de textes courts, où chaque règle pèse davantage
+    english += [s for t in english for s in re.split(r"(?<=[.!?])\s+", t) if s]
+    if not english or vader is None:
+        print("Corpus anglais vide ou vaderSentiment absent")
+        return False
+    analyzer = vader.SentimentIntensityAnalyzer()
+    t0 = time.perf_counter()
+    ref = [analyzer.polarity_scores(t) for t in english]
+    t_ref = time.perf_counter() - t0
+    eng = engine("en")
+    eng.score_many(english[:10])   # compilation / mémo hors chrono
+    eng._memo.clear()
+    t0 = time.perf_counter()
+    fast = eng.score_many(english)
+    t_fast = time.perf_counter() - t0
+    diffs = np.array([abs(a["compound"] - b["compound"]) for a, b in zip(ref, fast)])
+    print(f"{len(english)} textes anglais : VADER {t_ref * 1000:.0f} ms, lexique NumPy {t_fast * 1000:.0f} ms "
+          f"(x{t_ref / max(t_fast, 1e-9):.1f})")
+    print(f"compound : identique {np.mean(diffs == 0):.2%}, écart max {diffs.max():.4f}, "
+          f"> {tolerance} : {int((diffs > tolerance).sum())}")
+    if french:
+        t0 = time.perf_counter()
+        scores = engine("fr").score_many(french)
+        mean = np.mean([s["compound"] for s in scores])
+        print(f"{len(french)} textes français : {(time.perf_counter() - t0) * 1000:.0f} ms, compound moyen {mean:+.3f}")
+    return bool((diffs <= tolerance).all())
+
+if __name__ == "__main__":
+    ok = benchmark(sys.argv[1:] or ["news.db", "NewsSitemaps.db", "NewsVader.db"])
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,60 @@
+# longner.py
+# NER plein texte : découpe en morceaux alignés sur les phrases, streaming par
+# nlp.pipe(as_tuples=True) (clé + offset portés avec chaque morceau), puis
+# recalage des offsets d'entités et de phrases sur le texte complet.
+#
+# La mémoire reste bornée par batch_size × CHUNK_CHARS (au lieu d'un Doc de
+# 100 000 caractères), et toutes les entités de l'article sont couvertes
+# (plus de coupe à [:2000]).
+import re
+
+CHUNK_CHARS = 5000   # taille cible d'un morceau (caractères)
+BATCH_SIZE = 32      # morceaux par lot nlp.pipe
+
+_SENT_END_RE = re.compile(r"(?<=[.!?…»\"])\s+|\n+")
+
+def chunk_text(text: str, max_chars: int = CHUNK_CHARS) -> list[tuple[int, str]]:
+    """[(offset, morceau), ...] : coupe aux fins de phrase, sinon au dernier espace."""
+    text = text or ""
+    out, start, n = [], 0, len(text)
+    while start < n:
+        end = min(start + max_chars, n)
+        if end < n:
+            cut = None
+            for m in _SENT_END_RE.finditer(text, start, end):
+                cut = m.end()
+            if cut is None or cut <= start:
+                sp = text.rfind(" ", start, end)
+                cut = sp + 1 if sp > start else end
+            end = cut
+        chunk = text[start:end]
+        if chunk.strip():
+            out.append((start, chunk))
+        start = end
+    return out
+
+def pipe_spans(nlp, items, batch_size: int = BATCH_SIZE, max_chars: int = CHUNK_CHARS) -> dict:
+    """
+    items : itérable de (clé, texte) ou (clé, texte, décalage) — texte = fin d'un texte
+    plus long commençant à `décalage`. Retourne {clé: (ents, sents)} avec
+    ents = [(texte, label, début, fin), ...] et sents = [(début, fin), ...]
+    (phrases segmentées par spaCy), offsets relatifs au texte complet.
+    """
+    def chunks():
+        for key, text, *base in items:
+            base = base[0] if base else 0
+            for off, chunk in chunk_text(text, max_chars):
+                yield chunk, (key, base + off)
+
+    out = {}
+    for doc, (key, off) in nlp.pipe(chunks(), as_tuples=True, batch_size=batch_size):
+        ents, sents = out.setdefault(key, ([], []))
+        ents.extend((e.text, e.label_, e.start_char + off, e.end_char + off) for e in doc.ents)
+        sents.extend((a + off, b + off) for a, b in doc_sentences(doc))
+    return out
+
+def doc_sentences(doc) -> list[tuple[int, int]]:
+    """Phrases d'un Doc spaCy [(début, fin), ...] ; vide si le pipeline ne segmente pas."""
+    if doc is None or not doc.has_annotation("SENT_START"):
+        return []
+    return [(s.start_char, s.end_char) for s in doc.sents]
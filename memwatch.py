@@ -0,0 +1,186 @@
+# memwatch.py
+# Mémoire du pipeline (pipeline.py) : mesure par lot, budgets par étape, instantanés.
+#   - chaque lot est mesuré : pic d'allocation tracemalloc (--memory) ou, sans traçage,
+#     croissance du RSS pendant le lot ; exact dans les processus du pool (étape extract),
+#     approximatif pour les étapes en threads (les allocations concurrentes sont comptées)
+#   - budget par étape (MEMORY_BUDGETS="enrich=400,extract=200", en Mo) : un lot qui le
+#     dépasse divise par deux la taille de lot de l'étape ; budget global sur le RSS du
+#     processus (MEMORY_BUDGET_MB) : l'étape qui le franchit réduit aussi son lot
+#   - --memory[=DIR] : tracemalloc actif, instantané pris à la sortie du plus gros lot de
+#     chaque étape, principaux sites d'allocation écrits dans DIR/memory.txt
+# Le pic RSS du run est toujours dans le rapport du pipeline (peak_rss_mb).
+import os, sys, resource, threading, tracemalloc
+
+from metrics import METRICS
+
+DEFAULT_DIR = "memory"
+TOP = 25            # sites d'allocation gardés par instantané
+FRAMES = 8          # profondeur des tracebacks tracemalloc
+
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def rss_bytes() -> int:
+    """RSS courant du processus (Linux : /proc/self/statm ; sinon pic getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE
+    except OSError:
+        return peak_rss_bytes()
+
+def peak_rss_bytes(children: bool = False) -> int:
+    """Pic RSS du processus (ou du plus gros de ses fils terminés)."""
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # ko sous Linux
+
+def _mb(n: float) -> float:
+    return round(n / 2**20, 1)
+
+def _measure(fn, items, trace: bool):
+    """fn(items) -> (sortie, octets) : pic tracemalloc au-dessus du niveau de départ, sinon croissance du RSS."""
+    if trace:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        out = fn(items)
+        return out, max(0, tracemalloc.get_traced_memory()[1] - base)
+    base = rss_bytes()
+    out = fn(items)
+    return out, max(0, rss_bytes() - base)
+
+_CHILD = {"max": 0}
+
+def measured_call(fn, items, trace: bool = False):
+    """Lot d'une étape "process", mesuré dans le fils ; sites d'allocation renvoyés à chaque nouveau maximum."""
+    if trace and not tracemalloc.is_tracing():
+        tracemalloc.start(FRAMES)
+    out, used = _measure(lambda batch: list(fn(batch) or []), items, trace)
+    top = None
+    if trace and used > _CHILD["max"]:
+        _CHILD["max"] = used
+        top = [str(s) for s in tracemalloc.take_snapshot().statistics("lineno")[:TOP]]
+    return out, used, top
+
+class MemoryMonitor:
+    """
+    monitor = MemoryMonitor(budgets={"enrich": 400}, rss_budget_mb=3000, trace=True, outdir="memory")
+    Pipeline(stages, memory=monitor) ; monitor.start() ... monitor.stop() (écrit DIR/memory.txt).
+    """
+
+    def __init__(self, budgets: dict|None = None, rss_budget_mb: float|None = None, trace: bool = False,
+                 outdir: str|None = None, min_batch: int = 1):
+        self.budgets = dict(budgets or {})
+        self.rss_budget_mb = rss_budget_mb
+        self.trace = trace
+        self.outdir = outdir
+        self.min_batch = max(1, min_batch)
+        self.stats = {}             # étape -> {"batches", "peak_mb", "shrinks", "batch"}
+        self.snapshots = {}         # étape -> (Mo, [sites d'allocation])
+        self._lock = threading.Lock()
+        self._started_tracing = False
+
+    def start(self):
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start(FRAMES)
+            self._started_tracing = True
+        return self
+
+    def stop(self):
+        if self.outdir:
+            os.makedirs(self.outdir, exist_ok=True)
+            path = os.path.join(self.outdir, "memory.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.summary())
+            print(f"Mémoire par étape : {os.path.abspath(path)}")
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    # --- branchement (pipeline.Pipeline._worker) ---
+    def call(self, stage, fn, items, pool=None):
+        """Exécute un lot de `stage` (dans `pool` si étape "process"), le mesure et applique les budgets."""
+        top = None
+        if pool is not None:
+            out, used, top = pool.submit(measured_call, fn, items, self.trace).result()
+        else:
+            out, used = _measure(fn, items, self.trace)
+            out = list(out or [])
+        self.observe(stage, used, top)
+        return out
+
+    def observe(self, stage, used: int, top=None):
+        mb = used / 2**20
+        METRICS.observe("batch_memory_mb", mb, stage=stage.name)
+        with self._lock:
+            st = self.stats.setdefault(stage.name, {"batches": 0, "peak_mb": 0.0, "shrinks": 0, "batch": stage.batch})
+            st["batches"] += 1
+            record = mb > st["peak_mb"]
+            st["peak_mb"] = max(st["peak_mb"], mb)
+        if record and self.trace:
+            # instantané à la frontière d'étape : sortie du plus gros lot vu jusqu'ici
+            # (un instantané pris dans le parent ne dit rien d'un lot exécuté dans le pool)
+            if top is None and stage.mode != "process":
+                top = [str(s) for s in tracemalloc.take_snapshot().statistics("lineno")[:TOP]]
+            if top:
+                with self._lock:
+                    self.snapshots[stage.name] = (mb, top)
+        budget = self.budgets.get(stage.name)
+        if budget and mb > budget:
+            self.shrink(stage, f"lot de {mb:.0f} Mo > budget {budget:g} Mo")
+        elif self.rss_budget_mb and rss_bytes() / 2**20 > self.rss_budget_mb:
+            self.shrink(stage, f"RSS {rss_bytes() / 2**20:.0f} Mo > budget {self.rss_budget_mb:g} Mo")
+
+    def shrink(self, stage, reason: str):
+        with self._lock:
+            old = stage.batch
+            if old <= self.min_batch:
+                return
+            stage.batch = max(self.min_batch, old // 2)  # lu par Pipeline._next_batch au lot suivant
+            st = self.stats[stage.name]
+            st["shrinks"] += 1
+            st["batch"] = stage.batch
+        METRICS.inc("memory_shrinks_total", stage=stage.name)
+        print(f"[{stage.name}] {reason} : taille de lot {old} -> {stage.batch}")
+
+    # --- rapport ---
+    def report(self) -> dict:
+        with self._lock:
+            return {name: dict(st, peak_mb=round(st["peak_mb"], 1)) for name, st in self.stats.items()}
+
+    def summary(self) -> str:
+        lines = [f"Pic RSS : {_mb(peak_rss_bytes())} Mo (processus), {_mb(peak_rss_bytes(children=True))} Mo (fils)",
+                 f"Mesure : {'pic tracemalloc' if self.trace else 'croissance du RSS'} par lot", ""]
+        for name, st in self.report().items():
+            budget = self.budgets.get(name)
+            lines.append(f"{name:<10} pic lot {st['peak_mb']:>8.1f} Mo  lots {st['batches']:>5}  "
+                         f"réductions {st['shrinks']:>2}  taille de lot {st['batch']}"
+                         + (f"  (budget {budget:g} Mo)" if budget else ""))
+        for name, (mb, top) in sorted(self.snapshots.items()):
+            lines += ["", f"--- {name} : sites d'allocation, lot de {mb:.1f} Mo ---"] + top
+        return "\n".join(lines) + "\n"
+
+def parse_budgets(text: str|None) -> dict:
+    """"enrich=400,extract=200" -> {"enrich": 400.0, "extract": 200.0} (Mo)."""
+    out = {}
+    for part in (text or "").split(","):
+        if "=" in part:
+            name, value = part.split("=", 1)
+            out[name.strip()] = float(value)
+    return out
+
+def from_argv(argv=None) -> MemoryMonitor|None:
+    """
+    --memory[=DIR] : tracemalloc + instantanés ; --memory-budget=enrich=400,extract=200.
+    Sans option : budgets MEMORY_BUDGETS / MEMORY_BUDGET_MB (mesure par RSS, sans traçage).
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    budgets = parse_budgets(os.environ.get("MEMORY_BUDGETS"))
+    rss_budget = float(os.environ.get("MEMORY_BUDGET_MB") or 0) or None
+    trace, outdir = False, None
+    for arg in argv:
+        name, _, value = arg.partition("=")
+        if name == "--memory":
+            trace, outdir = True, value or DEFAULT_DIR
+        elif name == "--memory-budget":
+            budgets.update(parse_budgets(value))
+    if not (trace or budgets or rss_budget):
+        return None
+    return MemoryMonitor(budgets, rss_budget, trace=trace, outdir=outdir)
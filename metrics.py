@@ -0,0 +1,243 @@
+# metrics.py
+# Instrumentation commune : compteurs et histogrammes de latence, étiquetés
+# (étape, flux, domaine éditeur...), exposés
+#   - en texte Prometheus : serveur HTTP /metrics (et /metrics.json), METRICS_PORT=9108
+#   - en instantanés JSON périodiques : METRICS_JSON=metrics.json (METRICS_EVERY=30 s)
+# start_from_env() est appelé par ingest.run / daemon.serve / nlp_worker ; sans
+# variable d'environnement, rien n'est exposé (les compteurs restent en mémoire).
+#
+#   METRICS.inc("fetch_bytes_total", len(body), domain="bbc.co.uk")
+#   with METRICS.timer("db_ms", op="insert_many"):
+#       ...
+import os, json, time, threading, atexit
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# bornes des histogrammes de latence (ms)
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+PREFIX = "news_"
+
+HELP = {
+    "stage_batch_ms": "Durée de traitement d'un lot par étape du pipeline",
+    "stage_items_total": "Éléments entrés / sortis / en erreur par étape",
+    "feed_parse_ms": "Téléchargement + parsing d'un flux RSS ou sitemap",
+    "feed_entries_total": "Entrées lues par flux",
+    "feed_new_total": "Nouveaux articles par flux",
+    "fetch_ms": "Téléchargement d'une page article, par domaine",
+    "fetch_bytes_total": "Octets téléchargés par domaine",
+    "fetch_errors_total": "Téléchargements en échec par domaine",
+    "extract_ms": "Extraction plein texte / métadonnées d'une page, par domaine",
+    "dedup_total": "Résultat de la déduplication (known, seen, neardup, new)",
+    "ner_ms": "NER d'un lot (cache exclu)",
+    "ner_texts_total": "Textes passés au NER (hit / miss du cache)",
+    "ner_choose_ms": "Choix du modèle FR/EN d'un texte en route auto",
+    "ner_pipe_ms": "spaCy nlp.pipe sur un lot de textes, par modèle",
+    "nlp_fallback_total": "Lots NER refaits localement après un échec du worker NLP",
+    "feed_polls_total": "Passages par flux (status 200 / 304 / error)",
+    "sentiment_ms": "Scoring lexical d'un lot de textes",
+    "sentiment_texts_total": "Textes scorés (hit / miss du cache)",
+    "db_ms": "Écritures en base, par opération",
+    "db_rows_total": "Lignes écrites en base, par opération",
+    "batch_memory_mb": "Mémoire d'un lot par étape, en Mo (memwatch.py)",
+    "memory_shrinks_total": "Réductions de taille de lot sur dépassement de budget mémoire",
+    "shard_rebalances_total": "Changements de l'ensemble des nœuds actifs (démon réparti)",
+    "backfill_rows_total": "Lignes complétées par backfill.py",
+}
+
+def _key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _fmt_labels(labels, extra=()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)  # dernier : +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        i = 0
+        while i < len(BUCKETS_MS) and value > BUCKETS_MS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float|None:
+        """Estimation par interpolation linéaire dans le seau (comme histogram_quantile)."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lo = BUCKETS_MS[i - 1] if i else 0.0
+                hi = BUCKETS_MS[i] if i < len(BUCKETS_MS) else BUCKETS_MS[-1]
+                return lo + (hi - lo) * (rank - seen) / n
+            seen += n
+        return float(BUCKETS_MS[-1])
+
+class Registry:
+    """Compteurs et histogrammes, thread-safe ; clé = (nom, étiquettes)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        k = (name, _key(labels))
+        with self._lock:
+            self.counters[k] = self.counters.get(k, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        k = (name, _key(labels))
+        with self._lock:
+            h = self.histograms.get(k)
+            if h is None:
+                h = self.histograms[k] = Histogram()
+            h.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Durée du bloc (ms) dans l'histogramme `name`, même en cas d'exception."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - t0) * 1000, **labels)
+
+    def merged(self, name: str, **match) -> Histogram:
+        """Histogramme `name` cumulé sur toutes les étiquettes compatibles avec `match`."""
+        want = set(_key(match))
+        out = Histogram()
+        with self._lock:
+            for (n, labels), h in self.histograms.items():
+                if n == name and want <= set(labels):
+                    out.counts = [a + b for a, b in zip(out.counts, h.counts)]
+                    out.sum += h.sum
+                    out.count += h.count
+        return out
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    # ---------- Exposition ----------
+    def prometheus(self) -> str:
+        lines, done = [], set()
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((k, (list(h.counts), h.sum, h.count)) for k, h in self.histograms.items())
+        for (name, labels), value in counters:
+            if name not in done:
+                done.add(name)
+                lines += [f"# HELP {PREFIX}{name} {HELP.get(name, name)}", f"# TYPE {PREFIX}{name} counter"]
+            lines.append(f"{PREFIX}{name}{_fmt_labels(labels)} {value:g}")
+        for (name, labels), (counts, total, count) in histograms:
+            if name not in done:
+                done.add(name)
+                lines += [f"# HELP {PREFIX}{name} {HELP.get(name, name)}", f"# TYPE {PREFIX}{name} histogram"]
+            cum = 0
+            for bound, n in zip(list(BUCKETS_MS) + ["+Inf"], counts):
+                cum += n
+                lines.append(f"{PREFIX}{name}_bucket{_fmt_labels(labels, [('le', bound)])} {cum}")
+            lines.append(f"{PREFIX}{name}_sum{_fmt_labels(labels)} {total:.3f}")
+            lines.append(f"{PREFIX}{name}_count{_fmt_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """Instantané JSON : compteurs + (count, sum, moyenne, p50, p90, p99) par histogramme."""
+        with self._lock:
+            counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self.counters.items())]
+            hists = []
+            for (n, l), h in sorted(self.histograms.items()):
+                hists.append({"name": n, "labels": dict(l), "count": h.count, "sum_ms": round(h.sum, 3),
+                              "mean_ms": round(h.sum / h.count, 3) if h.count else None,
+                              **{f"p{int(q * 100)}_ms": _round(h.quantile(q)) for q in (0.5, 0.9, 0.99)}})
+        return {"time": time.time(), "counters": counters, "histograms": hists}
+
+    def write_json(self, path: str):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)  # lecteurs jamais exposés à un fichier à moitié écrit
+
+def _round(x):
+    return None if x is None else round(x, 3)
+
+METRICS = Registry()
+
+# ---------- Serveur HTTP / instantanés ----------
+class _Handler(BaseHTTPRequestHandler):
+    registry = METRICS
+
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, ctype = json.dumps(self.registry.snapshot()).encode(), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, ctype = self.registry.prometheus().encode(), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # pas de ligne de log par scrape
+
+def serve_http(port: int, host: str = "0.0.0.0", registry: Registry = METRICS):
+    """Endpoint Prometheus (/metrics) et JSON (/metrics.json) dans un thread démon."""
+    handler = type("Handler", (_Handler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+class JsonSnapshots:
+    """Écrit registry.snapshot() dans `path` toutes les `every` secondes, et une dernière fois à l'arrêt."""
+
+    def __init__(self, path: str, every: float = 30.0, registry: Registry = METRICS):
+        self.path = path
+        self.every = every
+        self.registry = registry
+        self._stop = threading.Event()
+        threading.Thread(target=self._loop, name="metrics-json", daemon=True).start()
+        atexit.register(self.stop)
+
+    def _loop(self):
+        while not self._stop.wait(self.every):
+            self.registry.write_json(self.path)
+
+    def stop(self):
+        if not self._stop.is_set():
+            self._stop.set()
+            self.registry.write_json(self.path)
+
+_started = {}
+
+def start_from_env():
+    """METRICS_PORT / METRICS_JSON (+ METRICS_EVERY) : démarre l'exposition une seule fois par process."""
+    if "done" in _started:
+        return _started
+    _started["done"] = True
+    port = os.environ.get("METRICS_PORT")
+    if port:
+        try:
+            _started["http"] = serve_http(int(port))
+            print(f"Métriques : http://localhost:{port}/metrics")
+        except OSError as e:
+            print(f"Métriques : port {port} indisponible ({e})")
+    path = os.environ.get("METRICS_JSON")
+    if path:
+        _started["json"] = JsonSnapshots(path, float(os.environ.get("METRICS_EVERY", 30)))
+    return _started
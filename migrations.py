@@ -0,0 +1,630 @@
+# migrations.py
+# Moteur de migrations versionnées partagé par SQLite (news.db, NewsSitemaps.db)
+# et MariaDB (V5mariaDB.py).
+#
+# Chaque démarrage ne coûte qu'une lecture de `schema_version` : les migrations
+# déjà appliquées ne sont jamais rejouées (plus de PRAGMA table_info par colonne
+# ni d'UPDATE COALESCE sur toute la table à chaque lancement).
+
+from urlcanon import url_key
+
+# ---------- Table de version ----------
+SCHEMA_VERSION_DDL = {
+    "sqlite": """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version    INTEGER PRIMARY KEY,
+            name       TEXT,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    "mysql": """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version    INT PRIMARY KEY,
+            name       VARCHAR(128),
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+}
+
+PLACEHOLDER = {"sqlite": "?", "mysql": "%s"}
+MYSQL_LOCK_NAME = "news_schema_migrations"
+MYSQL_LOCK_TIMEOUT_S = 60
+
+
+# ---------- Helpers ----------
+def _exec(con, sql, params=()):
+    cur = con.cursor()
+    cur.execute(sql, params)
+    return cur
+
+def add_column_if_missing(con, dialect, table, column, sql_type):
+    """Ajoute une colonne absente (utilisé seulement à l'intérieur d'une migration)."""
+    if dialect == "mysql":
+        # MariaDB >= 10.0.2 sait le faire nativement
+        _exec(con, f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {sql_type}")
+        return
+    cols = {row[1] for row in _exec(con, f"PRAGMA table_info({table})")}
+    if column not in cols:
+        _exec(con, f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}")
+
+def current_version(con, dialect="sqlite") -> int:
+    """Version du schéma (0 si la base n'a jamais été migrée). Une seule requête."""
+    try:
+        row = _exec(con, "SELECT MAX(version) FROM schema_version").fetchone()
+    except Exception:
+        # table absente : base neuve ou antérieure au moteur de migrations
+        if dialect == "mysql":
+            con.rollback()
+        return 0
+    return (row[0] or 0) if row else 0
+
+
+# ---------- Runner ----------
+def _apply(con, dialect, migration):
+    for step in migration[dialect]:
+        if callable(step):
+            step(con, dialect)
+        else:
+            _exec(con, step)
+    ph = PLACEHOLDER[dialect]
+    _exec(con, f"INSERT INTO schema_version (version, name) VALUES ({ph}, {ph})",
+          (migration["version"], migration["name"]))
+
+def run_migrations(con, migrations, dialect: str = "sqlite") -> int:
+    """
+    Applique, dans l'ordre, les migrations dont la version est > à celle de la base.
+    - chemin rapide : une seule lecture de schema_version si tout est à jour ;
+    - chaque migration est appliquée dans une transaction avec sa ligne de version ;
+    - verrou (BEGIN IMMEDIATE / GET_LOCK) pour que deux processus ne migrent pas en même temps.
+    Retourne la version finale.
+    """
+    migrations = sorted(migrations, key=lambda m: m["version"])
+    target = migrations[-1]["version"] if migrations else 0
+    version = current_version(con, dialect)
+    if version >= target:
+        return version
+
+    if dialect == "sqlite":
+        con.commit()  # termine une éventuelle transaction implicite
+        _exec(con, "BEGIN IMMEDIATE")
+        try:
+            _exec(con, SCHEMA_VERSION_DDL["sqlite"])
+            version = current_version(con, dialect)  # un autre processus a pu migrer
+            for m in migrations:
+                if m["version"] > version:
+                    _apply(con, dialect, m)
+                    print(f"Migration {m['version']} appliquée : {m['name']}")
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        return current_version(con, dialect)
+
+    # MariaDB : le DDL provoque un commit implicite, donc chaque étape doit rester
+    # idempotente (IF NOT EXISTS) ; la ligne de version est écrite en dernier.
+    # GET_LOCK : 1 = verrou pris, 0 = délai dépassé, NULL = erreur ; sans verrou, on ne migre pas
+    got = _exec(con, "SELECT GET_LOCK(%s, %s)", (MYSQL_LOCK_NAME, MYSQL_LOCK_TIMEOUT_S)).fetchone()
+    if not got or got[0] != 1:
+        raise RuntimeError(f"verrou de migration {MYSQL_LOCK_NAME!r} non obtenu en {MYSQL_LOCK_TIMEOUT_S} s "
+                           f"(autre processus en cours de migration ?)")
+    try:
+        _exec(con, SCHEMA_VERSION_DDL["mysql"])
+        version = current_version(con, dialect)
+        for m in migrations:
+            if m["version"] <= version:
+                continue
+            con.begin()
+            try:
+                _apply(con, dialect, m)
+                con.commit()
+            except Exception:
+                con.rollback()
+                raise
+            print(f"Migration {m['version']} appliquée : {m['name']}")
+    finally:
+        _exec(con, "SELECT RELEASE_LOCK(%s)", (MYSQL_LOCK_NAME,))
+    return current_version(con, dialect)
+
+
+# ---------- Schéma "news" (TestV4, v3, BarthelemySitemaps, V5mariaDB) ----------
+ARTICLES_DDL_SQLITE = """
+    CREATE TABLE IF NOT EXISTS articles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        source   TEXT,
+        title    TEXT,
+        date     TEXT,
+        link     TEXT UNIQUE,
+        summary  TEXT,
+        fetched_at TEXT
+    )
+"""
+
+ARTICLES_DDL_MYSQL = """
+    CREATE TABLE IF NOT EXISTS articles (
+        id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+        source     VARCHAR(255),
+        title      TEXT,
+        date       VARCHAR(64),
+        link       VARCHAR(768),
+        summary    MEDIUMTEXT,
+        fetched_at VARCHAR(32),
+        UNIQUE KEY uk_link (link)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+# colonnes ajoutées au fil des versions des scripts (bases existantes)
+ARTICLE_COLUMNS = [
+    ("lang",               "TEXT",                   "VARCHAR(16)"),
+    ("publisher_domain",   "TEXT",                   "VARCHAR(255)"),
+    ("publisher_country",  "TEXT",                   "VARCHAR(8)"),
+    ("source_type",        "TEXT DEFAULT 'rss'",     "VARCHAR(16) DEFAULT 'rss'"),
+    ("people",             "TEXT",                   "TEXT"),   # JSON
+    ("countries",          "TEXT",                   "TEXT"),   # JSON
+    ("cities",             "TEXT",                   "TEXT"),   # JSON
+    ("events",             "TEXT",                   "TEXT"),   # JSON
+    ("presidents",         "TEXT",                   "TEXT"),   # JSON
+    ("content",            "TEXT",                   "MEDIUMTEXT"),
+    ("content_len",        "INTEGER",                "INT"),
+    ("content_fetched_at", "TEXT",                   "VARCHAR(32)"),
+]
+
+def _add_article_columns(con, dialect):
+    for name, sqlite_type, mysql_type in ARTICLE_COLUMNS:
+        add_column_if_missing(con, dialect, "articles", name,
+                              sqlite_type if dialect == "sqlite" else mysql_type)
+
+# (MariaDB >= 10.1.4 accepte aussi IF NOT EXISTS)
+INDEX_DATE_SOURCE_SQL = "CREATE INDEX IF NOT EXISTS idx_articles_date_source ON articles(date, source)"
+
+# Éviter les NULL (tableaux JSON vides) : exécuté une seule fois, plus à chaque démarrage
+JSON_DEFAULTS_SQL = """
+    UPDATE articles
+    SET people     = COALESCE(people,     '[]'),
+        countries  = COALESCE(countries,  '[]'),
+        cities     = COALESCE(cities,     '[]'),
+        events     = COALESCE(events,     '[]'),
+        presidents = COALESCE(presidents, '[]')
+    WHERE people IS NULL OR countries IS NULL OR cities IS NULL
+       OR events IS NULL OR presidents IS NULL
+"""
+
+# lignes historiques effectivement enrichies (migration 13) : une colonne JSON non vide
+_ENRICHED_SQL = "people IS NOT NULL AND NOT (" + " AND ".join(
+    f"COALESCE({c}, '[]') = '[]'" for c in ("people", "countries", "cities", "events", "presidents")) + ")"
+
+NEWS_MIGRATIONS = [
+    {
+        "version": 1,
+        "name": "articles + colonnes de détails",
+        "sqlite": [ARTICLES_DDL_SQLITE, _add_article_columns, INDEX_DATE_SOURCE_SQL],
+        "mysql":  [ARTICLES_DDL_MYSQL,  _add_article_columns, INDEX_DATE_SOURCE_SQL],
+    },
+    {
+        "version": 2,
+        "name": "colonnes JSON : NULL -> '[]'",
+        "sqlite": [JSON_DEFAULTS_SQL],
+        "mysql":  [JSON_DEFAULTS_SQL],
+    },
+    {
+        "version": 3,
+        "name": "tables entities + article_topics",
+        "sqlite": [
+            """
+            CREATE TABLE IF NOT EXISTS entities (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                article_id INTEGER NOT NULL,
+                text TEXT,
+                label TEXT,
+                start INTEGER,
+                "end" INTEGER,
+                FOREIGN KEY(article_id) REFERENCES articles(id)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_entities_article ON entities(article_id)",
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_entities_unique
+            ON entities(article_id, text, label, start, "end")
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS article_topics (
+              id INTEGER PRIMARY KEY AUTOINCREMENT,
+              article_id INTEGER NOT NULL,
+              topic TEXT,
+              score REAL,
+              source TEXT,
+              UNIQUE(article_id, topic),
+              FOREIGN KEY(article_id) REFERENCES articles(id)
+            )
+            """,
+        ],
+        "mysql": [
+            """
+            CREATE TABLE IF NOT EXISTS entities (
+                id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+                article_id BIGINT UNSIGNED NOT NULL,
+                text VARCHAR(255),
+                label VARCHAR(32),
+                start INT,
+                `end` INT,
+                KEY idx_entities_article (article_id),
+                UNIQUE KEY idx_entities_unique (article_id, text, label, start, `end`)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS article_topics (
+              id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+              article_id BIGINT UNSIGNED NOT NULL,
+              topic VARCHAR(64),
+              score DOUBLE,
+              source VARCHAR(16),
+              UNIQUE KEY uk_article_topic (article_id, topic)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+        ],
+    },
+    {
+        "version": 4,
+        "name": "clé url_hash binaire (remplace UNIQUE sur link)",
+        "sqlite": [
+            lambda con, d: _sqlite_rebuild_without_unique(con, "articles"),
+            lambda con, d: add_column_if_missing(con, d, "articles", "url_hash", "INTEGER"),
+            lambda con, d: _backfill_url_hash(con, d, "articles", "link"),
+            "CREATE UNIQUE INDEX IF NOT EXISTS uk_articles_url_hash ON articles(url_hash)",
+        ],
+        "mysql": [
+            lambda con, d: add_column_if_missing(con, d, "articles", "url_hash", "BINARY(16) NULL"),
+            lambda con, d: _backfill_url_hash(con, d, "articles", "link"),
+            "ALTER TABLE articles DROP INDEX IF EXISTS uk_link",
+            "ALTER TABLE articles MODIFY link TEXT",
+            "CREATE UNIQUE INDEX IF NOT EXISTS uk_articles_url_hash ON articles(url_hash)",
+        ],
+    },
+    {
+        "version": 5,
+        "name": "quasi-doublons : article_simhash + articles.duplicate_of",
+        "sqlite": [
+            lambda con, d: add_column_if_missing(con, d, "articles", "duplicate_of", "INTEGER"),
+            """
+            CREATE TABLE IF NOT EXISTS article_simhash (
+                article_id INTEGER PRIMARY KEY,
+                simhash INTEGER NOT NULL,
+                b0 INTEGER, b1 INTEGER, b2 INTEGER, b3 INTEGER,
+                FOREIGN KEY(article_id) REFERENCES articles(id)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_simhash_b0 ON article_simhash(b0)",
+            "CREATE INDEX IF NOT EXISTS idx_simhash_b1 ON article_simhash(b1)",
+            "CREATE INDEX IF NOT EXISTS idx_simhash_b2 ON article_simhash(b2)",
+            "CREATE INDEX IF NOT EXISTS idx_simhash_b3 ON article_simhash(b3)",
+        ],
+        "mysql": [
+            lambda con, d: add_column_if_missing(con, d, "articles", "duplicate_of", "BIGINT UNSIGNED NULL"),
+            """
+            CREATE TABLE IF NOT EXISTS article_simhash (
+                article_id BIGINT UNSIGNED PRIMARY KEY,
+                simhash BIGINT NOT NULL,
+                b0 SMALLINT UNSIGNED, b1 SMALLINT UNSIGNED,
+                b2 SMALLINT UNSIGNED, b3 SMALLINT UNSIGNED,
+                KEY idx_simhash_b0 (b0), KEY idx_simhash_b1 (b1),
+                KEY idx_simhash_b2 (b2), KEY idx_simhash_b3 (b3)
+            ) ENGINE=InnoDB
+            """,
+        ],
+    },
+    {
+        "version": 6,
+        "name": "articles.roles (JSON {role: [personnes]})",
+        "sqlite": [lambda con, d: add_column_if_missing(con, d, "articles", "roles", "TEXT")],
+        "mysql":  [lambda con, d: add_column_if_missing(con, d, "articles", "roles", "TEXT")],
+    },
+    {
+        "version": 7,
+        "name": "entités canoniques : entity_canon + entity_alias + entities.canon_id",
+        "sqlite": [
+            """
+            CREATE TABLE IF NOT EXISTS entity_canon (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                label TEXT NOT NULL,
+                name TEXT NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS entity_alias (
+                label TEXT NOT NULL,
+                alias_key TEXT NOT NULL,
+                canon_id INTEGER NOT NULL,
+                PRIMARY KEY (label, alias_key)
+            )
+            """,
+            lambda con, d: add_column_if_missing(con, d, "entities", "canon_id", "INTEGER"),
+            "CREATE INDEX IF NOT EXISTS idx_entities_canon ON entities(canon_id)",
+        ],
+        "mysql": [
+            """
+            CREATE TABLE IF NOT EXISTS entity_canon (
+                id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+                label VARCHAR(32) NOT NULL,
+                name VARCHAR(255) NOT NULL
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS entity_alias (
+                label VARCHAR(32) NOT NULL,
+                alias_key VARCHAR(255) NOT NULL,
+                canon_id BIGINT UNSIGNED NOT NULL,
+                PRIMARY KEY (label, alias_key)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+            lambda con, d: add_column_if_missing(con, d, "entities", "canon_id", "BIGINT UNSIGNED NULL"),
+            "CREATE INDEX IF NOT EXISTS idx_entities_canon ON entities(canon_id)",
+        ],
+    },
+    {
+        "version": 8,
+        "name": "sentiment par entité : article_entity_sentiment",
+        "sqlite": [
+            """
+            CREATE TABLE IF NOT EXISTS article_entity_sentiment (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                article_id INTEGER NOT NULL,
+                entity TEXT NOT NULL,
+                label TEXT,
+                sentences INTEGER,
+                compound REAL,
+                pos REAL,
+                neu REAL,
+                neg REAL,
+                scorer TEXT,
+                canon_id INTEGER,
+                UNIQUE(article_id, entity, label),
+                FOREIGN KEY(article_id) REFERENCES articles(id)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_entity_sentiment_canon ON article_entity_sentiment(canon_id)",
+        ],
+        "mysql": [
+            """
+            CREATE TABLE IF NOT EXISTS article_entity_sentiment (
+                id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+                article_id BIGINT UNSIGNED NOT NULL,
+                entity VARCHAR(255) NOT NULL,
+                label VARCHAR(32),
+                sentences INT,
+                compound DOUBLE,
+                pos DOUBLE,
+                neu DOUBLE,
+                neg DOUBLE,
+                scorer VARCHAR(64),
+                canon_id BIGINT UNSIGNED NULL,
+                UNIQUE KEY uk_article_entity (article_id, entity, label),
+                KEY idx_entity_sentiment_canon (canon_id)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+        ],
+    },
+    {
+        "version": 9,
+        "name": "file de travail durable : jobs (pending/leased/done/failed)",
+        "sqlite": [
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                article_id INTEGER NOT NULL,
+                payload TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_token TEXT,
+                lease_until REAL,
+                last_error TEXT,
+                updated_at REAL,
+                UNIQUE(kind, article_id)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(kind, status, available_at)",
+            "CREATE INDEX IF NOT EXISTS idx_jobs_token ON jobs(lease_token)",
+        ],
+        "mysql": [
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+                kind VARCHAR(16) NOT NULL,
+                article_id BIGINT UNSIGNED NOT NULL,
+                payload TEXT,
+                status VARCHAR(8) NOT NULL DEFAULT 'pending',
+                attempts INT NOT NULL DEFAULT 0,
+                available_at DOUBLE NOT NULL DEFAULT 0,
+                lease_owner VARCHAR(128),
+                lease_token CHAR(32),
+                lease_until DOUBLE,
+                last_error TEXT,
+                updated_at DOUBLE,
+                UNIQUE KEY uk_jobs_kind_article (kind, article_id),
+                KEY idx_jobs_claim (kind, status, available_at),
+                KEY idx_jobs_token (lease_token)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+        ],
+    },
+    {
+        "version": 10,
+        "name": "planification des flux (mode démon) : feed_state",
+        "sqlite": [
+            """
+            CREATE TABLE IF NOT EXISTS feed_state (
+                feed TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                source TEXT,
+                rate REAL,
+                interval_s REAL,
+                last_poll REAL,
+                next_poll REAL,
+                last_new INTEGER,
+                polls INTEGER NOT NULL DEFAULT 0,
+                etag TEXT,
+                modified TEXT
+            )
+            """,
+        ],
+        "mysql": [
+            """
+            CREATE TABLE IF NOT EXISTS feed_state (
+                feed VARCHAR(255) PRIMARY KEY,
+                kind VARCHAR(16) NOT NULL,
+                source VARCHAR(255),
+                rate DOUBLE,
+                interval_s DOUBLE,
+                last_poll DOUBLE,
+                next_poll DOUBLE,
+                last_new INT,
+                polls INT NOT NULL DEFAULT 0,
+                etag VARCHAR(255),
+                modified VARCHAR(64)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+        ],
+    },
+    {
+        "version": 11,
+        "name": "nœuds du démon réparti (shard.py) : nodes",
+        "sqlite": [
+            """
+            CREATE TABLE IF NOT EXISTS nodes (
+                node TEXT PRIMARY KEY,
+                host TEXT,
+                pid INTEGER,
+                started_at REAL,
+                heartbeat REAL NOT NULL,
+                feeds INTEGER NOT NULL DEFAULT 0
+            )
+            """,
+        ],
+        "mysql": [
+            """
+            CREATE TABLE IF NOT EXISTS nodes (
+                node VARCHAR(128) PRIMARY KEY,
+                host VARCHAR(255),
+                pid INT,
+                started_at DOUBLE,
+                heartbeat DOUBLE NOT NULL,
+                feeds INT NOT NULL DEFAULT 0,
+                KEY idx_nodes_heartbeat (heartbeat)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+        ],
+    },
+    {
+        "version": 12,
+        "name": "reprise du backfill (backfill.py) : backfill_state",
+        "sqlite": [
+            """
+            CREATE TABLE IF NOT EXISTS backfill_state (
+                name TEXT PRIMARY KEY,
+                last_id INTEGER NOT NULL DEFAULT 0,
+                done INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL
+            )
+            """,
+        ],
+        "mysql": [
+            """
+            CREATE TABLE IF NOT EXISTS backfill_state (
+                name VARCHAR(128) PRIMARY KEY,
+                last_id BIGINT UNSIGNED NOT NULL DEFAULT 0,
+                done BIGINT UNSIGNED NOT NULL DEFAULT 0,
+                updated_at DOUBLE
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+        ],
+    },
+    {
+        "version": 13,
+        "name": "marqueur d'enrichissement explicite : articles.enriched_at",
+        # historique : seules les lignes avec au moins une colonne JSON non vide sont
+        # marquées ; les autres repassent une fois par le backfill (--columns)
+        "sqlite": [
+            lambda con, d: add_column_if_missing(con, d, "articles", "enriched_at", "REAL"),
+            f"UPDATE articles SET enriched_at = CAST(strftime('%s', 'now') AS REAL) WHERE {_ENRICHED_SQL}",
+        ],
+        "mysql": [
+            lambda con, d: add_column_if_missing(con, d, "articles", "enriched_at", "DOUBLE NULL"),
+            f"UPDATE articles SET enriched_at = UNIX_TIMESTAMP() WHERE {_ENRICHED_SQL}",
+        ],
+    },
+]
+
+
+# ---------- Clé url_hash (urlcanon.py) ----------
+def _sqlite_rebuild_without_unique(con, table):
+    """
+    SQLite ne sait pas supprimer une contrainte UNIQUE : on recrée la table
+    (mêmes colonnes, sans UNIQUE) puis on recopie les lignes et les index nommés.
+    """
+    cols = list(_exec(con, f"PRAGMA table_info({table})"))
+    indexes = [r[0] for r in _exec(con, """
+        SELECT sql FROM sqlite_master
+        WHERE type='index' AND tbl_name=? AND sql IS NOT NULL
+    """, (table,))]
+    defs = []
+    for _, name, typ, notnull, dflt, pk in cols:
+        if pk:
+            defs.append(f'"{name}" INTEGER PRIMARY KEY AUTOINCREMENT')
+            continue
+        d = f'"{name}" {typ}'
+        if notnull:
+            d += " NOT NULL"
+        if dflt is not None:
+            d += f" DEFAULT {dflt}"
+        defs.append(d)
+    names = ", ".join(f'"{c[1]}"' for c in cols)
+    _exec(con, f"CREATE TABLE {table}__new ({', '.join(defs)})")
+    _exec(con, f"INSERT INTO {table}__new ({names}) SELECT {names} FROM {table}")
+    _exec(con, f"DROP TABLE {table}")
+    _exec(con, f"ALTER TABLE {table}__new RENAME TO {table}")
+    for sql in indexes:
+        _exec(con, sql)
+
+def _backfill_url_hash(con, dialect, table, url_col, hash_col="url_hash"):
+    """
+    Calcule la clé des lignes existantes. Les doublons d'URL canonique gardent
+    une clé NULL (la première ligne, par id, reste la ligne de référence).
+    """
+    seen, params = set(), []
+    for id_, url in _exec(con, f"SELECT id, {url_col} FROM {table} ORDER BY id").fetchall():
+        if not url:
+            continue
+        k = url_key(url, dialect)
+        if k in seen:
+            continue
+        seen.add(k)
+        params.append((k, id_))
+    ph = PLACEHOLDER[dialect]
+    con.cursor().executemany(f"UPDATE {table} SET {hash_col}={ph} WHERE id={ph}", params)
+
+
+# ---------- Schéma "NewsVader" (VADERGDELT, VADERSIMPLE) ----------
+# Les tables sont créées par les scripts (create_table_safely / DDL) ;
+# ces migrations ne font que converger les bases existantes.
+VADER_MIGRATIONS = [
+    {
+        "version": 1,
+        "name": "clé url_hash binaire (remplace MD5 hex / UNIQUE sur url)",
+        "sqlite": [
+            lambda con, d: _sqlite_rebuild_without_unique(con, "articles"),
+            lambda con, d: add_column_if_missing(con, d, "articles", "url_hash", "INTEGER"),
+            lambda con, d: _backfill_url_hash(con, d, "articles", "url"),
+            "CREATE UNIQUE INDEX IF NOT EXISTS uk_url_hash ON articles(url_hash)",
+        ],
+        "mysql": [
+            lambda con, d: add_column_if_missing(con, d, "articles", "url_key", "BINARY(16) NULL"),
+            lambda con, d: _backfill_url_hash(con, d, "articles", "url", "url_key"),
+            "ALTER TABLE articles DROP INDEX IF EXISTS uk_url_hash",
+            "ALTER TABLE articles DROP INDEX IF EXISTS uk_url",
+            "ALTER TABLE articles DROP COLUMN IF EXISTS url_hash",
+            "ALTER TABLE articles CHANGE COLUMN url_key url_hash BINARY(16) NULL",
+            "CREATE UNIQUE INDEX IF NOT EXISTS uk_url_hash ON articles(url_hash)",
+        ],
+    },
+]
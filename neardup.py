@@ -0,0 +1,160 @@
+# neardup.py
+# Détection de quasi-doublons (dépêches AFP/Reuters reprises par plusieurs flux)
+# par SimHash 64 bits + index LSH à 4 bandes de 16 bits.
+#
+# Deux signatures à distance de Hamming <= 3 ont forcément au moins une bande
+# identique (principe des tiroirs) : on ne compare donc que les candidats qui
+# partagent une bande, via des colonnes indexées (table article_simhash).
+import hashlib, re, unicodedata
+
+SIMHASH_BITS = 64
+BANDS = 4
+BAND_BITS = SIMHASH_BITS // BANDS
+MAX_DISTANCE = 3         # bits différents tolérés
+MIN_TOKENS = 8           # en dessous, signature trop bruitée (titres courts)
+SHINGLE = 2              # bigrammes de mots (plus stable que 3 sur titre+résumé)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+def _tokens(text: str) -> list[str]:
+    t = unicodedata.normalize("NFKD", (text or "").lower())
+    t = "".join(c for c in t if not unicodedata.combining(c))  # accents repliés
+    return _WORD_RE.findall(t)
+
+def _h64(s: str) -> int:
+    return int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+
+def _signed(x: int) -> int:
+    # stockage INTEGER (SQLite) / BIGINT (MariaDB) signé
+    return x - (1 << 64) if x >= (1 << 63) else x
+
+def simhash(text: str) -> int|None:
+    """SimHash 64 bits (signé) des shingles de mots ; None si le texte est trop court."""
+    toks = _tokens(text)
+    if len(toks) < MIN_TOKENS:
+        return None
+    grams = {" ".join(toks[i:i + SHINGLE]) for i in range(len(toks) - SHINGLE + 1)}
+    acc = [0] * SIMHASH_BITS
+    for g in grams:
+        h = _h64(g)
+        for b in range(SIMHASH_BITS):
+            acc[b] += 1 if (h >> b) & 1 else -1
+    sig = 0
+    for b in range(SIMHASH_BITS):
+        if acc[b] > 0:
+            sig |= 1 << b
+    return _signed(sig)
+
+def bands(sig: int) -> list[int]:
+    u = sig & ((1 << 64) - 1)
+    mask = (1 << BAND_BITS) - 1
+    return [(u >> (i * BAND_BITS)) & mask for i in range(BANDS)]
+
+def hamming(a: int, b: int) -> int:
+    return ((a ^ b) & ((1 << 64) - 1)).bit_count()
+
+# ---------- Index en mémoire (lot courant, DataFrame GDELT) ----------
+def near_duplicate_groups(texts, max_distance: int = MAX_DISTANCE) -> list[int]:
+    """
+    Pour chaque texte, l'indice du premier texte quasi identique (lui-même sinon).
+    Sert à ne scorer qu'une fois les copies d'une même dépêche dans un lot.
+    """
+    buckets = [{} for _ in range(BANDS)]
+    sigs, out = [], []
+    for i, text in enumerate(texts):
+        sig = simhash(text)
+        canon = i
+        if sig is not None:
+            cands = set()
+            for k, band in enumerate(bands(sig)):
+                cands.update(buckets[k].get(band, ()))
+            for j in sorted(cands):
+                if hamming(sig, sigs[j]) <= max_distance:
+                    canon = out[j]
+                    break
+            for k, band in enumerate(bands(sig)):
+                buckets[k].setdefault(band, []).append(i)
+        sigs.append(sig)
+        out.append(canon)
+    return out
+
+# ---------- Index persistant (table article_simhash) ----------
+# enriched_at : posé à l'écriture des colonnes (summarize_inline, copie d'un quasi-doublon),
+# si bien qu'un article enrichi sans aucune entité n'est pas confondu avec un article
+# jamais traité (migration 13) ; mêmes prédicats dans backfill.py
+ENRICHMENT_COLS = ["lang", "people", "countries", "cities", "events", "presidents", "roles", "enriched_at"]
+LANG_MISSING = ["lang IS NULL", "lang = ''"]
+COLUMNS_MISSING = ["enriched_at IS NULL"]
+UNENRICHED_SQL = "(" + " OR ".join(COLUMNS_MISSING) + ")"
+
+class NearDupIndex:
+    """Index SimHash persistant, dans la base de l'ArticleStore (migration 5)."""
+
+    def __init__(self, store, max_distance: int = MAX_DISTANCE):
+        self.store = store
+        self.ph = store.ph
+        self.max_distance = max_distance
+        self._memo = {}  # enrichissements calculés pendant ce run (pas encore écrits)
+
+    def remember(self, article_id: int, enrichment: dict):
+        """Enregistre l'enrichissement d'un canonique avant son écriture en base."""
+        self._memo[article_id] = {c: enrichment.get(c) for c in ENRICHMENT_COLS}
+
+    def find(self, sig: int|None, exclude_id: int|None = None) -> int|None:
+        """Id de l'article canonique quasi identique à `sig`, ou None."""
+        if sig is None:
+            return None
+        p = self.ph
+        where = " OR ".join(f"b{i}={p}" for i in range(BANDS))
+        with self.store.backend.connection() as con:
+            cur = con.cursor()
+            cur.execute(f"""
+                SELECT article_id, simhash FROM article_simhash
+                WHERE {where}
+                ORDER BY article_id
+            """, bands(sig))
+            for article_id, other in cur.fetchall():
+                if article_id != exclude_id and hamming(sig, other) <= self.max_distance:
+                    return article_id
+        return None
+
+    def add_many(self, items):
+        """items : (article_id, simhash) ; les signatures None sont ignorées."""
+        rows = [(aid, sig, *bands(sig)) for aid, sig in items if aid and sig is not None]
+        if not rows:
+            return
+        p = self.ph
+        with self.store.backend.connection() as con:
+            con.cursor().executemany(f"""
+                {self.store.backend.insert_ignore} INTO article_simhash (article_id, simhash, b0, b1, b2, b3)
+                VALUES ({p},{p},{p},{p},{p},{p})
+            """, rows)
+
+    def enrichment_of(self, article_id: int) -> dict|None:
+        """Colonnes d'enrichissement de l'article canonique (None s'il n'a pas été enrichi, cf. UNENRICHED_SQL)."""
+        if article_id in self._memo:
+            return dict(self._memo[article_id])
+        p = self.ph
+        with self.store.backend.connection() as con:
+            cur = con.cursor()
+            cur.execute(f"SELECT {', '.join(ENRICHMENT_COLS)} FROM articles "
+                        f"WHERE id={p} AND NOT {UNENRICHED_SQL}", (article_id,))
+            row = cur.fetchone()
+        if not row:
+            return None
+        return dict(zip(ENRICHMENT_COLS, row))
+
+    def resolve(self, article_id: int, text: str):
+        """
+        Indexe l'article et cherche son canonique.
+        Retourne (canonical_id | None, enrichment | None) : si enrichment est fourni,
+        l'appelant peut sauter fetch/NER et le recopier avec duplicate_of=canonical_id.
+        """
+        sig = simhash(text)
+        canon = self.find(sig, exclude_id=article_id)
+        if canon is None or canon > article_id:
+            # pas de doublon plus ancien : cet article devient la référence
+            self.add_many([(article_id, sig)])
+            return None, None
+        # seuls les canoniques sont indexés : duplicate_of pointe toujours vers la racine
+        return canon, self.enrichment_of(canon)
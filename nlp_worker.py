@@ -0,0 +1,294 @@
+# nlp_worker.py
+# Service NLP persistant : charge les modèles spaCy FR/EN une seule fois et sert
+# des lots de NER sur une socket Unix. Les scripts d'ingestion ne chargent plus
+# spaCy à l'import : NLPService se connecte au worker au premier besoin et, s'il
+# ne répond pas, charge les modèles dans le process (comportement d'avant).
+#
+# Lancement :  python nlp_worker.py [--socket /tmp/news_nlp.sock]
+# Protocole  : messages JSON préfixés par leur longueur (4 octets big-endian)
+#   {"op": "version"}                               -> {"version": "..."}
+#   {"op": "ner", "items": [[texte, route], ...]}   -> {"results": [[ents, lang, sents], ...]}
+import os, json, socket, struct, argparse, threading, socketserver
+from functools import lru_cache
+from importlib import metadata
+
+from enrich_cache import doc_entities
+from metrics import METRICS, start_from_env
+from longner import chunk_text, pipe_spans, doc_sentences
+
+SOCKET_PATH = os.environ.get("NEWS_NLP_SOCKET", "/tmp/news_nlp.sock")
+CONNECT_TIMEOUT = 0.5    # s ; au-delà on passe en local
+REQUEST_TIMEOUT = 900    # s ; gros lots plein texte
+MODELS = {
+    # Priorité : md > sm
+    "fr": ["fr_core_news_md", "fr_core_news_sm"],
+    "en": ["en_core_web_md", "en_core_web_sm"],
+}
+
+def _installed(names):
+    for name in names:
+        try:
+            return name, metadata.version(name)
+        except Exception:
+            continue
+    return None, None
+
+@lru_cache(maxsize=1)
+def models_version() -> str:
+    """Version des modèles qui seront chargés (sans les charger) : clé du cache NER."""
+    out = []
+    for lang in ("fr", "en"):
+        name, version = _installed(MODELS[lang])
+        out.append(f"{name}-{version}" if name else "-")
+    return "|".join(out)
+
+# ---------- Modèles dans le process ----------
+class LocalNLP:
+    """Modèles spaCy chargés dans le process, au premier appel."""
+
+    def __init__(self):
+        self._models = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> str:
+        return models_version()
+
+    def models(self) -> dict:
+        with self._lock:
+            if self._models is None:
+                try:
+                    import spacy
+                except Exception:
+                    spacy = None
+                self._models = {}
+                for lang, names in MODELS.items():
+                    name, _ = _installed(names)
+                    nlp = None
+                    if spacy and name:
+                        try:
+                            nlp = spacy.load(name)
+                        except Exception:
+                            nlp = None
+                    self._models[lang] = nlp
+            return self._models
+
+    def entities_many(self, items) -> dict:
+        """
+        items : [(clé, texte, route)] avec route "fr" / "en" / "auto" (cf. ner_route).
+        Retourne {clé: (ents, lang, sents)} (sents : phrases spaCy [(début, fin)]) ;
+        en "auto", le modèle retenu est celui qui trouve le plus d'entités sur le
+        premier morceau.
+        """
+        models = self.models()
+        out, todo, first = {}, {"fr": [], "en": []}, {}
+        for key, text, route in items:
+            if route in todo and models.get(route):
+                todo[route].append((key, text))
+                continue
+            chunks = chunk_text(text)
+            # un seul Doc gardé à la fois : le perdant est libéré avant de passer au modèle suivant
+            lang = doc = None
+            with METRICS.timer("ner_choose_ms"):
+                for name, nlp in models.items():
+                    if nlp:
+                        candidate = nlp(chunks[0][1] if chunks else "")
+                        if doc is None or len(candidate.ents) > len(doc.ents):
+                            lang, doc = name, candidate
+                        del candidate
+            if doc is None:
+                out[key] = ([], None, [])
+                continue
+            if len(chunks) <= 1:
+                out[key] = (doc_entities(doc), lang, doc_sentences(doc))   # texte court : déjà fait
+            else:
+                # premier morceau déjà analysé : seule la suite repasse dans nlp.pipe
+                first[key] = (doc_entities(doc), doc_sentences(doc))
+                off = chunks[1][0]
+                todo[lang].append((key, text[off:], off))
+            del doc
+        for lang, batch in todo.items():
+            if batch:
+                with METRICS.timer("ner_pipe_ms", lang=lang):
+                    found = pipe_spans(models[lang], batch)
+                for key, *_ in batch:
+                    ents, sents = found.get(key, ([], []))
+                    if key in first:
+                        ents, sents = first[key][0] + ents, first[key][1] + sents
+                    out[key] = (ents, lang, sents)
+        return out
+
+# ---------- Protocole ----------
+def _send(sock, obj):
+    data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    sock.sendall(struct.pack(">I", len(data)) + data)
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        part = sock.recv(n - len(buf))
+        if not part:
+            raise ConnectionError("connexion fermée")
+        buf += part
+    return bytes(buf)
+
+def _recv(sock):
+    (n,) = struct.unpack(">I", _recv_exact(sock, 4))
+    return json.loads(_recv_exact(sock, n).decode("utf-8"))
+
+# ---------- Client ----------
+class NLPWorkerError(RuntimeError):
+    """Réponse d'erreur du worker (le lot a échoué côté serveur)."""
+
+class NLPClient:
+    def __init__(self, path: str = SOCKET_PATH):
+        self.path = path
+        self._sock = None
+
+    def connect(self) -> bool:
+        if self._sock is not None:
+            return True
+        if not os.path.exists(self.path):
+            return False
+        try:
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            s.settimeout(CONNECT_TIMEOUT)
+            s.connect(self.path)
+            s.settimeout(REQUEST_TIMEOUT)
+        except OSError:
+            return False
+        self._sock = s
+        return True
+
+    def _call(self, msg):
+        if not self.connect():
+            raise ConnectionError(f"worker NLP injoignable ({self.path})")
+        try:
+            _send(self._sock, msg)
+            resp = _recv(self._sock)
+        except (OSError, ValueError):
+            self.close()
+            raise ConnectionError("worker NLP : échange interrompu")
+        if "error" in resp:
+            raise NLPWorkerError(resp["error"])
+        return resp
+
+    def entities_many(self, items) -> dict:
+        items = list(items)
+        resp = self._call({"op": "ner", "items": [[text, route] for _, text, route in items]})
+        return {key: tuple(res) for (key, _, _), res in zip(items, resp["results"])}
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+
+# ---------- Façade utilisée par les scripts ----------
+class NLPService:
+    """
+    Worker si joignable (connexion au premier appel), sinon modèles locaux. Un lot en
+    échec côté worker (coupure, délai dépassé, réponse d'erreur) est refait localement ;
+    le lot suivant se reconnecte (ou reste en local si le worker a disparu).
+    """
+
+    def __init__(self, path: str = SOCKET_PATH):
+        self.path = path
+        self._backend = None
+        self._local = None      # modèles locaux du repli par lot (chargés au premier échec)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # fils d'un pool (fork) : sa propre connexion au worker ; modèles locaux déjà chargés gardés
+        if isinstance(self._backend, NLPClient):
+            self._backend = None
+        for local in (self._backend, self._local):
+            if isinstance(local, LocalNLP):
+                local._lock = threading.Lock()
+
+    def _get(self):
+        if self._backend is None:
+            client = NLPClient(self.path)
+            if client.connect():
+                self._backend = client
+            else:
+                print("Worker NLP absent : modèles spaCy chargés localement")
+                self._backend = self._local or LocalNLP()
+        return self._backend
+
+    @property
+    def version(self) -> str:
+        # calculable sans worker ni chargement : ne coûte rien si tout est en cache
+        return models_version()
+
+    def entities_many(self, items) -> dict:
+        """items : [(clé, texte, route)] -> {clé: (ents, lang, sents)}."""
+        items = list(items)
+        if not items:
+            return {}
+        backend = self._get()
+        try:
+            return backend.entities_many(items)
+        except (OSError, NLPWorkerError) as e:
+            if not isinstance(backend, NLPClient):
+                raise
+            backend.close()
+            self._backend = None
+            print(f"Worker NLP : {e} : lot de {len(items)} traité par les modèles locaux")
+            METRICS.inc("nlp_fallback_total")
+            if self._local is None:
+                self._local = LocalNLP()
+            return self._local.entities_many(items)
+
+# ---------- Serveur ----------
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        nlp, lock = self.server.nlp, self.server.lock
+        while True:
+            try:
+                msg = _recv(self.request)
+            except (ConnectionError, OSError, ValueError):
+                return
+            try:
+                if msg.get("op") == "version":
+                    resp = {"version": nlp.version}
+                elif msg.get("op") == "ner":
+                    items = [(i, text, route) for i, (text, route) in enumerate(msg.get("items", []))]
+                    with lock:   # un seul lot à la fois sur les modèles
+                        found = nlp.entities_many(items)
+                    resp = {"results": [list(found[i]) for i, _, _ in items]}
+                else:
+                    resp = {"error": f"op inconnue : {msg.get('op')}"}
+            except Exception as e:
+                resp = {"error": repr(e)}
+            _send(self.request, resp)
+
+class NLPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str = SOCKET_PATH, nlp=None):
+        if os.path.exists(path):
+            os.remove(path)   # socket d'un worker précédent
+        self.nlp = nlp or LocalNLP()
+        self.lock = threading.Lock()
+        super().__init__(path, _Handler)
+
+def main():
+    ap = argparse.ArgumentParser(description="Worker NLP (spaCy FR/EN) sur socket Unix")
+    ap.add_argument("--socket", default=SOCKET_PATH)
+    args = ap.parse_args()
+    server = NLPServer(args.socket)
+    models = server.nlp.models()   # chargement unique, avant la première requête
+    print("Modèles chargés :", {k: bool(v) for k, v in models.items()}, "->", args.socket)
+    start_from_env()   # METRICS_PORT : temps de choix de modèle / de pipe côté worker
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+
+if __name__ == "__main__":
+    main()
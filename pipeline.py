@@ -0,0 +1,234 @@
+# pipeline.py
+# Moteur d'ingestion par étapes, reliées par des files bornées :
+#   producteurs (discover) -> étape 1 -> étape 2 -> ... -> dernière étape
+#   - chaque étape a son parallélisme : threads (E/S réseau, base) ou processus
+#     (CPU : parsing HTML...), et traite ses éléments par lots (batch, max_wait)
+#   - files bornées : une étape lente bloque l'amont (backpressure), la mémoire
+#     reste bornée quel que soit le nombre d'articles découverts
+#   - arrêt propre : stop() (ou Ctrl-C) coupe les producteurs, les éléments déjà
+#     en vol traversent toutes les étapes ; sentinelle STOP propagée étape par étape
+# Les étapes "articles" (fetch, extract, enrich, sentiment, store) sont dans
+# ingest.py, les producteurs RSS / sitemap / GDELT dans sources.py ; profilage
+# par étape (--profile) dans profiling.py, mémoire et budgets dans memwatch.py.
+import os, queue, signal, threading, time, traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from metrics import METRICS
+from memwatch import peak_rss_bytes
+
+STOP = object()  # fin de flux (sentinelle)
+
+class Stage:
+    """
+    Étape du pipeline. `fn(lot) -> éléments pour l'étape suivante` (itérable ou None).
+    mode "thread" : `workers` threads appellent fn ; mode "process" : les lots partent
+    dans un pool de `workers` processus (fn et éléments picklables : fonction de module
+    ou functools.partial).
+    """
+
+    def __init__(self, name: str, fn, workers: int = 1, mode: str = "thread",
+                 batch: int = 1, max_wait: float = 0.5, queue_size: int|None = None):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"mode inconnu : {mode}")
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.mode = mode
+        self.batch = max(1, batch)
+        self.max_wait = max_wait
+        # file d'entrée : de quoi occuper chaque worker deux lots d'avance
+        self.queue_size = queue_size or max(16, 2 * self.batch * self.workers)
+        self.stats = {"in": 0, "out": 0, "batches": 0, "errors": 0, "busy_s": 0.0}
+        self._lock = threading.Lock()
+
+    def count(self, **inc):
+        with self._lock:
+            for k, v in inc.items():
+                self.stats[k] += v
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, workers={self.workers}, mode={self.mode!r}, batch={self.batch})"
+
+class Pipeline:
+    """
+    pipeline = Pipeline([Stage(...), ...], discover_workers=4)
+    stats = pipeline.run([producteur, ...])   # producteur : itérable (générateur) d'éléments
+    """
+
+    def __init__(self, stages, discover_workers: int = 4, profiler=None, memory=None):
+        if not stages:
+            raise ValueError("pipeline sans étape")
+        self.stages = list(stages)
+        self.discover_workers = max(1, discover_workers)
+        self.profiler = profiler    # profiling.Profiler : un profil par étape
+        self.memory = memory        # memwatch.MemoryMonitor : mesure par lot, budgets
+        self.discovered = 0
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def stop(self):
+        """Arrêt propre : plus de découverte, les éléments en vol sont terminés."""
+        self._stop.set()
+
+    @property
+    def stopping(self) -> bool:
+        return self._stop.is_set()
+
+    # ---------- Producteurs ----------
+    def _discover(self, producers: queue.Queue, out: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                producer = producers.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                for item in producer:
+                    if self._stop.is_set():
+                        break
+                    out.put(item)  # bloque si l'étape 1 est saturée
+                    with self._lock:
+                        self.discovered += 1
+            except Exception:
+                print(f"[discover] producteur en échec :\n{traceback.format_exc()}")
+
+    # ---------- Étapes ----------
+    @staticmethod
+    def _next_batch(stage: Stage, inq: queue.Queue):
+        """Lot de 1 à stage.batch éléments ; (lot, fin_de_flux)."""
+        first = inq.get()
+        if first is STOP:
+            return [], True
+        items = [first]
+        deadline = time.monotonic() + stage.max_wait
+        while len(items) < stage.batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = inq.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is STOP:
+                return items, True
+            items.append(item)
+        return items, False
+
+    def _worker(self, stage: Stage, fn, inq: queue.Queue, outq: queue.Queue|None, pool, done: list):
+        while True:
+            items, end = self._next_batch(stage, inq)
+            if items:
+                t0 = time.perf_counter()
+                try:
+                    if self.memory:
+                        out = self.memory.call(stage, fn, items, pool)
+                    else:
+                        out = list((pool.submit(fn, items).result() if pool else fn(items)) or [])
+                except Exception:
+                    out = []
+                    stage.count(errors=1)
+                    METRICS.inc("stage_items_total", len(items), stage=stage.name, dir="error")
+                    print(f"[{stage.name}] lot de {len(items)} en échec :\n{traceback.format_exc()}")
+                busy = time.perf_counter() - t0
+                stage.count(**{"in": len(items), "out": len(out), "batches": 1, "busy_s": busy})
+                METRICS.observe("stage_batch_ms", busy * 1000, stage=stage.name)
+                METRICS.inc("stage_items_total", len(items), stage=stage.name, dir="in")
+                METRICS.inc("stage_items_total", len(out), stage=stage.name, dir="out")
+                if outq is not None:
+                    for item in out:
+                        outq.put(item)
+            if end:
+                inq.put(STOP)  # réveille les autres workers de l'étape
+                with self._lock:
+                    done[0] += 1
+                    last = done[0] == stage.workers
+                if last and outq is not None:
+                    outq.put(STOP)
+                return
+
+    def run(self, producers) -> dict:
+        """Exécute le pipeline jusqu'à épuisement des producteurs (ou stop()). Retourne les stats."""
+        queues = [queue.Queue(maxsize=s.queue_size) for s in self.stages]
+        pools, threads = [], []
+        t0 = time.perf_counter()
+        restore = self._install_sigint()
+        prof = self.profiler
+        try:
+            for i, stage in enumerate(self.stages):
+                pool = ProcessPoolExecutor(max_workers=stage.workers) if stage.mode == "process" else None
+                pools.append(pool)
+                outq = queues[i + 1] if i + 1 < len(queues) else None
+                done = [0]
+                fn = prof.process_fn(stage.name, stage.fn) if prof and pool else stage.fn
+                target = prof.thread(stage.name, self._worker) if prof else self._worker
+                for n in range(stage.workers):
+                    t = threading.Thread(target=target, args=(stage, fn, queues[i], outq, pool, done),
+                                         name=f"{stage.name}-{n}", daemon=True)
+                    t.start()
+                    threads.append(t)
+
+            todo = queue.Queue()
+            for p in producers:
+                todo.put(p)
+            target = prof.thread("discover", self._discover) if prof else self._discover
+            discover = [threading.Thread(target=target, args=(todo, queues[0]),
+                                         name=f"discover-{n}", daemon=True)
+                        for n in range(self.discover_workers)]
+            for t in discover:
+                t.start()
+            for t in discover:
+                self._join(t)
+            queues[0].put(STOP)
+            for t in threads:
+                self._join(t)
+        finally:
+            for pool in pools:
+                if pool is not None:
+                    pool.shutdown(wait=True)
+            restore()
+        return self.report(time.perf_counter() - t0)
+
+    def _join(self, t: threading.Thread):
+        # join par tranches : le thread principal reste réactif à Ctrl-C
+        while t.is_alive():
+            t.join(0.2)
+
+    def _install_sigint(self):
+        """1er Ctrl-C : arrêt propre (vidange) ; 2e : interruption immédiate."""
+        if threading.current_thread() is not threading.main_thread():
+            return lambda: None
+        previous = signal.getsignal(signal.SIGINT)
+
+        def handler(signum, frame):
+            if self._stop.is_set():
+                signal.signal(signal.SIGINT, previous)
+                raise KeyboardInterrupt
+            print("\nArrêt demandé : fin des éléments en cours (Ctrl-C à nouveau pour interrompre)")
+            self.stop()
+
+        signal.signal(signal.SIGINT, handler)
+        return lambda: signal.signal(signal.SIGINT, previous)
+
+    def report(self, elapsed: float) -> dict:
+        out = {"elapsed_s": round(elapsed, 3), "discovered": self.discovered, "stopped": self.stopping,
+               "stages": {s.name: dict(s.stats, busy_s=round(s.stats["busy_s"], 3)) for s in self.stages},
+               "peak_rss_mb": round(peak_rss_bytes() / 2**20, 1),
+               "children_peak_rss_mb": round(peak_rss_bytes(children=True) / 2**20, 1)}
+        if self.memory:
+            memory = self.memory.report()
+            for name, s in out["stages"].items():
+                if name in memory:
+                    s.update(peak_batch_mb=memory[name]["peak_mb"], batch_size=memory[name]["batch"])
+        return out
+
+def print_report(report: dict):
+    print(f"{report['discovered']} éléments découverts en {report['elapsed_s']:.1f}s"
+          + (" (arrêt demandé)" if report["stopped"] else "")
+          + (f", pic RSS {report['peak_rss_mb']:.0f} Mo" if report.get("peak_rss_mb") else ""))
+    for name, s in report["stages"].items():
+        print(f"  {name:<10} entrée {s['in']:>6}  sortie {s['out']:>6}  lots {s['batches']:>5}  "
+              f"erreurs {s['errors']:>3}  occupé {s['busy_s']:.1f}s"
+              + (f"  pic lot {s['peak_batch_mb']:.1f} Mo (lot {s['batch_size']})" if "peak_batch_mb" in s else ""))
+
+def cpu_workers() -> int:
+    """Processus pour les étapes CPU : un cœur laissé aux threads d'E/S et à la base."""
+    return max(1, (os.cpu_count() or 2) - 1)
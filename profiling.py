@@ -0,0 +1,300 @@
+# profiling.py
+# Profilage CPU par étape du pipeline (pipeline.py), sans retoucher les scripts :
+#   --profile[=DIR]        cProfile déterministe, un profil par étape (threads de l'étape
+#                          cumulés, processus du pool compris) :
+#                            DIR/<étape>.prof  (pstats : snakeviz, gprof2dot, flameprof...)
+#                            DIR/<étape>.txt   (top cumulatif + temps des fonctions clés :
+#                                              parse_feed, trafilatura, BeautifulSoup, spaCy...)
+#   --profile-sample[=HZ]  échantillonnage des piles (sys._current_frames) à HZ Hz, assez
+#                          léger pour rester actif en production (PROFILE_SAMPLE_HZ=10) :
+#                            DIR/<étape>.collapsed  (flamegraph.pl, speedscope, inferno)
+# Étapes : discover (parsing des flux / sitemaps), fetch, extract, enrich, sentiment, store.
+import os, io, sys, glob, time, pstats, cProfile, threading
+from collections import Counter
+from multiprocessing.util import Finalize
+
+DEFAULT_DIR = "profiles"
+DEFAULT_HZ = 10
+DUMP_EVERY_S = 30      # écriture périodique des piles échantillonnées (démon)
+MAX_DEPTH = 64
+
+# fonctions suivies dans le résumé .txt : (libellé, morceau du fichier, fonction)
+FOCUS = [
+    ("feed parse",        "sources.py",           "parse_feed"),
+    ("sitemap",           "sources.py",           "fetch_sitemap"),
+    ("http",              "sources.py",           "http_get"),
+    ("trafilatura",       "trafilatura/core.py",  "extract"),
+    ("BeautifulSoup",     "bs4/__init__.py",      "__init__"),
+    ("page metadata",     "sources.py",           "page_metadata"),
+    ("spaCy (choix)",     "nlp_worker.py",        "entities_many"),
+    ("spaCy (pipe)",      "longner.py",           "pipe_spans"),
+    ("lexique",           "lexicon_sentiment.py", "score_many"),
+    ("VADER",             "vaderSentiment",       "polarity_scores"),
+    ("db insert_many",    "storage.py",           "insert_many"),
+    ("db update_many",    "storage.py",           "update_many"),
+    ("db entités/topics", "storage.py",           "insert_entities"),
+    ("db entités/topics", "storage.py",           "insert_topics"),
+]
+
+# pile d'un thread qui attend du travail : pas un échantillon utile
+IDLE = {("threading.py", "wait"), ("queue.py", "get"), ("threading.py", "_wait_for_tstate_lock"),
+        ("selectors.py", "select"), ("_base.py", "result"),
+        ("queues.py", "get"), ("connection.py", "_recv"), ("connection.py", "_recv_bytes")}  # fils du pool
+
+def _frame_name(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+def collapse(frame) -> str|None:
+    """Pile d'un frame au format replié (racine d'abord, 'a;b;c'), None si thread inactif."""
+    code = frame.f_code
+    if (os.path.basename(code.co_filename), code.co_name) in IDLE:
+        return None
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+def _write_collapsed(path: str, counts: Counter):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for stack, n in counts.most_common():
+            f.write(f"{stack} {n}\n")
+    os.replace(tmp, path)
+
+def _read_collapsed(path: str) -> Counter:
+    out = Counter()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            stack, _, n = line.rstrip("\n").rpartition(" ")
+            if stack:
+                out[stack] += int(n)
+    return out
+
+class Sampler:
+    """Thread qui relève les piles des threads `stage_of(nom) -> étape|None` à `hz` Hz."""
+
+    def __init__(self, hz: float, stage_of, on_tick=None):
+        self.interval = 1.0 / max(hz, 0.1)
+        self.stage_of = stage_of
+        self.on_tick = on_tick
+        self.counts = {}            # étape -> Counter(pile repliée)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _loop(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                stage = ident != me and self.stage_of(names.get(ident, ""))
+                stack = collapse(frame) if stage else None
+                if stack:
+                    with self._lock:
+                        self.counts.setdefault(stage, Counter())[f"{stage};{stack}"] += 1
+            if self.on_tick:
+                self.on_tick()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {stage: Counter(c) for stage, c in self.counts.items()}
+
+# ---------- Processus du pool (étapes mode "process") ----------
+_CHILD = {}   # par processus : profils / échantillonneur de l'étape
+
+class ProfiledFn:
+    """fn d'une étape "process", profilée dans le processus fils ; picklable (cf. pipeline.Stage)."""
+
+    def __init__(self, stage: str, fn, outdir: str, mode: str, hz: float):
+        self.stage = stage
+        self.fn = fn
+        self.outdir = outdir
+        self.mode = mode
+        self.hz = hz
+
+    def _part(self, ext: str) -> str:
+        return os.path.join(self.outdir, "parts", f"{self.stage}.{os.getpid()}.{ext}")
+
+    def __call__(self, items):
+        key = (self.mode, self.stage)
+        if key not in _CHILD:
+            _CHILD[key] = self._start()
+        if self.mode == "cprofile":
+            return _CHILD[key].runcall(self.fn, items)
+        return self.fn(items)
+
+    def _start(self):
+        # écrit à la sortie propre du fils (pool.shutdown) ; échantillons aussi toutes les 5 s
+        if self.mode == "cprofile":
+            prof = cProfile.Profile()
+            Finalize(None, prof.dump_stats, args=(self._part("prof"),), exitpriority=10)
+            return prof
+        path, last = self._part("collapsed"), [time.monotonic()]
+        main = threading.main_thread().name
+        sampler = Sampler(self.hz, lambda name: self.stage if name == main else None)
+
+        def dump():
+            last[0] = time.monotonic()
+            _write_collapsed(path, sampler.snapshot().get(self.stage, Counter()))
+
+        sampler.on_tick = lambda: time.monotonic() - last[0] >= 5 and dump()
+        sampler.start()
+        Finalize(None, lambda: (sampler.stop(), dump()), exitpriority=10)
+        return sampler
+
+# ---------- Profileur d'un run ----------
+class Profiler:
+    """
+    profiler = Profiler("profiles", mode="cprofile" | "sample", hz=10)
+    Pipeline(stages, profiler=profiler) ; profiler.start() ... profiler.stop() (écrit les fichiers).
+    """
+
+    def __init__(self, outdir: str = DEFAULT_DIR, mode: str = "cprofile", hz: float = DEFAULT_HZ):
+        if mode not in ("cprofile", "sample"):
+            raise ValueError(f"mode de profilage inconnu : {mode}")
+        self.outdir = outdir
+        self.mode = mode
+        self.hz = hz
+        self.stages = set()
+        self._profiles = {}          # étape -> [cProfile.Profile] (un par thread terminé)
+        self._lock = threading.Lock()
+        self._last_dump = time.monotonic()
+        self._sampler = Sampler(hz, self._stage_of, on_tick=self._tick) if mode == "sample" else None
+        os.makedirs(os.path.join(outdir, "parts"), exist_ok=True)
+        for part in glob.glob(os.path.join(glob.escape(outdir), "parts", "*")):
+            os.remove(part)  # morceaux d'un run précédent : ne pas les cumuler
+
+    def _stage_of(self, thread_name: str) -> str|None:
+        stage = thread_name.rsplit("-", 1)[0]
+        return stage if stage in self.stages else None
+
+    def _tick(self):
+        if time.monotonic() - self._last_dump >= DUMP_EVERY_S:
+            self.dump()
+
+    # --- branchements (pipeline.py) ---
+    def thread(self, stage: str, target):
+        """Cible d'un thread de l'étape `stage` (threads nommés '<étape>-<n>')."""
+        with self._lock:
+            self.stages.add(stage)
+        if self.mode != "cprofile":
+            return target
+
+        def run(*args):
+            prof = cProfile.Profile()
+            try:
+                prof.runcall(target, *args)
+            finally:
+                with self._lock:
+                    self._profiles.setdefault(stage, []).append(prof)
+        return run
+
+    def process_fn(self, stage: str, fn):
+        with self._lock:
+            self.stages.add(stage)
+        return ProfiledFn(stage, fn, self.outdir, self.mode, self.hz)
+
+    # --- cycle de vie ---
+    def start(self):
+        if self._sampler is not None and self._sampler._thread is None:
+            self._sampler.start()
+        return self
+
+    def stop(self):
+        if self._sampler is not None:
+            self._sampler.stop()
+        self.dump()
+        print(f"Profils par étape : {os.path.abspath(self.outdir)}")
+
+    def dump(self):
+        self._last_dump = time.monotonic()
+        if self.mode == "cprofile":
+            self._dump_pstats()
+        else:
+            self._dump_collapsed()
+
+    def _parts(self, stage: str, ext: str) -> list[str]:
+        return sorted(glob.glob(os.path.join(self.outdir, "parts", f"{glob.escape(stage)}.*.{ext}")))
+
+    def _dump_collapsed(self):
+        counts = self._sampler.snapshot()
+        for stage in self.stages:
+            total = counts.get(stage, Counter())
+            for part in self._parts(stage, "collapsed"):
+                total.update(_read_collapsed(part))
+            if total:
+                _write_collapsed(os.path.join(self.outdir, f"{stage}.collapsed"), total)
+
+    def _dump_pstats(self):
+        with self._lock:
+            profiles = {stage: list(p) for stage, p in self._profiles.items()}
+        for stage in self.stages:
+            sources = profiles.get(stage, []) + self._parts(stage, "prof")
+            stats = None
+            for src in sources:
+                try:
+                    if stats is None:
+                        stats = pstats.Stats(src)
+                    else:
+                        stats.add(src)
+                except (TypeError, EOFError, OSError):
+                    continue  # profil vide ou fichier en cours d'écriture
+            if stats is None:
+                continue
+            stats.dump_stats(os.path.join(self.outdir, f"{stage}.prof"))
+            with open(os.path.join(self.outdir, f"{stage}.txt"), "w", encoding="utf-8") as f:
+                f.write(summary(stats, stage))
+
+def focus_times(stats: pstats.Stats) -> dict:
+    """Temps cumulé (s) et nb d'appels des fonctions de FOCUS présentes dans le profil."""
+    out = {}
+    for (filename, _, func), (_, ncalls, _, cumtime, _) in stats.stats.items():
+        for label, part, name in FOCUS:
+            if func == name and part in filename:
+                t, n = out.get(label, (0.0, 0))
+                out[label] = (t + cumtime, n + ncalls)
+    return out
+
+def summary(stats: pstats.Stats, stage: str, top: int = 40) -> str:
+    buf = io.StringIO()
+    # horloge murale : l'attente des lots (queue.get) et du pool (result) est comptée
+    buf.write(f"Étape {stage} : {stats.total_tt:.3f}s profilées (tous threads / processus de l'étape)\n\n")
+    focus = focus_times(stats)
+    if focus:
+        buf.write("Fonctions clés (temps cumulé) :\n")
+        for label, (t, n) in sorted(focus.items(), key=lambda kv: -kv[1][0]):
+            buf.write(f"  {label:<20} {t:>9.3f}s  {n:>8} appels\n")
+        buf.write("\n")
+    stats.stream = buf
+    stats.sort_stats("cumulative").print_stats(top)
+    return buf.getvalue()
+
+def from_argv(argv=None) -> Profiler|None:
+    """
+    --profile[=DIR] : cProfile par étape ; --profile-sample[=HZ] : échantillonnage.
+    Sans option : PROFILE_SAMPLE_HZ (production) ; dossier : PROFILE_DIR (défaut profiles/).
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    outdir = os.environ.get("PROFILE_DIR", DEFAULT_DIR)
+    mode, hz = None, float(os.environ.get("PROFILE_SAMPLE_HZ") or 0)
+    if hz:
+        mode = "sample"
+    for arg in argv:
+        name, _, value = arg.partition("=")
+        if name == "--profile":
+            mode, outdir = "cprofile", value or outdir
+        elif name == "--profile-sample":
+            mode, hz = "sample", float(value or DEFAULT_HZ)
+    if mode is None:
+        return None
+    return Profiler(outdir, mode=mode, hz=hz or DEFAULT_HZ)
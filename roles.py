@@ -0,0 +1,62 @@
+# roles.py
+# Attribution de fonctions (président, ministre, PDG, gouverneur...) aux personnes
+# détectées par spaCy, en un seul passage :
+#   1. les mots-clés de fonction sont localisés par un automate (topics.KeywordAutomaton)
+#   2. chaque fonction est rattachée à la PERSON la plus proche (offsets spaCy),
+#      dans la même phrase et à moins de MAX_GAP caractères
+# Coût linéaire en taille de texte (+ log du nombre d'entités), au lieu de deux
+# regex par personne sur tout le texte.
+from bisect import bisect_left, bisect_right
+
+from topics import KeywordAutomaton
+
+MAX_GAP = 80  # même fenêtre que l'ancien _extract_presidents
+
+ROLE_RULES = {
+    "president": ["président", "présidente", "president"],
+    "minister":  ["ministre", "premier ministre", "minister", "prime minister"],
+    "ceo":       ["PDG", "CEO", "directeur général", "directrice générale", "chief executive"],
+    "governor":  ["gouverneur", "gouverneure", "governor"],
+}
+
+_AUTOMATON = KeywordAutomaton((k, role) for role, keys in ROLE_RULES.items() for k in keys)
+
+def _sentence_breaks(text: str) -> list[int]:
+    return [i for i, c in enumerate(text) if c in ".!?\n"]
+
+def _crosses(breaks: list[int], a: int, b: int) -> bool:
+    # une fin de phrase entre a et b ?
+    return bisect_left(breaks, a) < bisect_left(breaks, b)
+
+def extract_roles(text: str, ents) -> dict[str, list[str]]:
+    """
+    text : texte passé au NER ; ents : [(texte, label, début, fin), ...] (cf. ner_entities).
+    Retourne {role: [personnes...]} (ordre d'apparition, sans doublon).
+    """
+    persons = sorted((s, e, t) for t, label, s, e in ents or [] if label in ("PERSON", "PER"))
+    if not text or not persons:
+        return {}
+    starts = [p[0] for p in persons]
+    breaks = _sentence_breaks(text)
+    out = {}
+    for r_start, r_end, role in _AUTOMATON.finditer(text):
+        best, best_gap = None, MAX_GAP + 1
+        # personne qui suit ("le président Macron")
+        i = bisect_left(starts, r_end)
+        if i < len(persons):
+            s, e, name = persons[i]
+            gap = s - r_end
+            if gap <= MAX_GAP and not _crosses(breaks, r_end, s):
+                best, best_gap = name, gap
+        # personne qui précède ("Macron, président de la République")
+        j = bisect_right(starts, r_start) - 1
+        if j >= 0:
+            s, e, name = persons[j]
+            gap = r_start - e
+            if 0 <= gap < best_gap and not _crosses(breaks, e, r_start):
+                best = name
+        if best:
+            names = out.setdefault(role, [])
+            if best.casefold() not in (n.casefold() for n in names):
+                names.append(best)
+    return out
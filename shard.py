@@ -0,0 +1,165 @@
+# shard.py
+# Démon réparti (option --shard avec --daemon) : plusieurs nœuds pointés sur la même base
+# (MariaDB) se partagent les flux par site éditeur.
+#   - chaque nœud s'inscrit dans la table nodes (migration 11) et y bat toutes les
+#     HEARTBEAT_S secondes ; un nœud sans battement depuis TTL_S est considéré comme parti
+#   - anneau de hachage cohérent (VNODES points par nœud) sur les nœuds vivants : un site
+#     (bbc.co.uk, lemonde.fr...) appartient à un seul nœud, donc la politesse par domaine
+#     (délai entre deux téléchargements, ingest.Ingest._throttle) reste respectée, et
+#     l'arrivée / le départ d'un nœud ne déplace qu'environ 1/N des sites
+#   - rééquilibrage automatique : l'anneau est relu à chaque battement ; un flux gagné
+#     reprend l'état laissé dans feed_state par son ancien propriétaire (ETag, planning)
+#   - un nœud qui n'arrive plus à battre (base injoignable) cesse de revendiquer ses sites
+#     avant que les autres ne les reprennent
+#
+#   python V5mariaDB.py --daemon --shard     (sur chaque machine)
+#   python shard.py status --mariadb '{...}'
+import os, sys, time, socket, hashlib, argparse, threading
+from bisect import bisect
+from urllib.parse import urlparse
+
+from metrics import METRICS
+from jobqueue import worker_id, add_store_args, store_from_args
+
+HEARTBEAT_S = 15
+TTL_S = 60              # sans battement depuis TTL_S : nœud parti, ses sites sont redistribués
+PRUNE_S = 7 * 86400     # lignes de nœuds morts supprimées au démarrage d'un nœud
+VNODES = 128            # points par nœud sur l'anneau (répartition plus régulière)
+
+# hôtes d'un même éditeur : même clé de partage (flux feeds.bbci.co.uk, articles bbc.co.uk)
+SITE_ALIASES = {"bbci.co.uk": "bbc.co.uk", "bbc.com": "bbc.co.uk", "dj.com": "wsj.com"}
+_SECOND_LEVEL = {"co", "com", "org", "net", "gov", "ac", "gouv"}
+
+def site_of(url: str) -> str:
+    """Clé de partage d'une URL : domaine enregistrable approché (feeds.bbci.co.uk -> bbc.co.uk)."""
+    host = (urlparse(url).hostname or url).lower()
+    labels = host.split(".")
+    n = 3 if len(labels) >= 3 and labels[-2] in _SECOND_LEVEL else 2
+    site = ".".join(labels[-n:])
+    return SITE_ALIASES.get(site, site)
+
+def _hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+class HashRing:
+    """Anneau de hachage cohérent : owner(clé) -> nœud."""
+
+    def __init__(self, nodes, vnodes: int = VNODES):
+        self.nodes = sorted(nodes)
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key: str) -> str|None:
+        if not self._hashes:
+            return None
+        return self._owners[bisect(self._hashes, _hash(key)) % len(self._hashes)]
+
+class Cluster:
+    """
+    cluster = Cluster(store).join() ; cluster.owns(site) ; cluster.leave().
+    Membres et anneau relus à chaque battement (thread "shard-heartbeat").
+    """
+
+    def __init__(self, store, node: str|None = None, heartbeat_s: float = HEARTBEAT_S, ttl_s: float = TTL_S,
+                 vnodes: int = VNODES):
+        self.store = store
+        self.node = node or worker_id()
+        self.heartbeat_s = heartbeat_s
+        self.ttl_s = ttl_s
+        self.vnodes = vnodes
+        self.feeds = 0                  # nb de flux possédés, affiché par `shard.py status`
+        self.ring = HashRing([self.node], vnodes)
+        self._last_ok = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def join(self):
+        p, now = self.store.ph, time.time()
+        with self.store.backend.connection() as con:
+            cur = con.cursor()
+            cur.execute(f"DELETE FROM nodes WHERE heartbeat < {p}", (now - PRUNE_S,))
+            cur.execute(f"REPLACE INTO nodes (node, host, pid, started_at, heartbeat, feeds) "
+                        f"VALUES ({p},{p},{p},{p},{p},0)",
+                        (self.node, socket.gethostname(), os.getpid(), now, now))
+        self._last_ok = now
+        self.refresh()
+        self._thread = threading.Thread(target=self._loop, name="shard-heartbeat", daemon=True)
+        self._thread.start()
+        return self
+
+    def leave(self):
+        """Départ propre : les autres nœuds reprennent nos sites dès leur prochain battement."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        with self.store.backend.connection() as con:
+            con.cursor().execute(f"DELETE FROM nodes WHERE node={self.store.ph}", (self.node,))
+        print(f"Shard : nœud {self.node} parti")
+
+    def _loop(self):
+        while not self._stop.wait(self.heartbeat_s):
+            try:
+                self.beat()
+            except Exception as e:
+                print(f"Shard : battement en échec ({e})")
+
+    def beat(self):
+        p, now = self.store.ph, time.time()
+        with self.store.backend.connection() as con:
+            cur = con.cursor()
+            cur.execute(f"UPDATE nodes SET heartbeat={p}, feeds={p} WHERE node={p}", (now, self.feeds, self.node))
+            if not cur.rowcount:  # ligne supprimée (nœud jugé mort pendant une coupure) : réinscription
+                cur.execute(f"REPLACE INTO nodes (node, host, pid, started_at, heartbeat, feeds) "
+                            f"VALUES ({p},{p},{p},{p},{p},{p})",
+                            (self.node, socket.gethostname(), os.getpid(), now, now, self.feeds))
+        self._last_ok = now
+        self.refresh()
+
+    def members(self) -> list[str]:
+        with self.store.backend.connection() as con:
+            cur = con.cursor()
+            cur.execute(f"SELECT node FROM nodes WHERE heartbeat >= {self.store.ph} ORDER BY node",
+                        (time.time() - self.ttl_s,))
+            return [row[0] for row in cur.fetchall()]
+
+    def refresh(self):
+        """Relit les nœuds vivants ; nouvel anneau si l'effectif a changé."""
+        members = sorted(set(self.members()) | {self.node})
+        if members != self.ring.nodes:
+            before = len(self.ring.nodes)
+            self.ring = HashRing(members, self.vnodes)
+            METRICS.inc("shard_rebalances_total")
+            print(f"Shard : {len(members)} nœud(s) actif(s) (avant : {before}), sites redistribués")
+
+    def owns(self, site: str) -> bool:
+        # sans battement réussi depuis TTL_S, les autres nœuds nous croient partis
+        if time.time() - self._last_ok > self.ttl_s:
+            return False
+        return self.ring.owner(site) == self.node
+
+def from_argv(store, argv=None) -> Cluster|None:
+    """--shard : ce démon ne traite que les sites qui lui reviennent sur l'anneau."""
+    argv = sys.argv[1:] if argv is None else argv
+    return Cluster(store) if "--shard" in argv else None
+
+def main():
+    ap = argparse.ArgumentParser(description="Nœuds du démon réparti (table nodes)")
+    ap.add_argument("cmd", choices=["status"])
+    add_store_args(ap)
+    args = ap.parse_args()
+    store = store_from_args(args)
+    store.ensure_schema()
+    now = time.time()
+    with store.backend.connection() as con:
+        cur = con.cursor()
+        cur.execute("SELECT node, host, started_at, heartbeat, feeds FROM nodes ORDER BY node")
+        rows = cur.fetchall()
+    for node, host, started, beat, feeds in rows:
+        state = "actif" if now - beat <= TTL_S else "parti"
+        print(f"{node:<40} {state:<6} {feeds:>5} flux  battement il y a {now - beat:>6.0f} s  "
+              f"démarré il y a {(now - (started or now)) / 3600:.1f} h")
+    store.backend.close()
+
+if __name__ == "__main__":
+    main()
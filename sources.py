@@ -0,0 +1,428 @@
+# sources.py
+# Producteurs du pipeline (pipeline.py) et fonctions de récupération partagées
+# par les scripts d'ingestion (auparavant copiées dans v3 / TestV4 / V5mariaDB /
+# BarthelemySitemaps) :
+#   - rss_producer(url)         : entrées d'un flux RSS/Atom (feedparser)
+#   - sitemap_producer(config)  : URLs d'articles d'un sitemap (index, news)
+#   - gdelt_producer(filters)   : résultats GDELT DOC (gdeltdoc, sinon API JSON directe)
+#   - http_get / page_metadata / fulltext_from_html / extract_batch : étapes fetch + extract
+#     (HTTP via TRANSPORT : réseau, ou cassette enregistrée / rejouée, cf. cassette.py)
+# Un producteur est un générateur de lignes "articles" (dict source/title/date/link/summary/...).
+import re, gzip, json, time
+from datetime import datetime, UTC, timedelta
+from functools import partial
+import xml.etree.ElementTree as ET
+import urllib.request, urllib.error
+from urllib.parse import urlencode
+
+try:
+    import feedparser
+except Exception:
+    feedparser = None
+
+try:
+    import requests
+except Exception:
+    requests = None
+
+try:
+    import trafilatura
+except Exception:
+    trafilatura = None
+
+try:
+    from gdeltdoc import GdeltDoc, Filters
+except Exception:
+    GdeltDoc = Filters = None
+
+try:
+    from bs4 import BeautifulSoup
+except Exception:
+    BeautifulSoup = None
+
+PARSER = "lxml"
+try:
+    import lxml  # noqa
+except Exception:
+    PARSER = "html.parser"
+
+from metrics import METRICS
+from storage import publisher_meta
+
+# ---------- HTTP ----------
+FEED_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Python/feedparser"
+BROWSER_USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                      "(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
+HEADERS = {"User-Agent": FEED_USER_AGENT}
+if feedparser is not None:
+    feedparser.USER_AGENT = FEED_USER_AGENT
+
+def now_iso() -> str:
+    return datetime.now(UTC).isoformat(timespec="seconds")
+
+class HTTPError(IOError):
+    def __init__(self, url: str, status: int):
+        super().__init__(f"HTTP {status} pour {url}")
+        self.url, self.status = url, status
+
+def live_transport(url: str, timeout: float, headers: dict) -> tuple[int, dict, bytes]:
+    """(statut, en-têtes en minuscules, corps) ; requests si installé, sinon urllib. Exception si erreur réseau."""
+    if requests is not None:
+        r = requests.get(url, headers=headers, timeout=timeout)
+        return r.status_code, {k.lower(): v for k, v in r.headers.items()}, r.content
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout) as r:
+            return r.status, {k.lower(): v for k, v in r.headers.items()}, r.read()
+    except urllib.error.HTTPError as e:  # 304, 4xx, 5xx : réponse quand même
+        return e.code, {k.lower(): v for k, v in e.headers.items()}, e.read()
+
+# tout le HTTP des producteurs et de l'étape fetch passe par TRANSPORT
+# (remplacé par cassette.Cassette : enregistrement / rejeu hors ligne)
+TRANSPORT = live_transport
+
+def http_request(url: str, timeout: float = 20, headers: dict|None = None) -> tuple[int, dict, bytes]:
+    return TRANSPORT(url, timeout, headers or HEADERS)
+
+def http_get(url: str, timeout: float = 20, headers: dict|None = None) -> bytes:
+    """Corps de la réponse (exception si erreur HTTP/réseau)."""
+    status, _, body = http_request(url, timeout, headers)
+    if status >= 400:
+        raise HTTPError(url, status)
+    return body
+
+def offline() -> bool:
+    """Rejeu de cassette : pas de réseau, donc pas de délai de politesse."""
+    return getattr(TRANSPORT, "offline", False)
+
+def _note_root(kind: str, **args):
+    # producteur noté dans la cassette en cours d'enregistrement (rejeu : cassette.producers)
+    note = getattr(TRANSPORT, "note_root", None)
+    if note:
+        note(kind, **args)
+
+def domain_of(link: str) -> str:
+    """Domaine éditeur d'un lien (étiquette des métriques par domaine)."""
+    return publisher_meta(link)[0] or "?"
+
+def decode_html(body: bytes) -> str:
+    m = re.search(rb'<meta[^>]+charset=["\']?([\w-]+)', body[:4096], re.I)
+    try:
+        return body.decode(m.group(1).decode() if m else "utf-8", errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+# ---------- RSS ----------
+def parse_feed(url: str, etag: str|None = None, modified: str|None = None):
+    """Essaie feedparser; si vide/bozo, retente via HTTP avec UA. etag/modified : GET conditionnel (304)."""
+    if feedparser is None:
+        raise RuntimeError("feedparser n'est pas installé (pip install feedparser)")
+    if TRANSPORT is live_transport:
+        f = feedparser.parse(url, etag=etag, modified=modified)
+    else:
+        f = _parse_feed_via_transport(url, etag, modified)
+    if f.get("status") == 304:
+        return f
+    if len(f.entries) == 0 or getattr(f, "bozo", 0):
+        try:
+            f = feedparser.parse(http_get(url, timeout=15))
+        except Exception:
+            pass
+    return f
+
+def _parse_feed_via_transport(url: str, etag: str|None, modified: str|None):
+    """feedparser.parse(url) sans le client HTTP de feedparser : requête via TRANSPORT (cassette)."""
+    headers = dict(HEADERS)
+    if etag:
+        headers["If-None-Match"] = etag
+    if modified:
+        headers["If-Modified-Since"] = modified
+    try:
+        status, resp, body = http_request(url, 15, headers)
+    except Exception as e:  # comme feedparser : pas d'exception, flux vide marqué bozo
+        return feedparser.FeedParserDict(bozo=1, bozo_exception=e, entries=[], feed={})
+    if status == 304 or status >= 400:
+        return feedparser.FeedParserDict(status=status, bozo=int(status >= 400), entries=[], feed={},
+                                         etag=etag, modified=modified)
+    f = feedparser.parse(body, response_headers=resp)
+    f["status"], f["href"] = status, url
+    f["etag"], f["modified"] = resp.get("etag"), resp.get("last-modified")
+    return f
+
+def feed_rows(f, url: str, source_type: str = "rss") -> list[dict]:
+    source_name = f.feed.get("title", url)
+    rows = []
+    for entry in f.entries:
+        row = {
+            "source": source_name,
+            "title": entry.get("title", "") or "",
+            "date": entry.get("published", entry.get("updated", "")) or "",
+            "link": entry.get("link", "") or "",
+            "summary": entry.get("summary", entry.get("description", "")) or "",
+            "fetched_at": now_iso(),
+            "source_type": source_type,
+        }
+        if row["link"]:
+            rows.append(row)
+    return rows
+
+def rss_producer(url: str, source_type: str = "rss", state: dict|None = None):
+    """
+    state (mode démon) : {"etag", "modified"} du passage précédent, mis à jour avec
+    ceux de la réponse et le titre du flux ("source") ; flux inchangé (304) -> rien.
+    """
+    state = state if state is not None else {}
+    _note_root("rss", url=url, source_type=source_type)
+    with METRICS.timer("feed_parse_ms", feed=url, kind="rss"):
+        f = parse_feed(url, state.get("etag"), state.get("modified"))
+    if f.get("status") == 304:
+        METRICS.inc("feed_polls_total", feed=url, status="304")
+        return
+    state.update(etag=f.get("etag"), modified=f.get("modified"), source=f.feed.get("title", url))
+    rows = feed_rows(f, url, source_type)
+    METRICS.inc("feed_polls_total", feed=url, status="200" if rows else "empty")
+    METRICS.inc("feed_entries_total", len(rows), feed=url)
+    yield from rows
+
+# ---------- Sitemaps ----------
+SM = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+NEWS = "{http://www.google.com/schemas/sitemap-news/0.9}"
+
+def fetch_sitemap(url: str):
+    """Récupère et parse un sitemap XML (None si échec)."""
+    try:
+        body = http_get(url, timeout=30, headers={"User-Agent": BROWSER_USER_AGENT})
+        if body[:2] == b"\x1f\x8b":  # sitemap.xml.gz servi tel quel (sans Content-Encoding)
+            body = gzip.decompress(body)
+        return ET.fromstring(body)
+    except Exception as e:
+        METRICS.inc("feed_polls_total", feed=url, status="error")
+        print(f"Erreur lors de la récupération du sitemap {url}: {e}")
+        return None
+
+def parse_sitemap_index(root) -> list[str]:
+    """URLs des sous-sitemaps d'un sitemap index."""
+    return [loc.text for loc in root.findall(f".//{SM}sitemap/{SM}loc") if loc.text]
+
+def _parse_date(text: str):
+    if "T" in text:
+        return datetime.fromisoformat(text.replace("Z", "+00:00"))
+    return datetime.strptime(text, "%Y-%m-%d").replace(tzinfo=UTC)
+
+def parse_sitemap_urls(root, max_age_days: int = None) -> list[str]:
+    """URLs d'un sitemap (standard + news), filtrées par date (publication news, sinon lastmod)."""
+    cutoff_date = datetime.now(UTC) - timedelta(days=max_age_days) if max_age_days else None
+    urls = []
+    for url_el in root.findall(f".//{SM}url"):
+        loc_el = url_el.find(f"{SM}loc")
+        if loc_el is None or not (loc_el.text and loc_el.text.strip()):
+            continue
+        if cutoff_date:
+            lastmod_el = url_el.find(f"{SM}lastmod")
+            pub_el = url_el.find(f"{NEWS}news/{NEWS}publication_date")
+            date_text = ((pub_el.text if pub_el is not None else None)
+                         or (lastmod_el.text if lastmod_el is not None else None) or "").strip()
+            if date_text:
+                try:
+                    if _parse_date(date_text) < cutoff_date:
+                        continue
+                except Exception:
+                    pass  # format inconnu -> on ne filtre pas
+        urls.append(loc_el.text.strip())
+    return urls
+
+NEWS_INDICATORS = [
+    '/news/', '/article/', '/articles/', '/actualite/', '/actualites/',
+    '/politique/', '/economie/', '/international/', '/monde/',
+    '/business/', '/finance/', '/tech/', '/technology/',
+    '/sport/', '/culture/', '/societe/'
+]
+DATE_PATTERNS = [re.compile(p) for p in (r'/\d{4}/\d{2}/\d{2}/', r'/\d{4}-\d{2}-\d{2}/', r'/\d{4}/\d{2}/')]
+
+def is_news_url(url: str, domain: str = "") -> bool:
+    """Heuristiques pour identifier si une URL est un article de news."""
+    url_lower = url.lower()
+    if any(indicator in url_lower for indicator in NEWS_INDICATORS):
+        return True
+    return any(p.search(url) for p in DATE_PATTERNS)
+
+def sitemap_urls(config: dict) -> list[str]:
+    """URLs d'articles d'un sitemap (index : 5 premiers sous-sitemaps), dans l'ordre, sans doublon."""
+    root = fetch_sitemap(config["url"])
+    if root is None:
+        return []
+    sitemaps = parse_sitemap_index(root)
+    if sitemaps:
+        all_urls = []
+        for sitemap_url in sitemaps[:5]:  # Limiter pour éviter la surcharge
+            time.sleep(0 if offline() else config.get("delay", 0))
+            sub_root = fetch_sitemap(sitemap_url)
+            if sub_root is not None:
+                all_urls += parse_sitemap_urls(sub_root, config.get("max_age_days"))
+    else:
+        all_urls = parse_sitemap_urls(root, config.get("max_age_days"))
+    return list(dict.fromkeys(u for u in all_urls if is_news_url(u, config["domain"])))
+
+def sitemap_producer(config: dict):
+    """
+    config : {"url", "domain", "max_age_days", "delay", "limit"} (cf. SITEMAP_CONFIGS).
+    Lignes sans titre : l'étape fetch télécharge la page, extract en tire titre/description/date.
+    """
+    _note_root("sitemap", config=config)
+    with METRICS.timer("feed_parse_ms", feed=config["url"], kind="sitemap"):
+        urls = sitemap_urls(config)[:config.get("limit", 100)]
+    METRICS.inc("feed_polls_total", feed=config["url"], status="200" if urls else "empty")
+    METRICS.inc("feed_entries_total", len(urls), feed=config["url"])
+    for url in urls:
+        yield {
+            "source": f"sitemap-{config['domain']}",
+            "title": "",
+            "date": "",
+            "link": url,
+            "summary": "",
+            "fetched_at": now_iso(),
+            "source_type": "sitemap",
+            "_delay": config.get("delay", 0),  # politesse par domaine (étape fetch)
+        }
+
+# ---------- GDELT ----------
+GDELT_DOC_URL = "https://api.gdeltproject.org/api/v2/doc/doc"
+
+def _gdelt_query(kw: dict) -> str:
+    terms = kw.get("keyword") or ""
+    if isinstance(terms, (list, tuple)):
+        terms = "(" + " OR ".join(f'"{t}"' if " " in t else t for t in terms) + ")"
+    for key, op in (("domain", "domain"), ("country", "sourcecountry"), ("language", "sourcelang")):
+        vals = kw.get(key)
+        if vals:
+            vals = [vals] if isinstance(vals, str) else list(vals)
+            terms += " " + (f"{op}:{vals[0]}" if len(vals) == 1 else "(" + " OR ".join(f"{op}:{v}" for v in vals) + ")")
+    return terms.strip()
+
+def gdelt_search(kw: dict, endpoint: str = GDELT_DOC_URL) -> list[dict]:
+    """
+    Requête directe à l'API DOC (mode artlist, JSON) pour des kwargs de type gdeltdoc.Filters
+    (keyword, domain, country, language, start_date, end_date, num_records).
+    """
+    params = {"query": _gdelt_query(kw), "mode": "artlist", "format": "json",
+              "maxrecords": kw.get("num_records", 250)}
+    for key, name in (("start_date", "startdatetime"), ("end_date", "enddatetime")):
+        if kw.get(key):
+            params[name] = str(kw[key]).replace("-", "")[:8].ljust(14, "0")
+    body = http_get(f"{endpoint}?{urlencode(params)}", timeout=30)
+    return json.loads(body or b"{}").get("articles", []) if body.strip() else []
+
+def gdelt_producer(filters: list[dict], endpoint: str|None = None, pause: float = 1.0):
+    """
+    filters : kwargs de gdeltdoc.Filters, une requête par fenêtre (250 résultats max chacune).
+    gdeltdoc si installé ; sinon, ou avec `endpoint` (banc d'essai local), appel direct de l'API.
+    """
+    _note_root("gdelt", filters=filters, endpoint=endpoint)
+    # gdeltdoc a son propre client HTTP : API directe quand une cassette est active
+    if GdeltDoc is not None and endpoint is None and TRANSPORT is live_transport:
+        gd = GdeltDoc()
+        search = lambda kw: gd.article_search(Filters(**kw)).to_dict("records")
+    else:
+        search = partial(gdelt_search, endpoint=endpoint or GDELT_DOC_URL)
+    for i, kw in enumerate(filters):
+        if i:
+            time.sleep(0 if offline() else pause)  # l'API DOC limite le débit
+        try:
+            with METRICS.timer("feed_parse_ms", feed="gdelt", kind="gdelt"):
+                records = search(kw)
+        except Exception as e:
+            METRICS.inc("feed_polls_total", feed="gdelt", status="error")
+            print(f"Erreur GDELT {kw.get('start_date')} -> {kw.get('end_date')}: {e}")
+            continue
+        METRICS.inc("feed_polls_total", feed="gdelt", status="200")
+        METRICS.inc("feed_entries_total", len(records), feed="gdelt")
+        for rec in records:
+            if not rec.get("url"):
+                continue
+            yield {
+                "source": rec.get("domain") or "gdelt",
+                "title": rec.get("title") or "",
+                "date": str(rec.get("seendate") or ""),
+                "link": rec["url"],
+                "summary": "",
+                "fetched_at": now_iso(),
+                "source_type": "gdelt",
+            }
+
+# ---------- Extraction (CPU, picklable pour le pool de processus) ----------
+TITLE_SUFFIXES = [' - Le Monde', ' - BBC News', ' - Les Echos']
+_TITLE_RE = re.compile(r'<title[^>]*>(.*?)</title>', re.I | re.S)
+_META_RES = {
+    name: re.compile(rf'<meta[^>]*{attr}=["\']{name}["\'][^>]*content=["\']([^"\']*)["\']', re.I)
+    for attr, name in (("property", "og:description"), ("name", "twitter:description"),
+                       ("name", "description"), ("property", "article:published_time"))
+}
+
+def page_metadata(content: str) -> dict:
+    """Titre / description (Open Graph, Twitter, meta) / date de publication d'une page."""
+    title = ""
+    m = _TITLE_RE.search(content)
+    if m:
+        title = re.sub(r'<[^>]+>', '', m.group(1)).strip()
+        for suffix in TITLE_SUFFIXES:
+            if title.endswith(suffix):
+                title = title[:-len(suffix)]
+    description = ""
+    for name in ("og:description", "twitter:description", "description"):
+        m = _META_RES[name].search(content)
+        if m:
+            description = m.group(1)
+            break
+    m = _META_RES["article:published_time"].search(content)
+    return {"title": title, "description": description, "date": m.group(1) if m else ""}
+
+def fulltext_from_html(content: str) -> str|None:
+    # 1) Trafilatura (meilleur taux de réussite)
+    if trafilatura:
+        try:
+            text = trafilatura.extract(content, include_comments=False, include_tables=False, no_fallback=False)
+            if text and text.strip():
+                return text.strip()
+        except Exception:
+            pass
+    # 2) Fallback simple (BeautifulSoup, paragraphes)
+    if BeautifulSoup is None:
+        return None
+    soup = BeautifulSoup(content, PARSER)
+    for tag in soup(["script", "style", "nav", "header", "footer", "aside", "form", "noscript", "figure"]):
+        tag.decompose()
+    paras = [p.get_text(" ", strip=True) for p in soup.find_all("p")]
+    text = "\n\n".join(p for p in paras if p)
+    return text.strip() if text else None
+
+def extract_batch(items, fulltext: bool = True) -> list[dict]:
+    """
+    Étape extract : "_html" -> métadonnées (lignes sitemap sans titre) + "content" (plein texte).
+    Les lignes restées sans titre sont abandonnées. Durée par page dans "_extract_ms".
+    """
+    out = []
+    for item in items:
+        content = item.pop("_html", None)
+        if content:
+            t0 = time.perf_counter()
+            if not item.get("title"):
+                meta = page_metadata(content)
+                item["title"] = meta["title"]
+                item["summary"] = item.get("summary") or meta["description"]
+                item["date"] = item.get("date") or meta["date"] or now_iso()
+            if fulltext:
+                text = fulltext_from_html(content)
+                if text:
+                    item["content"] = text
+                    item["content_fetched_at"] = now_iso()
+            # relevé par le process parent (record_extract) : extract peut tourner dans un pool
+            item["_extract_ms"] = (time.perf_counter() - t0) * 1000
+        if item.get("title"):
+            out.append(item)
+    return out
+
+def record_extract(items):
+    """Durées d'extraction posées par extract_batch -> histogramme extract_ms par domaine."""
+    for item in items:
+        ms = item.pop("_extract_ms", None)
+        if ms is not None:
+            METRICS.observe("extract_ms", ms, domain=domain_of(item["link"]))
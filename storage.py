@@ -0,0 +1,407 @@
+# storage.py
+# Couche de persistance unique pour les scripts d'ingestion.
+#   - SQLiteBackend  : news.db / NewsSitemaps.db (sqlite3)
+#   - MariaDBBackend : base "news" (pymysql), pool de connexions avec pre-ping
+#   - AsyncArticleStore : variante asyncio (aiomysql si dispo, sinon thread)
+# Les méthodes sont "batch d'abord" (insert_many, update_many) ; les versions
+# unitaires (insert_article_return_id, ...) ne sont que des raccourcis.
+import os, sqlite3, threading, asyncio
+from contextlib import contextmanager
+from functools import wraps
+from urllib.parse import urlparse, quote_plus
+
+from metrics import METRICS
+from migrations import run_migrations, NEWS_MIGRATIONS
+from urlcanon import url_key
+
+try:
+    from sqlalchemy import create_engine
+except Exception:
+    create_engine = None
+
+try:
+    import aiomysql
+except Exception:
+    aiomysql = None
+
+# nb max de paramètres par requête "IN (...)" (limite SQLite historique : 999)
+IN_CHUNK = 500
+
+# ---------- Métadonnées éditeur ----------
+TLD_TO_COUNTRY = {
+    ".fr":"FR",".de":"DE",".es":"ES",".it":"IT",".be":"BE",".dk":"DK",
+    ".co.uk":"GB",".uk":"GB",".com":"", ".org":"", ".net":""
+}
+DOMAIN_COUNTRY_OVERRIDE = {
+    "lemonde.fr":"FR","lesechos.fr":"FR","bbc.co.uk":"GB","bbc.com":"GB"
+}
+
+def publisher_meta(link: str):
+    dom = (urlparse(link).netloc or "").lower()
+    if dom.startswith("www."): dom = dom[4:]
+    if dom in DOMAIN_COUNTRY_OVERRIDE:
+        return dom, DOMAIN_COUNTRY_OVERRIDE[dom]
+    for tld, cc in TLD_TO_COUNTRY.items():
+        if dom.endswith(tld):
+            return dom, cc
+    return dom, ""
+
+# ---------- Backends ----------
+def create_pooled_engine(url: str, pool_size: int = 5, max_overflow: int = 10):
+    """Engine SQLAlchemy avec pool dimensionné + pre-ping (connexions mortes remplacées)."""
+    if create_engine is None:
+        raise RuntimeError("sqlalchemy n'est pas installé (pip install sqlalchemy)")
+    if url.startswith("sqlite"):
+        return create_engine(url, future=True, pool_pre_ping=True)
+    return create_engine(url, future=True, pool_pre_ping=True,
+                         pool_size=pool_size, max_overflow=max_overflow,
+                         pool_recycle=3600)
+
+class SQLiteBackend:
+    dialect = "sqlite"
+    ph = "?"
+    insert_ignore = "INSERT OR IGNORE"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()  # une connexion par thread
+
+    def _conn(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")  # lecteurs non bloqués par l'écrivain
+            self._local.con = con
+        return con
+
+    @contextmanager
+    def connection(self):
+        con = self._conn()
+        try:
+            yield con
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+
+    def close(self):
+        con = getattr(self._local, "con", None)
+        if con is not None:
+            con.close()
+            self._local.con = None
+
+class MariaDBBackend:
+    dialect = "mysql"
+    ph = "%s"
+    insert_ignore = "INSERT IGNORE"
+
+    def __init__(self, params: dict, pool_size: int = 5, max_overflow: int = 10):
+        """`params` : même dict que MDB dans V5mariaDB.py (host, user, password, database...)."""
+        self.params = params
+        url = (f"mysql+pymysql://{params['user']}:{quote_plus(params['password'])}"
+               f"@{params['host']}:{params.get('port', 3306)}/{params['database']}"
+               f"?charset={params.get('charset', 'utf8mb4')}")
+        self.engine = create_pooled_engine(url, pool_size, max_overflow)
+
+    @contextmanager
+    def connection(self):
+        # connexion DBAPI (pymysql) empruntée au pool ; close() la rend au pool
+        con = self.engine.raw_connection()
+        try:
+            yield con
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            con.close()
+
+    def close(self):
+        self.engine.dispose()
+
+# ---------- Repository ----------
+def _measured(fn):
+    """Durée (db_ms) et nb de lignes (db_rows_total) d'une opération en lot, étiquetées par méthode."""
+    op = fn.__name__
+
+    @wraps(fn)
+    def wrapper(self, rows, *args, **kwargs):
+        if not rows:
+            return fn(self, rows, *args, **kwargs)
+        with METRICS.timer("db_ms", op=op):
+            out = fn(self, rows, *args, **kwargs)
+        METRICS.inc("db_rows_total", len(rows), op=op)
+        return out
+    return wrapper
+
+ARTICLE_INSERT_COLS = ["source", "title", "date", "link", "url_hash", "summary", "fetched_at", "source_type"]
+
+class ArticleStore:
+    """Accès aux tables articles / entities / article_topics, indépendant du backend."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.ph = backend.ph
+
+    def ensure_schema(self):
+        with self.backend.connection() as con:
+            return run_migrations(con, NEWS_MIGRATIONS, self.backend.dialect)
+
+    def key(self, link: str):
+        """Clé de dédup du lien (INTEGER 64 bits en SQLite, BINARY(16) en MariaDB)."""
+        return url_key(link, self.backend.dialect)
+
+    def _ids_for_keys(self, cur, keys):
+        found = {}
+        keys = list(dict.fromkeys(keys))
+        for i in range(0, len(keys), IN_CHUNK):
+            chunk = keys[i:i + IN_CHUNK]
+            marks = ",".join([self.ph] * len(chunk))
+            cur.execute(f"SELECT id, url_hash FROM articles WHERE url_hash IN ({marks})", chunk)
+            found.update({k: id_ for id_, k in cur.fetchall()})
+        return found
+
+    def _prepare(self, rows):
+        """Calcule url_hash (URL canonique) ; le lien d'origine est gardé. Ignore les lignes sans lien."""
+        out = []
+        for r in rows:
+            if not r.get("link"):
+                continue
+            r["link"] = r["link"].strip()
+            r["url_hash"] = url_key(r["link"], self.backend.dialect)
+            out.append(r)
+        return out
+
+    def _insert_sql(self):
+        cols = ", ".join(ARTICLE_INSERT_COLS)
+        marks = ", ".join([self.ph] * len(ARTICLE_INSERT_COLS))
+        return f"{self.backend.insert_ignore} INTO articles ({cols}) VALUES ({marks})"
+
+    @staticmethod
+    def _insert_values(rows):
+        return [tuple(r.get(c, "rss" if c == "source_type" else None) for c in ARTICLE_INSERT_COLS)
+                for r in rows]
+
+    @staticmethod
+    def _merge_ids(rows, before, after):
+        out, seen = [], set()
+        for r in rows:
+            k = r["url_hash"]
+            if k in before:
+                out.append((before[k], False))
+            else:
+                out.append((after.get(k), k not in seen))
+            seen.add(k)
+        return out
+
+    @_measured
+    def insert_many(self, rows):
+        """
+        INSERT OR IGNORE d'un lot d'articles, dédupliqué sur l'URL canonique (url_hash).
+        Le lien stocké reste celui d'origine (c'est lui qui est téléchargé).
+        Retourne [(id, nouveau?)] aligné sur les lignes ayant un lien.
+        """
+        rows = self._prepare(rows)
+        if not rows:
+            return []
+        with self.backend.connection() as con:
+            cur = con.cursor()
+            before = self._ids_for_keys(cur, [r["url_hash"] for r in rows])
+            cur.executemany(self._insert_sql(), self._insert_values(rows))
+            after = self._ids_for_keys(cur, [r["url_hash"] for r in rows if r["url_hash"] not in before])
+        return self._merge_ids(rows, before, after)
+
+    def insert_article_return_id(self, row):
+        res = self.insert_many([row])
+        return res[0][0] if res else None
+
+    @staticmethod
+    def _update_groups(updates):
+        groups = {}
+        for u in updates:
+            cols = tuple(sorted(k for k in u if k != "id"))
+            if u.get("id") and cols:
+                groups.setdefault(cols, []).append(tuple(u[c] for c in cols) + (u["id"],))
+        return groups
+
+    @_measured
+    def update_many(self, updates, table: str = "articles"):
+        """
+        `updates` : liste de dicts {"id": ..., colonne: valeur, ...}.
+        Regroupés par jeu de colonnes puis exécutés en executemany.
+        """
+        groups = self._update_groups(updates)
+        if not groups:
+            return 0
+        n = 0
+        with self.backend.connection() as con:
+            cur = con.cursor()
+            for cols, params in groups.items():
+                sets = ", ".join(f"{c}={self.ph}" for c in cols)
+                cur.executemany(f"UPDATE {table} SET {sets} WHERE id={self.ph}", params)
+                n += len(params)
+        return n
+
+    @_measured
+    def insert_entities(self, rows):
+        """rows : (article_id, text, label, start, end, canon_id) ; cf. EntityResolver.annotate."""
+        if not rows:
+            return
+        p = self.ph
+        end = '"end"' if self.backend.dialect == "sqlite" else "`end`"
+        with self.backend.connection() as con:
+            con.cursor().executemany(f"""
+                {self.backend.insert_ignore} INTO entities (article_id, text, label, start, {end}, canon_id)
+                VALUES ({p},{p},{p},{p},{p},{p})
+            """, rows)
+
+    @_measured
+    def insert_entity_sentiment(self, rows):
+        """rows : (article_id, entity, label, sentences, compound, pos, neu, neg, scorer, canon_id)."""
+        if not rows:
+            return
+        p = self.ph
+        with self.backend.connection() as con:
+            con.cursor().executemany(f"""
+                {self.backend.insert_ignore} INTO article_entity_sentiment
+                    (article_id, entity, label, sentences, compound, pos, neu, neg, scorer, canon_id)
+                VALUES ({p},{p},{p},{p},{p},{p},{p},{p},{p},{p})
+            """, rows)
+
+    @_measured
+    def insert_topics(self, rows):
+        """rows : (article_id, topic, score, source)."""
+        if not rows:
+            return
+        p = self.ph
+        with self.backend.connection() as con:
+            con.cursor().executemany(f"""
+                {self.backend.insert_ignore} INTO article_topics (article_id, topic, score, source)
+                VALUES ({p},{p},{p},{p})
+            """, rows)
+
+    @_measured
+    def copy_enrichment(self, pairs):
+        """
+        pairs : (article_id, canonical_id). Recopie entités, sentiment par entité et topics du canonique
+        (quasi-doublon, cf. neardup.py) et renseigne articles.duplicate_of.
+        """
+        if not pairs:
+            return
+        p = self.ph
+        end = '"end"' if self.backend.dialect == "sqlite" else "`end`"
+        with self.backend.connection() as con:
+            cur = con.cursor()
+            cur.executemany(f"""
+                {self.backend.insert_ignore} INTO entities (article_id, text, label, start, {end}, canon_id)
+                SELECT {p}, text, label, start, {end}, canon_id FROM entities WHERE article_id={p}
+            """, pairs)
+            cur.executemany(f"""
+                {self.backend.insert_ignore} INTO article_topics (article_id, topic, score, source)
+                SELECT {p}, topic, score, source FROM article_topics WHERE article_id={p}
+            """, pairs)
+            cur.executemany(f"""
+                {self.backend.insert_ignore} INTO article_entity_sentiment
+                    (article_id, entity, label, sentences, compound, pos, neu, neg, scorer, canon_id)
+                SELECT {p}, entity, label, sentences, compound, pos, neu, neg, scorer, canon_id
+                FROM article_entity_sentiment WHERE article_id={p}
+            """, pairs)
+            cur.executemany(f"UPDATE articles SET duplicate_of={p} WHERE id={p}",
+                            [(canon, aid) for aid, canon in pairs])
+
+    @_measured
+    def existing_links(self, links):
+        """Sous-ensemble de `links` déjà en base (comparaison sur l'URL canonique)."""
+        keys = {self.key(l): l for l in links if l}
+        with self.backend.connection() as con:
+            found = self._ids_for_keys(con.cursor(), list(keys))
+        return {keys[k] for k in found}
+
+def publisher_update(article_id: int, link: str, lang: str|None):
+    """Ligne pour update_many : publisher_domain/country (+ lang si détectée)."""
+    dom, cc = publisher_meta(link)
+    u = {"id": article_id, "publisher_domain": dom, "publisher_country": cc}
+    if lang:
+        u["lang"] = lang
+    return u
+
+def fulltext_update(article_id: int, fulltext: str, fetched_at: str):
+    return {"id": article_id, "content": fulltext, "content_len": len(fulltext),
+            "content_fetched_at": fetched_at}
+
+# ---------- Async ----------
+class AsyncArticleStore:
+    """
+    Façade asyncio. Avec MariaDB + aiomysql : vrai pool asynchrone.
+    Sinon (SQLite, aiomysql absent) : les appels synchrones passent dans un thread.
+    """
+
+    def __init__(self, store: ArticleStore, pool_size: int = 5):
+        self.store = store
+        self.pool_size = pool_size
+        self._pool = None
+
+    async def _get_pool(self):
+        if self._pool is None:
+            p = self.store.backend.params
+            self._pool = await aiomysql.create_pool(
+                host=p["host"], port=p.get("port", 3306), user=p["user"],
+                password=p["password"], db=p["database"],
+                charset=p.get("charset", "utf8mb4"), autocommit=False,
+                minsize=1, maxsize=self.pool_size, pool_recycle=3600,
+            )
+        return self._pool
+
+    def _native(self):
+        return aiomysql is not None and self.store.backend.dialect == "mysql"
+
+    async def _ids_for_keys(self, cur, keys):
+        found = {}
+        keys = list(dict.fromkeys(keys))
+        for i in range(0, len(keys), IN_CHUNK):
+            chunk = keys[i:i + IN_CHUNK]
+            await cur.execute(f"SELECT id, url_hash FROM articles WHERE url_hash IN ({','.join(['%s'] * len(chunk))})", chunk)
+            found.update({k: id_ for id_, k in await cur.fetchall()})
+        return found
+
+    async def insert_many(self, rows):
+        if not self._native():
+            return await asyncio.to_thread(self.store.insert_many, rows)
+        rows = self.store._prepare(rows)
+        if not rows:
+            return []
+        pool = await self._get_pool()
+        async with pool.acquire() as con:
+            async with con.cursor() as cur:
+                before = await self._ids_for_keys(cur, [r["url_hash"] for r in rows])
+                await cur.executemany(self.store._insert_sql(), self.store._insert_values(rows))
+                after = await self._ids_for_keys(cur, [r["url_hash"] for r in rows if r["url_hash"] not in before])
+            await con.commit()
+        return ArticleStore._merge_ids(rows, before, after)
+
+    async def update_many(self, updates, table: str = "articles"):
+        if not self._native():
+            return await asyncio.to_thread(self.store.update_many, updates, table)
+        groups = ArticleStore._update_groups(updates)
+        if not groups:
+            return 0
+        pool = await self._get_pool()
+        async with pool.acquire() as con:
+            async with con.cursor() as cur:
+                for cols, params in groups.items():
+                    sets = ", ".join(f"{c}=%s" for c in cols)
+                    await cur.executemany(f"UPDATE {table} SET {sets} WHERE id=%s", params)
+            await con.commit()
+        return sum(len(v) for v in groups.values())
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+def open_store(db_path: str|None = None, mariadb: dict|None = None, pool_size: int = 5):
+    """Fabrique : MariaDB si `mariadb` est fourni, sinon SQLite sur `db_path`."""
+    if mariadb:
+        return ArticleStore(MariaDBBackend(mariadb, pool_size=pool_size))
+    return ArticleStore(SQLiteBackend(db_path or os.path.join(os.path.dirname(__file__), "news.db")))
@@ -0,0 +1,40 @@
+# tests/test_entity_canon.py
+# Canonicalisation des personnes : ordre des lots, civilités, articles.
+from entity_canon import EntityResolver, alias_key
+from storage import open_store
+
+def _resolver(tmp_path):
+    store = open_store(str(tmp_path / "x.db"))
+    store.ensure_schema()
+    return store, EntityResolver(store)
+
+def _ids(resolver, *texts, label="PERSON"):
+    return [cid for cid, _ in resolver.resolve_many([(t, label) for t in texts])]
+
+def test_surname_first_then_full_name_across_batches(tmp_path):
+    store, r = _resolver(tmp_path)
+    (first,) = _ids(r, "Macron")
+    store.insert_entities(r.annotate([(1, "Macron", "PERSON", 0, 6)]))
+    (full,) = _ids(r, "Emmanuel Macron")
+    assert _ids(r, "Macron", "M. Macron", "Emmanuel Macron") == [full] * 3
+    assert r.resolve_many([("Macron", "PERSON")])[0][1] == "Emmanuel Macron"
+    # mentions déjà stockées et nouveau processus (mémo vide) : même personne
+    with store.backend.connection() as con:
+        stored = {row[0] for row in con.execute("SELECT canon_id FROM entities")}
+        canons = {row[0] for row in con.execute("SELECT id FROM entity_canon")}
+    assert stored == {full} and first not in canons
+    assert _ids(EntityResolver(store), "Macron", "M. Macron") == [full, full]
+
+def test_two_people_same_surname_stay_apart(tmp_path):
+    _, r = _resolver(tmp_path)
+    a, b = _ids(r, "Emmanuel Macron", "Brigitte Macron")
+    assert a != b
+    assert _ids(r, "Macron")[0] not in (a, b)   # nom de famille ambigu : pas de rattachement
+
+def test_honorifics_and_determiners(tmp_path):
+    _, r = _resolver(tmp_path)
+    assert alias_key("M.") == alias_key("Mme") == ""
+    assert _ids(r, "M.", "Mme") == [None, None]
+    assert alias_key("l'Élysée") == alias_key("Élysée") == "elysee"
+    a, b = _ids(r, "la France", "France", label="GPE")
+    assert a == b and a
@@ -0,0 +1,34 @@
+# tests/test_lexicon_sentiment.py
+# Parité du lexique anglais compilé avec SentimentIntensityAnalyzer.polarity_scores,
+# émoticônes comprises (variantes de casse du lexique VADER : "o.o" / "O.o").
+import random
+
+import pytest
+
+vader = pytest.importorskip("vaderSentiment.vaderSentiment")
+
+from lexicon_sentiment import engine
+
+SCORES = ("neg", "neu", "pos", "compound")
+
+def _texts(n, seed=1):
+    analyzer = vader.SentimentIntensityAnalyzer()
+    emoticons = [k for k in analyzer.lexicon if not k.isalpha()]
+    words = ([k for k in analyzer.lexicon if k.isalpha()] + list(vader.BOOSTER_DICT)
+             + ["not", "isn't", "but", "no", "never", "kind of", "at least", "the", "GREAT", "BAD", ":-Þ"])
+    rnd = random.Random(seed)
+    return [" ".join(rnd.choice(emoticons if rnd.random() < 0.4 else words) for _ in range(rnd.randint(1, 15)))
+            + rnd.choice(["", "!", "!!", "?", "."]) for _ in range(n)]
+
+@pytest.mark.parametrize("text", ["O.o", "o.O", "o_O", ":D", ":-Þ", "I love it :) but O_o", "NOT good :("])
+def test_emoticons(text):
+    ref = vader.SentimentIntensityAnalyzer().polarity_scores(text)
+    assert engine("en").polarity_scores(text) == pytest.approx(ref, abs=1e-9)
+
+def test_parity_fuzz():
+    texts = _texts(5000)
+    analyzer = vader.SentimentIntensityAnalyzer()
+    got = engine("en").score_many(texts)
+    for text, scores in zip(texts, got):
+        ref = analyzer.polarity_scores(text)
+        assert [scores[k] for k in SCORES] == pytest.approx([ref[k] for k in SCORES], abs=1e-9), text
@@ -0,0 +1,27 @@
+# tests/test_storage.py
+# Façade asyncio (AsyncArticleStore) : mêmes résultats que l'ArticleStore synchrone.
+import asyncio
+
+from storage import AsyncArticleStore, open_store
+
+def test_async_store_sqlite_fallback(tmp_path):
+    store = open_store(str(tmp_path / "x.db"))
+    store.ensure_schema()
+    rows = [{"link": "https://www.bbc.co.uk/news/a?ito=rss", "title": "A"},
+            {"link": "https://www.bbc.co.uk/news/a", "title": "A bis"},
+            {"link": "https://example.org/b", "title": "B"}]
+
+    async def run():
+        astore = AsyncArticleStore(store)
+        try:
+            ids = await astore.insert_many(rows)
+            n = await astore.update_many([{"id": ids[2][0], "title": "B2"}])
+        finally:
+            await astore.close()
+        return ids, n
+
+    ids, n = asyncio.run(run())
+    assert [new for _, new in ids] == [True, False, True]
+    assert ids[0][0] == ids[1][0] and n == 1
+    with store.backend.connection() as con:
+        assert con.execute("SELECT title FROM articles WHERE id=?", (ids[2][0],)).fetchone() == ("B2",)
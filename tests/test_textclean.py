@@ -0,0 +1,28 @@
+# tests/test_textclean.py
+# clean_text_soft (niveaux regex / sans parsing) identique à la référence BeautifulSoup.
+import random
+
+import pytest
+
+pytest.importorskip("bs4")
+
+from textclean import clean_text_soft, clean_text_soft_reference
+
+pytestmark = pytest.mark.filterwarnings("ignore::bs4.MarkupResemblesLocatorWarning")
+
+PIECES = ["<p>", "</p>", "<b>", "</b>", "<br/>", '<a href="x?a=1&b=2">', "</a>", "<div class='c'>", "</div>",
+          "<img src=x>", "<!-- c -->", "<script>x<y</script>", "<", ">", "&", "&amp;", "&amp;lt;", "&lt;", "&gt;",
+          "&lang", "&lang=fr", "&copy", "&copy;", "&nbsp;", "&#39;", "&#x27;", "&#233", "&eacute", "&b",
+          "&amp;amp;", "&unknown;", "&;", "&#;", "?a=1", " ", "  ", "\n", "\t", "word", "mot", "é", "100%",
+          "$5", "€", "http://x.y/z", "www.a.b", '"', "'", "=", "/", "</", "<x", "<1", "& ", "b&b", "AT&T"]
+
+@pytest.mark.parametrize("text", ["<p>?a=1&lang=fr</p>", "<b>x</b> b&b", "a &amp;lang=fr", "AT&T",
+                                  "<p>Prix : 5 &euro; (+3%)</p>", "plain text", None])
+def test_cases(text):
+    assert clean_text_soft(text) == clean_text_soft_reference(text)
+
+def test_fuzz():
+    rnd = random.Random(0)
+    for _ in range(20000):
+        text = "".join(rnd.choice(PIECES) for _ in range(rnd.randint(1, 12)))
+        assert clean_text_soft(text) == clean_text_soft_reference(text), text
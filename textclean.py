@@ -0,0 +1,117 @@
+# textclean.py
+# clean_text_soft à plusieurs niveaux (sortie identique octet pour octet à la
+# version BeautifulSoup d'origine, cf. benchmark en bas de fichier) :
+#   0. pas de "<" ni de "&" (après dé-échappement) : aucun parsing
+#   1. balisage simple (balises ordinaires, pas de script/style/commentaire) et
+#      texte sans "&" : suppression des balises par regex (moteur C)
+#   2. le reste (commentaires, <script>, balises mal formées, "&" restant...) : BeautifulSoup
+#
+# Usage Series : clean_series(df["col"]) ; benchmark : python textclean.py [base.db ...]
+import re, html, sys, time
+
+try:
+    from bs4 import BeautifulSoup
+except Exception:
+    BeautifulSoup = None
+
+URL_RE = re.compile(r'(https?://\S+|www\.\S+)')
+SPACE_RE = re.compile(r'\s+')
+# balise ouvrante/fermante ordinaire, attributs entre guillemets compris
+TAG_RE = re.compile(
+    r"""</?[A-Za-z][^\s/>]*(?:\s+[^\s=/>]+(?:\s*=\s*(?:"[^"]*"|'[^']*'|[^\s"'=<>`]+))?)*\s*/?>"""
+)
+# contenus que html.parser/bs4 traitent à part (non textuels ou bruts)
+SPECIAL_RE = re.compile(r"<(?:script|style|template|textarea|title|plaintext|xmp|noscript|iframe|noembed|noframes)\b", re.I)
+
+def _finish(text: str) -> str:
+    text = URL_RE.sub(' ', text)
+    return SPACE_RE.sub(' ', text).strip()
+
+def clean_text_soft_reference(text: str) -> str:
+    """Version d'origine (BeautifulSoup html.parser) : référence du benchmark et niveau 2."""
+    if not isinstance(text, str):
+        return ""
+    return _bs4(html.unescape(text))
+
+def _bs4(text: str) -> str:
+    return _finish(BeautifulSoup(text, "html.parser").get_text(" ", strip=True))
+
+def _simple_markup(text: str) -> bool:
+    # chaque "<" appartient à une balise ordinaire complète
+    if SPECIAL_RE.search(text):
+        return False
+    return text.count("<") == sum(1 for _ in TAG_RE.finditer(text)) and text.count(">") == text.count("<")
+
+def clean_text_soft(text: str) -> str:
+    """Nettoyage doux: enlève HTML/URLs, garde chiffres, % et devises."""
+    if not isinstance(text, str):
+        return ""
+    text = html.unescape(text)
+    # un "&" restant (double échappement, entité sans ";" comme "&lang=fr") : bs4 le
+    # dé-échappe selon ses propres tables, différentes de html.unescape -> niveau 2
+    if "<" not in text:
+        return _finish(text) if "&" not in text else _bs4(text)
+    if _simple_markup(text):
+        stripped = TAG_RE.sub(" ", text)
+        if "&" not in stripped:
+            return _finish(stripped)
+    return _bs4(text)
+
+def clean_series(s):
+    """clean_text_soft sur une Series pandas ; les textes identiques ne sont nettoyés qu'une fois."""
+    s = s.where(s.map(lambda x: isinstance(x, str)), "")
+    uniq = {t: clean_text_soft(t) for t in s.unique()}
+    return s.map(uniq)
+
+# ---------- Benchmark ----------
+def _corpus(paths):
+    import sqlite3
+    queries = [
+        "SELECT title, summary FROM articles",
+        "SELECT title, description FROM articles",
+        "SELECT content, full_text FROM articles",
+    ]
+    out = []
+    for path in paths:
+        con = sqlite3.connect(path)
+        for q in queries:
+            try:
+                for row in con.execute(q):
+                    out += [v for v in row if isinstance(v, str)]
+            except Exception:
+                continue
+        con.close()
+    return out
+
+def benchmark(paths, repeat: int = 5):
+    texts = _corpus(paths)
+    if not texts:
+        print("Corpus vide")
+        return False
+    diffs = [t for t in texts if clean_text_soft(t) != clean_text_soft_reference(t)]
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for t in texts:
+            clean_text_soft_reference(t)
+    t_ref = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for t in texts:
+            clean_text_soft(t)
+    t_fast = time.perf_counter() - t0
+    tiers = {"plain": 0, "regex": 0, "bs4": 0}
+    for t in texts:
+        u = html.unescape(t)
+        if "<" not in u:
+            tiers["plain" if "&" not in u else "bs4"] += 1
+        else:
+            tiers["regex" if _simple_markup(u) and "&" not in TAG_RE.sub(" ", u) else "bs4"] += 1
+    print(f"{len(texts)} textes, niveaux {tiers}")
+    print(f"référence : {t_ref / repeat * 1000:.1f} ms/passe, rapide : {t_fast / repeat * 1000:.1f} ms/passe "
+          f"(x{t_ref / max(t_fast, 1e-9):.1f})")
+    print("sortie identique" if not diffs else f"{len(diffs)} différences, ex. : {diffs[0][:200]!r}")
+    return not diffs
+
+if __name__ == "__main__":
+    ok = benchmark(sys.argv[1:] or ["news.db", "NewsSitemaps.db", "NewsVader.db"])
+    sys.exit(0 if ok else 1)
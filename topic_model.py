@@ -0,0 +1,312 @@
+# topic_model.py
+# Topics appris, à côté de TOPIC_RULES : vectorisation par hachage (mots + bigrammes
+# repliés -> 2**18 colonnes, signe haché, tf sous-linéaire, norme L2), matrice
+# creuse CSR en NumPy et modèle linéaire un-contre-tous (régression logistique)
+# entraîné hors ligne sur nos propres articles.
+#
+# Étiquettes d'entraînement : la rubrique de l'URL (lemonde.fr/economie/...,
+# theguardian.com/world/..., bbc.com/news/business-...), ramenée à une
+# taxonomie commune par SECTION_TOPICS. Les articles sans rubrique reconnue
+# n'entrent pas dans l'entraînement mais sont prédits comme les autres.
+#
+# Prédiction : un produit matrice creuse x poids pour tout le lot, puis lignes
+# article_topics (article_id, topic, proba, 'model') ; un topic déjà posé par
+# les règles (même nom) garde sa ligne 'rules' (UNIQUE article_id, topic).
+#
+#   python topic_model.py train   [base.db ...]   -> topic_model.npz
+#   python topic_model.py predict [base.db]        -> article_topics, source='model'
+import os, re, json, zlib, hashlib, argparse
+from urllib.parse import urlparse
+
+import numpy as np
+
+from topics import _fold_char
+
+MODEL_PATH = os.environ.get("TOPIC_MODEL_PATH", os.path.join(os.path.dirname(__file__), "topic_model.npz"))
+N_FEATURES = 2 ** 18
+THRESHOLD = 0.5        # proba minimale pour écrire un topic
+MIN_EXAMPLES = 5       # exemples positifs minimum pour apprendre un topic
+CONTENT_CHARS = 3000   # début du plein texte ajouté au titre + résumé
+PREDICT_BATCH = 5000   # articles par lot en prédiction
+MEMO_MAX = 500_000
+
+SECTION_TOPICS = {
+    # économie / marchés
+    "economie": "Economy", "economy": "Economy", "business": "Economy", "money": "Economy",
+    "argent": "Economy", "emploi": "Economy", "entreprises": "Economy",
+    "markets": "Markets", "marches": "Markets", "bourse": "Markets",
+    # monde / politique
+    "international": "World", "world": "World", "monde": "World", "afrique": "World",
+    "europe": "World", "asie-pacifique": "World", "ameriques": "World", "proche-orient": "World",
+    "politique": "Politics", "politics": "Politics", "uk-politics": "Politics", "election": "Politics",
+    # société
+    "societe": "Society", "society": "Society", "faits-divers": "Society", "justice": "Society",
+    "education": "Society", "sante": "Health", "health": "Health",
+    "planete": "Environment", "environment": "Environment", "environnement": "Environment",
+    "climate": "Environment", "science-environment": "Environment",
+    "sciences": "Science", "science": "Science",
+    "pixels": "Tech", "technology": "Tech", "tech": "Tech", "games": "Tech",
+    # sport / culture / opinion
+    "sport": "Sport", "sports": "Sport", "football": "Sport",
+    "culture": "Culture", "film": "Culture", "music": "Culture", "books": "Culture", "livres": "Culture",
+    "tv-and-radio": "Culture", "artanddesign": "Culture", "stage": "Culture", "entertainment": "Culture",
+    "idees": "Opinion", "commentisfree": "Opinion", "opinion": "Opinion",
+    "lifeandstyle": "Lifestyle", "food": "Lifestyle", "travel": "Lifestyle", "fashion": "Lifestyle",
+    "m-styles": "Lifestyle",
+}
+
+_WORD_RE = re.compile(r"\w\w+")
+# repli des accents en une passe C (str.translate) : Latin-1 + Latin étendu A
+_FOLD_TABLE = {c: _fold_char(chr(c)) for c in range(0xC0, 0x250) if _fold_char(chr(c)) != chr(c).lower()}
+
+def url_section(link: str|None) -> str|None:
+    """Topic de la rubrique d'une URL (SECTION_TOPICS), None si non reconnue."""
+    parts = [p for p in urlparse(link or "").path.lower().split("/") if p]
+    for p in parts[:2]:
+        if p in SECTION_TOPICS:
+            return SECTION_TOPICS[p]
+    # bbc.com/news/business-12345678
+    if len(parts) >= 2 and parts[0] == "news":
+        return SECTION_TOPICS.get(parts[1].rsplit("-", 1)[0]) or SECTION_TOPICS.get(parts[1].split("-")[0])
+    return None
+
+# ---------- Matrice creuse ----------
+class CSR:
+    """Matrice creuse lignes (indptr, indices, data), produits par topic en NumPy."""
+
+    def __init__(self, indptr, indices, data, n_cols):
+        self.indptr, self.indices, self.data, self.n_cols = indptr, indices, data, n_cols
+        self.n_rows = len(indptr) - 1
+
+    def rows(self) -> np.ndarray:
+        return np.repeat(np.arange(self.n_rows), np.diff(self.indptr))
+
+    def dot(self, W) -> np.ndarray:
+        """X @ W.T avec W (topics, colonnes) -> (lignes, topics)."""
+        out = np.zeros((self.n_rows, len(W)))
+        nonempty = np.flatnonzero(np.diff(self.indptr))
+        if len(nonempty):
+            starts = self.indptr[nonempty]
+            for t, w in enumerate(W):
+                out[nonempty, t] = np.add.reduceat(self.data * w[self.indices], starts)
+        return out
+
+    def tdot(self, E, rows=None) -> np.ndarray:
+        """X.T @ E avec E (lignes, topics) -> (topics, colonnes)."""
+        rows = self.rows() if rows is None else rows
+        return np.stack([np.bincount(self.indices, weights=self.data * E[rows, t], minlength=self.n_cols)
+                         for t in range(E.shape[1])])
+
+# ---------- Vectorisation ----------
+class HashingVectorizer:
+    """Mots + bigrammes repliés -> colonnes hachées (crc32), signe haché pour limiter les collisions."""
+
+    def __init__(self, n_features: int = N_FEATURES):
+        self.n_features = n_features
+        self._memo = {}
+
+    def _feature(self, tok: str) -> int:
+        f = self._memo.get(tok)
+        if f is None:
+            if len(self._memo) >= MEMO_MAX:
+                self._memo.clear()
+            # colonne + 1, signée par le bit de poids fort du hash
+            h = zlib.crc32(tok.encode("utf-8"))
+            col = h % self.n_features + 1
+            f = self._memo[tok] = col if h & 0x80000000 else -col
+        return f
+
+    def tokens(self, text: str) -> list[str]:
+        words = _WORD_RE.findall((text or "").lower().translate(_FOLD_TABLE))
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def transform(self, texts) -> CSR:
+        indptr, indices, data = [0], [], []
+        for text in texts:
+            feats = [self._feature(tok) for tok in self.tokens(text)]
+            if feats:
+                signed, counts = np.unique(np.array(feats), return_counts=True)
+                # même colonne atteinte avec des signes opposés : on additionne
+                cols, inv = np.unique(np.abs(signed) - 1, return_inverse=True)
+                vals = np.bincount(inv, weights=np.log1p(counts) * np.sign(signed))
+                vals /= np.linalg.norm(vals) or 1.0
+                indices.append(cols)
+                data.append(vals)
+            indptr.append(indptr[-1] + (len(cols) if feats else 0))
+        return CSR(np.array(indptr), np.concatenate(indices) if indices else np.zeros(0, np.int64),
+                   np.concatenate(data) if data else np.zeros(0), self.n_features)
+
+# ---------- Modèle ----------
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+class TopicModel:
+    """Régression logistique un-contre-tous sur features hachées."""
+
+    def __init__(self, topics, W, b, n_features: int = N_FEATURES):
+        self.topics = list(topics)
+        self.W = np.asarray(W, dtype=np.float32)
+        self.b = np.asarray(b, dtype=np.float64)
+        self.vectorizer = HashingVectorizer(n_features)
+        digest = hashlib.blake2b(self.W.tobytes() + self.b.tobytes(), digest_size=6).hexdigest()
+        self.version = f"hash{n_features}-{digest}"
+
+    @classmethod
+    def fit(cls, texts, labels, n_features: int = N_FEATURES, epochs: int = 150,
+            lr: float = 0.5, l2: float = 1e-5, verbose: bool = False) -> "TopicModel":
+        """
+        labels : un ensemble de topics par texte. Descente de gradient (Adagrad) sur tout le lot,
+        positifs repondérés (n_neg / n_pos) : chaque topic est rare face à tous les autres.
+        """
+        counts = {}
+        for ls in labels:
+            for t in ls:
+                counts[t] = counts.get(t, 0) + 1
+        topics = sorted(t for t, c in counts.items() if c >= MIN_EXAMPLES)
+        X = HashingVectorizer(n_features).transform(texts)
+        # apprentissage sur les seules colonnes vues (les autres poids restent nuls)
+        used, X.indices = np.unique(X.indices, return_inverse=True)
+        X.n_cols = len(used)
+        Y = np.array([[t in ls for t in topics] for ls in labels], dtype=np.float64).reshape(len(labels), len(topics))
+        n = max(X.n_rows, 1)
+        n_pos = Y.sum(axis=0)
+        S = np.where(Y > 0, (n - n_pos) / np.maximum(n_pos, 1), 1.0)
+        W = np.zeros((len(topics), X.n_cols))
+        b = np.zeros(len(topics))
+        gW, gb = np.full_like(W, 1e-8), np.full_like(b, 1e-8)
+        rows = X.rows()
+        for epoch in range(epochs):
+            P = _sigmoid(X.dot(W) + b)
+            E = S * (P - Y) / n
+            dW = X.tdot(E, rows) + l2 * W
+            db = E.sum(axis=0)
+            gW += dW * dW
+            gb += db * db
+            W -= lr * dW / np.sqrt(gW)
+            b -= lr * db / np.sqrt(gb)
+            if verbose and epoch % 50 == 0:
+                loss = -np.mean(S * (Y * np.log(P + 1e-12) + (1 - Y) * np.log(1 - P + 1e-12)))
+                print(f"  epoch {epoch} : log-loss pondérée {loss:.4f}")
+        full = np.zeros((len(topics), n_features), dtype=np.float32)
+        full[:, used] = W
+        return cls(topics, full, b, n_features)
+
+    def predict_proba(self, texts) -> np.ndarray:
+        return _sigmoid(self.vectorizer.transform(texts).dot(self.W) + self.b)
+
+    def rows(self, items, threshold: float = THRESHOLD) -> list[tuple]:
+        """items : [(article_id, texte)] -> lignes (article_id, topic, proba, 'model') pour store.insert_topics."""
+        items = [(aid, text) for aid, text in items if aid]
+        if not items or not self.topics:
+            return []
+        P = self.predict_proba([text for _, text in items])
+        r, t = np.nonzero(P >= threshold)
+        return [(items[i][0], self.topics[j], round(float(P[i, j]), 2), "model") for i, j in zip(r, t)]
+
+    def save(self, path: str = MODEL_PATH):
+        # poids creux en pratique (colonnes jamais vues = 0) : stockage compressé
+        np.savez_compressed(path, W=self.W, b=self.b, n_features=self.vectorizer.n_features,
+                            topics=np.array(json.dumps(self.topics)))
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH) -> "TopicModel":
+        with np.load(path) as z:
+            return cls(json.loads(str(z["topics"])), z["W"], z["b"], int(z["n_features"]))
+
+def load_model(path: str = MODEL_PATH) -> TopicModel|None:
+    """Modèle entraîné s'il existe (étape optionnelle des scripts), sinon None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return TopicModel.load(path)
+    except Exception as e:
+        print(f"Modèle de topics illisible ({path}) : {e}")
+        return None
+
+# ---------- Entraînement / prédiction sur la base ----------
+def article_text(title, summary, content) -> str:
+    return f"{title or ''} {summary or ''} {(content or '')[:CONTENT_CHARS]}".strip()
+
+def _articles(store, after_id: int = 0, limit: int|None = None):
+    p = store.ph
+    sql = f"SELECT id, link, title, summary, content FROM articles WHERE id > {p} ORDER BY id"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    with store.backend.connection() as con:
+        cur = con.cursor()
+        cur.execute(sql, (after_id,))
+        return cur.fetchall()
+
+def training_set(stores):
+    texts, labels = [], []
+    for store in stores:
+        for _, link, title, summary, content in _articles(store):
+            topic = url_section(link)
+            if topic:
+                texts.append(article_text(title, summary, content))
+                labels.append({topic})
+    return texts, labels
+
+def evaluate(texts, labels, holdout: float = 0.2, seed: int = 0):
+    """Précision / rappel micro sur un échantillon tenu à part."""
+    idx = np.random.default_rng(seed).permutation(len(texts))
+    cut = int(len(idx) * (1 - holdout))
+    train, test = idx[:cut], idx[cut:]
+    model = TopicModel.fit([texts[i] for i in train], [labels[i] for i in train])
+    P = model.predict_proba([texts[i] for i in test]) >= THRESHOLD
+    Y = np.array([[t in labels[i] for t in model.topics] for i in test], dtype=bool).reshape(P.shape)
+    tp = int((P & Y).sum())
+    prec = tp / max(int(P.sum()), 1)
+    rec = tp / max(int(Y.sum()), 1)
+    print(f"Validation ({len(test)} articles) : précision {prec:.2f}, rappel {rec:.2f}")
+    return prec, rec
+
+def train(paths, out: str = MODEL_PATH):
+    from storage import open_store
+    stores = [open_store(p) for p in paths]
+    for s in stores:
+        s.ensure_schema()
+    texts, labels = training_set(stores)
+    print(f"{len(texts)} articles étiquetés par rubrique")
+    if not texts:
+        return None
+    evaluate(texts, labels)
+    model = TopicModel.fit(texts, labels, verbose=True)
+    model.save(out)
+    print(f"Modèle {model.version} : {len(model.topics)} topics {model.topics} -> {out}")
+    return model
+
+def predict(path: str, model: TopicModel|None = None, batch: int = PREDICT_BATCH) -> int:
+    from storage import open_store
+    model = model or load_model()
+    if model is None:
+        print(f"Pas de modèle ({MODEL_PATH}) : lancer d'abord `python topic_model.py train`")
+        return 0
+    store = open_store(path)
+    store.ensure_schema()
+    last, written = 0, 0
+    while True:
+        chunk = _articles(store, last, batch)
+        if not chunk:
+            break
+        rows = model.rows([(aid, article_text(t, s, c)) for aid, _, t, s, c in chunk])
+        store.insert_topics(rows)
+        written += len(rows)
+        last = chunk[-1][0]
+    print(f"{written} topics 'model' écrits dans {path}")
+    return written
+
+def main():
+    ap = argparse.ArgumentParser(description="Topics appris (features hachées + modèle linéaire)")
+    ap.add_argument("cmd", choices=["train", "predict"])
+    ap.add_argument("db", nargs="*")
+    ap.add_argument("--model", default=MODEL_PATH)
+    args = ap.parse_args()
+    if args.cmd == "train":
+        train(args.db or ["news.db", "NewsSitemaps.db"], args.model)
+    else:
+        for path in args.db or ["news.db"]:
+            predict(path, load_model(args.model))
+
+if __name__ == "__main__":
+    main()
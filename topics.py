@@ -0,0 +1,136 @@
+# topics.py
+# Détection de topics par mots-clés : automate Aho-Corasick compilé une fois
+# à partir d'un jeu de règles versionné, un seul passage sur le texte.
+#
+# - texte et mots-clés repliés (minuscules, sans accents) caractère par caractère :
+#   les positions restent celles du texte d'origine
+# - un mot-clé ne compte que s'il tombe sur des frontières de mots
+#   ("ai" ne matche plus "maison", ni "semi" dans "semaine")
+# - mots-clés en MAJUSCULES = sigles : ignorés si le texte les écrit en minuscules
+#   ("FED" matche "Fed"/"FED" mais pas "fed up")
+import unicodedata
+from collections import deque
+
+from enrich_cache import rules_version
+
+ENGINE_REV = 3  # à incrémenter si la logique de matching/score change
+
+TOPIC_RULES = {
+    "Markets": ["bourse","equity","stocks","indice","obligations","yield","volatilité","ETF"],
+    "Macro":   ["inflation","gdp","cpi","pmi","récession","croissance","emploi","chômage","BCE","FED","banque centrale"],
+    "Energy":  ["pétrole","gaz","opec","opep","brent","énergie","nucléaire"],
+    "Tech":    ["IA","AI","nvidia","semi","puce","cloud","logiciel","cyber"],
+    "Geo":     ["ukraine","russia","china","beijing","taiwan","otan","nato","conflit","sanctions"],
+}
+# formes que l'ancienne recherche par sous-chaîne trouvait via le mot-clé de base :
+# comptées comme ce mot-clé (un seul 0.2 pour "semi" et "semi-conducteurs")
+KEYWORD_VARIANTS = {
+    "semi": ["semi-conducteurs", "semi-conducteur", "semiconductor", "semiconductors"],
+    "puce": ["puces"],
+}
+
+_FOLD = {}
+
+def _fold_char(c: str) -> str:
+    # 1 caractère -> 1 caractère (offsets conservés)
+    f = _FOLD.get(c)
+    if f is None:
+        d = unicodedata.normalize("NFKD", c)
+        base = "".join(x for x in d if not unicodedata.combining(x)) or c
+        f = base.lower()[:1] or c
+        _FOLD[c] = f
+    return f
+
+def fold(text: str) -> str:
+    return "".join(_fold_char(c) for c in text or "")
+
+def _is_word(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+class KeywordAutomaton:
+    """Automate Aho-Corasick sur texte replié ; payload arbitraire par motif."""
+
+    def __init__(self, patterns):
+        # patterns : itérable de (motif, payload)
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for pat, payload in patterns:
+            key = fold(pat)
+            if not key:
+                continue
+            node = 0
+            for c in key:
+                nxt = self.goto[node].get(c)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][c] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                node = nxt
+            self.out[node].append((len(key), payload))
+        # liens d'échec en largeur
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for c, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and c not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(c, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def finditer(self, text: str):
+        """(début, fin, payload) pour chaque motif trouvé sur des frontières de mots."""
+        folded = fold(text)
+        n = len(folded)
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        for i, c in enumerate(folded):
+            while node and c not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(c, 0)
+            if not out[node]:
+                continue
+            end = i + 1
+            if end < n and _is_word(folded[end]):
+                continue
+            for length, payload in out[node]:
+                start = end - length
+                if start > 0 and _is_word(folded[start - 1]):
+                    continue
+                yield start, end, payload
+
+class TopicEngine:
+    """Scores de topics (même barème que l'ancien detect_topics : 0.2 par mot-clé distinct, max 1)."""
+
+    def __init__(self, rules: dict = TOPIC_RULES, variants: dict = KEYWORD_VARIANTS):
+        self.rules = rules
+        self.order = list(rules)
+        self.version = f"ac{ENGINE_REV}-{rules_version([rules, variants])}"
+        patterns = []
+        for topic, keys in rules.items():
+            for k in keys:
+                acronym = k.isupper() and len(k) > 1
+                for form in [k, *variants.get(k, [])]:
+                    patterns.append((form, (topic, k, acronym)))
+        self.automaton = KeywordAutomaton(patterns)
+
+    def detect(self, text: str) -> list[tuple[str, float]]:
+        hits = {}
+        for start, end, (topic, key, acronym) in self.automaton.finditer(text or ""):
+            if acronym and text[start:end].islower():
+                continue
+            hits.setdefault(topic, set()).add(key)
+        return [(t, round(min(1.0, 0.2 * len(hits[t])), 2)) for t in self.order if t in hits]
+
+    def detect_many(self, texts) -> list[list[tuple[str, float]]]:
+        return [self.detect(t) for t in texts]
+
+# moteur par défaut, compilé une fois à l'import
+TOPICS = TopicEngine()
+
+def detect_topics(text: str):
+    return TOPICS.detect(text)
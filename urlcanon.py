@@ -0,0 +1,106 @@
+# urlcanon.py
+# Canonicalisation des URLs + clé de dédup binaire compacte.
+#
+# Les mêmes articles arrivent avec des paramètres de tracking (utm_*, fbclid, xtor...),
+# en variante AMP, en http/https ou avec/sans www. et "/" final : autant de doublons
+# qui repassaient par le fetch, le NER et VADER. Toutes les sources sont dédupliquées
+# sur url_key() (hash de canonicalize_url) ; la forme canonique n'est qu'une clé, le
+# lien stocké et téléchargé reste celui d'origine :
+#   - SQLite  : INTEGER signé 64 bits (url_hash64)
+#   - MariaDB : BINARY(16) (url_hash128)
+import hashlib, re
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, unquote
+
+# paramètres de tracking à supprimer (exact) ; les préfixes sont traités à part
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "xtor", "xtref", "ocid", "smid", "outputType", "__twitter_impression",
+}
+TRACKING_PREFIXES = ("utm_", "at_", "ns_", "pk_", "mtm_", "hsa_")
+# noms génériques, porteurs de contenu ailleurs (ref=B07XYZ, cmp=...) : tracking
+# seulement chez ces éditeurs ; ref, referrer et amp ne sont jamais supprimés
+SITE_TRACKING_PARAMS = {
+    "bbc.co.uk": {"ito"},
+    "bbc.com": {"ito"},
+    "theguardian.com": {"CMP"},
+    "cnn.com": {"cmp"},
+}
+
+# cache AMP de Google : https://www-exemple-com.cdn.ampproject.org/c/s/www.exemple.com/...
+AMP_CACHE_RE = re.compile(r"^/[cv]/(?:s/)?(?P<rest>.+)$")
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+def _strip_amp_path(path: str) -> str:
+    # /amp/... , .../amp , .../amp/ , ....amp , ....amp.html
+    path = re.sub(r"^/amp(?=/)", "", path)
+    path = re.sub(r"/amp/?$", "", path)
+    path = re.sub(r"\.amp(\.html?)?$", r"\1", path)
+    return path or "/"
+
+def canonicalize_url(url: str) -> str:
+    """
+    Forme canonique d'une URL d'article (clé de dédup, pas forcément téléchargeable) :
+    https, hôte en minuscules sans port par défaut, sans fragment, sans paramètres
+    de tracking (query triée), sans variante AMP, sans "/" final.
+    """
+    if not url:
+        return ""
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    if not parts.netloc:
+        return url
+
+    scheme = parts.scheme.lower()
+    if scheme not in ("http", "https"):
+        return url
+    host = (parts.hostname or "").lower().rstrip(".")
+    path = parts.path or "/"
+
+    # Cache AMP Google -> URL d'origine
+    if host.endswith(".cdn.ampproject.org"):
+        m = AMP_CACHE_RE.match(path)
+        if m:
+            return canonicalize_url("https://" + unquote(m.group("rest")))
+
+    if host.startswith("amp.") and host.count(".") >= 2:
+        host = host[4:]
+    port = parts.port
+    netloc = host if port is None or str(port) == DEFAULT_PORTS.get(scheme) else f"{host}:{port}"
+
+    path = _strip_amp_path(re.sub(r"/{2,}", "/", path))
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/") or "/"
+
+    site = next((s for s in SITE_TRACKING_PARAMS if host == s or host.endswith("." + s)), None)
+    drop = TRACKING_PARAMS | SITE_TRACKING_PARAMS[site] if site else TRACKING_PARAMS
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in drop and not k.lower().startswith(TRACKING_PREFIXES)
+    ]
+    query.sort()
+    return urlunsplit(("https", netloc, path, urlencode(query, doseq=True), ""))
+
+# ---------- Clés de hachage ----------
+def _key_string(url: str, canonical: bool) -> bytes:
+    # www.bbc.co.uk et bbc.co.uk (ou m.) servent le même article : ignorés pour la clé
+    u = url if canonical else canonicalize_url(url)
+    u = re.sub(r"^https://(?:www\d*|m)\.(?=[^/]+\.[^/]+)", "https://", u)
+    return u.encode("utf-8")
+
+def url_hash128(url: str, canonical: bool = False) -> bytes:
+    """16 octets (BINARY(16) côté MariaDB)."""
+    return hashlib.blake2b(_key_string(url, canonical), digest_size=16).digest()
+
+def url_hash64(url: str, canonical: bool = False) -> int:
+    """Entier signé 64 bits (INTEGER côté SQLite, stocké sur 8 octets)."""
+    digest = hashlib.blake2b(_key_string(url, canonical), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+def url_key(url: str, dialect: str = "sqlite", canonical: bool = False):
+    """Clé de dédup adaptée au backend ("sqlite" -> int, "mysql" -> bytes)."""
+    if dialect == "mysql":
+        return url_hash128(url, canonical)
+    return url_hash64(url, canonical)